@@ -0,0 +1,334 @@
+"""many games stepped at once with numpy
+
+BatchTetris keeps N fields as an (N, 40) array of row bitmasks and applies one action
+per game per step as array operations, following the same rules as Tetris
+"""
+from typing import ClassVar, Sequence
+from dataclasses import dataclass
+from random import Random
+import numpy as np
+import numpy.typing as npt
+from main import (
+    Tetris, TMino, EmptyMino, MINO_SHAPES, MINO_TYPES, DIRECTIONS, KickTable, SRS_KICK_TABLE
+)
+from randomizer import Randomizer, SevenBagGenerator
+
+class BatchAction:
+    """action numbers given to BatchTetris.step"""
+    MOVE_LEFT: ClassVar[int] = 0
+    MOVE_RIGHT: ClassVar[int] = 1
+    MOVE_DOWN: ClassVar[int] = 2
+    ROTATE_RIGHT: ClassVar[int] = 3
+    ROTATE_LEFT: ClassVar[int] = 4
+    HOLD: ClassVar[int] = 5
+    HARD_DROP: ClassVar[int] = 6
+    PLACE_MINO: ClassVar[int] = 7
+
+_KIND_NUMBER = len(MINO_SHAPES)
+_SHAPE_ROWS = 4
+_T_KIND = TMino.KIND
+
+def _make_shape_tables() -> tuple[npt.NDArray[np.int32], ...]:
+    rows = np.zeros((_KIND_NUMBER, 4, _SHAPE_ROWS), dtype=np.int32)
+    bounds = np.zeros((4, _KIND_NUMBER, 4), dtype=np.int32)
+    for kind, shapes in enumerate(MINO_SHAPES):
+        for direction, shape in enumerate(shapes):
+            masks = shape.masks
+            for y, mask in enumerate(masks.rows):
+                rows[kind, direction, y] = mask
+            bounds[:, kind, direction] = (masks.left, masks.right, masks.bottom, masks.top)
+    return rows, bounds[0], bounds[1], bounds[2], bounds[3]
+
+_ROWS, _LEFT, _RIGHT, _BOTTOM, _TOP = _make_shape_tables()
+
+def _make_direction_tables() -> tuple[npt.NDArray[np.int32], npt.NDArray[np.int32]]:
+    right = np.zeros((_KIND_NUMBER, 4), dtype=np.int32)
+    left = np.zeros((_KIND_NUMBER, 4), dtype=np.int32)
+    for kind, mino_type in enumerate(MINO_TYPES):
+        for direction in DIRECTIONS:
+            mino = mino_type(direction)
+            right[kind, direction.value] = mino.get_right_direction().value
+            left[kind, direction.value] = mino.get_left_direction().value
+    return right, left
+
+_RIGHT_DIRECTION, _LEFT_DIRECTION = _make_direction_tables()
+
+def _make_spawn_tables() -> tuple[npt.NDArray[np.int32], npt.NDArray[np.int32]]:
+    spawn_x = np.zeros(_KIND_NUMBER, dtype=np.int32)
+    spawn_y = np.zeros(_KIND_NUMBER, dtype=np.int32)
+    for kind, shapes in enumerate(MINO_SHAPES):
+        position = Tetris.INITIAL_POSITION.to_position(shapes[0].size)
+        spawn_x[kind] = position.x
+        spawn_y[kind] = position.y
+    return spawn_x, spawn_y
+
+_SPAWN_X, _SPAWN_Y = _make_spawn_tables()
+
+def _make_kick_tables(kick_table: KickTable) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.int32]]:
+    """kick offsets as (kind, previous, current, test, xy) where test 0 is rotation in place"""
+    kick_number = max(
+        len(kicks)
+        for kind in kick_table.kicks for previous in kind for kicks in previous
+    )
+    offsets = np.zeros((_KIND_NUMBER, 4, 4, kick_number + 1, 2), dtype=np.int32)
+    counts = np.zeros((_KIND_NUMBER, 4, 4), dtype=np.int32)
+    for kind, kind_kicks in enumerate(kick_table.kicks):
+        for previous, previous_kicks in enumerate(kind_kicks):
+            for current, kicks in enumerate(previous_kicks):
+                counts[kind, previous, current] = len(kicks)
+                for step, offset in enumerate(kicks):
+                    offsets[kind, previous, current, step + 1] = offset
+    return offsets, counts
+
+# corners of the 3x3 box of T mino and whether each corner is in front of each direction
+_T_CORNERS = np.array([(0, 0), (2, 0), (0, 2), (2, 2)], dtype=np.int32)
+_T_FRONT_CORNERS = np.array([
+    [False, False, True, True],
+    [False, True, False, True],
+    [True, True, False, False],
+    [True, False, True, False],
+])
+
+def _shift(masks: npt.NDArray[np.int32], position_x: npt.NDArray[np.int32]) -> npt.NDArray[np.int32]:
+    return np.where(
+        position_x >= 0,
+        masks << np.maximum(position_x, 0),
+        masks >> np.maximum(-position_x, 0)
+    )
+
+@dataclass(frozen=True, slots=True)
+class BatchStepResult:
+    """what happened in every game by one step, each field has one value per game
+
+    clear_line, t_spin, t_spin_mini and perfect_clear are those of ClearResult
+    and are only meaningful where placed is True, topped_out is Tetris.is_topped_out
+    after the step
+    """
+    success: npt.NDArray[np.bool_]
+    placed: npt.NDArray[np.bool_]
+    clear_line: npt.NDArray[np.int32]
+    t_spin: npt.NDArray[np.bool_]
+    t_spin_mini: npt.NDArray[np.bool_]
+    perfect_clear: npt.NDArray[np.bool_]
+    topped_out: npt.NDArray[np.bool_]
+
+class BatchTetris:
+    """N games of Tetris in numpy arrays
+
+    rows[i, y] is the bitmask of row y of game i like Field.rows, and kinds, directions,
+    position_x, position_y and holds describe current mino and hold mino of every game
+    by Mino.KIND and Direction.value; hold 0 is an empty hold
+
+    the games start with their first mino already made, a game whose new mino has
+    no room is reported as topped out by step and can be started again by reset
+    """
+    FIELD_SIZE_X: int = Tetris.FIELD_SIZE_X
+    FIELD_SIZE_Y: int = Tetris.FIELD_SIZE_Y*2
+    def __init__(self, random_seeds: Sequence[int], kick_table: KickTable = SRS_KICK_TABLE) -> None:
+        number = len(random_seeds)
+        self.random_seeds: list[int] = list(random_seeds)
+        self.rows: npt.NDArray[np.int32] = np.zeros((number, BatchTetris.FIELD_SIZE_Y), dtype=np.int32)
+        self.kinds: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.directions: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.position_x: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.position_y: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.holds: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.last_rotate: npt.NDArray[np.bool_] = np.zeros(number, dtype=np.bool_)
+        self.last_step: npt.NDArray[np.int32] = np.zeros(number, dtype=np.int32)
+        self.randomizers: list[Randomizer] = [
+            Randomizer(SevenBagGenerator(), Random(random_seed)) for random_seed in random_seeds
+        ]
+        self.kick_offsets, self.kick_counts = _make_kick_tables(kick_table)
+        self.full_row: int = (1 << BatchTetris.FIELD_SIZE_X) - 1
+        self.reset(np.ones(number, dtype=np.bool_))
+    def __len__(self) -> int:
+        return len(self.random_seeds)
+    def reset(self, games: npt.NDArray[np.bool_]) -> None:
+        """start the selected games again from their seeds"""
+        for game in np.flatnonzero(games):
+            self.randomizers[game] = Randomizer(SevenBagGenerator(), Random(self.random_seeds[game]))
+        self.rows[games] = 0
+        self.holds[games] = EmptyMino.KIND
+        self.last_rotate[games] = False
+        self.last_step[games] = 0
+        self._make_mino(np.flatnonzero(games))
+    def peek_next(self, game: int, number: int) -> list[int]:
+        """kinds of the next minos of a game, as Tetris.peek_next"""
+        return list(self.randomizers[game].peek_next(number))
+    def _spawn(self, games: npt.NDArray[np.intp], kinds: npt.NDArray[np.int32]) -> None:
+        self.kinds[games] = kinds
+        self.directions[games] = 0
+        self.position_x[games] = _SPAWN_X[kinds]
+        self.position_y[games] = _SPAWN_Y[kinds]
+    def _make_mino(self, games: npt.NDArray[np.intp]) -> None:
+        kinds = np.array([self.randomizers[game].pop() for game in games], dtype=np.int32)
+        self._spawn(games, kinds)
+    def _can_place(
+            self,
+            games: npt.NDArray[np.intp],
+            kinds: npt.NDArray[np.int32],
+            directions: npt.NDArray[np.int32],
+            position_x: npt.NDArray[np.int32],
+            position_y: npt.NDArray[np.int32]
+        ) -> npt.NDArray[np.bool_]:
+        """Field.can_place for the selected games"""
+        inside = (
+            (position_x >= -_LEFT[kinds, directions])
+            & (position_x < BatchTetris.FIELD_SIZE_X - _RIGHT[kinds, directions])
+            & (position_y >= -_BOTTOM[kinds, directions])
+            & (position_y < BatchTetris.FIELD_SIZE_Y - _TOP[kinds, directions])
+        )
+        masks = _shift(_ROWS[kinds, directions], position_x[:, None])
+        row_numbers = np.clip(position_y[:, None] + np.arange(_SHAPE_ROWS), 0, BatchTetris.FIELD_SIZE_Y - 1)
+        field_rows = self.rows[games[:, None], row_numbers]
+        return inside & ~((field_rows & masks) != 0).any(axis=1)
+    def _move(self, games: npt.NDArray[np.intp], move_x: int, move_y: int) -> npt.NDArray[np.bool_]:
+        position_x = self.position_x[games] + move_x
+        position_y = self.position_y[games] + move_y
+        moved = self._can_place(games, self.kinds[games], self.directions[games], position_x, position_y)
+        moved_games = games[moved]
+        self.position_x[moved_games] = position_x[moved]
+        self.position_y[moved_games] = position_y[moved]
+        self.last_rotate[moved_games] = False
+        self.last_step[moved_games] = 0
+        return moved
+    def _rotate(self, games: npt.NDArray[np.intp], direction_table: npt.NDArray[np.int32]) -> npt.NDArray[np.bool_]:
+        kinds = self.kinds[games]
+        previous = self.directions[games]
+        current = direction_table[kinds, previous]
+        counts = self.kick_counts[kinds, previous, current]
+        rotated = np.zeros(len(games), dtype=np.bool_)
+        for test in range(self.kick_offsets.shape[3]):
+            trying = ~rotated & (test <= counts)
+            if not trying.any():
+                break
+            offsets = self.kick_offsets[kinds, previous, current, test]
+            position_x = self.position_x[games] + offsets[:, 0]
+            position_y = self.position_y[games] + offsets[:, 1]
+            fits = trying & self._can_place(games, kinds, current, position_x, position_y)
+            fit_games = games[fits]
+            self.directions[fit_games] = current[fits]
+            self.position_x[fit_games] = position_x[fits]
+            self.position_y[fit_games] = position_y[fits]
+            self.last_rotate[fit_games] = True
+            self.last_step[fit_games] = max(test - 1, 0)
+            rotated |= fits
+        return rotated
+    def _hold(self, games: npt.NDArray[np.intp]) -> None:
+        holds = self.holds[games]
+        self.holds[games] = self.kinds[games]
+        empty = holds == EmptyMino.KIND
+        self._make_mino(games[empty])
+        self._spawn(games[~empty], holds[~empty])
+    def _drop(self, games: npt.NDArray[np.intp]) -> None:
+        falling = games
+        while len(falling) > 0:
+            position_x = self.position_x[falling]
+            position_y = self.position_y[falling] - 1
+            fits = self._can_place(falling, self.kinds[falling], self.directions[falling], position_x, position_y)
+            self.position_y[falling[fits]] = position_y[fits]
+            falling = falling[fits]
+    def _place(self, games: npt.NDArray[np.intp], result: BatchStepResult) -> None:
+        """lock current mino of the games, clear lines and make the next mino"""
+        kinds = self.kinds[games]
+        directions = self.directions[games]
+        position_x = self.position_x[games]
+        position_y = self.position_y[games]
+        masks = _shift(_ROWS[kinds, directions], position_x[:, None])
+        for y in range(_SHAPE_ROWS):
+            has_blocks = masks[:, y] != 0
+            self.rows[games[has_blocks], position_y[has_blocks] + y] |= masks[has_blocks, y]
+        t_games = (kinds == _T_KIND) & self.last_rotate[games]
+        if t_games.any():
+            self._check_t_spin(games[t_games], result)
+        full = self.rows[games] == self.full_row
+        clear_line = full.sum(axis=1)
+        clearing = clear_line > 0
+        if clearing.any():
+            clearing_games = games[clearing]
+            order = np.argsort(full[clearing], axis=1, kind='stable')
+            rows = np.take_along_axis(self.rows[clearing_games], order, axis=1)
+            rows[np.arange(BatchTetris.FIELD_SIZE_Y) >= BatchTetris.FIELD_SIZE_Y - clear_line[clearing][:, None]] = 0
+            self.rows[clearing_games] = rows
+        result.clear_line[games] = clear_line
+        result.perfect_clear[games] = ~(self.rows[games] != 0).any(axis=1)
+        result.placed[games] = True
+        self._make_mino(games)
+    def _check_t_spin(self, games: npt.NDArray[np.intp], result: BatchStepResult) -> None:
+        corner_x = self.position_x[games][:, None] + _T_CORNERS[:, 0]
+        corner_y = self.position_y[games][:, None] + _T_CORNERS[:, 1]
+        inside = (
+            (corner_x >= 0) & (corner_x < BatchTetris.FIELD_SIZE_X)
+            & (corner_y >= 0) & (corner_y < BatchTetris.FIELD_SIZE_Y)
+        )
+        rows = self.rows[games[:, None], np.clip(corner_y, 0, BatchTetris.FIELD_SIZE_Y - 1)]
+        empty = inside & ((rows >> np.clip(corner_x, 0, BatchTetris.FIELD_SIZE_X - 1)) & 1 == 0)
+        is_spin = empty.sum(axis=1) <= 1
+        front_is_empty = (empty & _T_FRONT_CORNERS[self.directions[games]]).any(axis=1)
+        is_mini = is_spin & front_is_empty & (self.last_step[games] != 3)
+        result.t_spin[games] = is_spin & ~is_mini
+        result.t_spin_mini[games] = is_mini
+    def is_bottom(self) -> npt.NDArray[np.bool_]:
+        games = np.arange(len(self))
+        return ~self._can_place(games, self.kinds, self.directions, self.position_x, self.position_y - 1)
+    def is_topped_out(self) -> npt.NDArray[np.bool_]:
+        games = np.arange(len(self))
+        return ~self._can_place(games, self.kinds, self.directions, self.position_x, self.position_y)
+    def step(self, actions: npt.NDArray[np.int32]) -> BatchStepResult:
+        """apply one BatchAction to every game
+
+        Args:
+            actions (npt.NDArray[np.int32]): action of each game
+
+        Returns:
+            BatchStepResult: whether each action succeeded and the result of placed minos
+        """
+        number = len(self)
+        result = BatchStepResult(
+            np.zeros(number, dtype=np.bool_),
+            np.zeros(number, dtype=np.bool_),
+            np.zeros(number, dtype=np.int32),
+            np.zeros(number, dtype=np.bool_),
+            np.zeros(number, dtype=np.bool_),
+            np.zeros(number, dtype=np.bool_),
+            np.zeros(number, dtype=np.bool_)
+        )
+        for action, move_x, move_y in (
+                (BatchAction.MOVE_LEFT, -1, 0),
+                (BatchAction.MOVE_RIGHT, 1, 0),
+                (BatchAction.MOVE_DOWN, 0, -1)
+            ):
+            games = np.flatnonzero(actions == action)
+            if len(games) > 0:
+                result.success[games] = self._move(games, move_x, move_y)
+        for action, direction_table in (
+                (BatchAction.ROTATE_RIGHT, _RIGHT_DIRECTION),
+                (BatchAction.ROTATE_LEFT, _LEFT_DIRECTION)
+            ):
+            games = np.flatnonzero(actions == action)
+            if len(games) > 0:
+                result.success[games] = self._rotate(games, direction_table)
+        games = np.flatnonzero(actions == BatchAction.HOLD)
+        if len(games) > 0:
+            self._hold(games)
+            result.success[games] = True
+        games = np.flatnonzero(actions == BatchAction.HARD_DROP)
+        if len(games) > 0:
+            self._drop(games)
+            self.last_rotate[games] = True
+            self.last_step[games] = 0
+        placing = np.flatnonzero(actions == BatchAction.PLACE_MINO)
+        if len(placing) > 0:
+            placing = placing[~self._can_place(
+                placing,
+                self.kinds[placing],
+                self.directions[placing],
+                self.position_x[placing],
+                self.position_y[placing] - 1
+            )]
+        games = np.concatenate([games, placing])
+        if len(games) > 0:
+            self._place(games, result)
+            result.success[games] = True
+        result.topped_out[:] = self.is_topped_out()
+        return result
@@ -0,0 +1,310 @@
+"""benchmarks of the hot paths of the engine
+
+micro benchmarks time one call of an engine method in a fixed state, macro benchmarks
+play whole games with a scripted policy on fixed seeds; the best of several repeats
+is kept, results are saved as JSON and can be compared with a saved baseline
+
+Example:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.1
+"""
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+from random import Random
+from typing import Callable
+from dataclasses import dataclass
+from main import (
+    Tetris, Position, Size, Block, PlotGridPosition, Mino,
+    TMino, IMino, DIRECTIONS, MINO_SHAPES, Direction, TetrisSnapshot, LastTetrisAction, SuperRotationStep
+)
+from scheduler import TickScheduler, Handling, Key
+from randomizer import SevenBagGenerator
+
+@dataclass(frozen=True, slots=True)
+class Benchmark:
+    """run does calls calls of the timed method, a macro benchmark is run once a repeat
+
+    when baseline is given, its time per call is taken off, for a run which has to undo
+    its change of the game before the next run
+    """
+    name: str
+    run: Callable[[], object]
+    calls: int = 1
+    baseline: str | None = None
+    macro: bool = False
+
+def _garbage_tetris(seed: int = 0, lines: int = 8) -> Tetris:
+    """game with lines of garbage, each with one hole, and current mino made"""
+    tetris = Tetris(seed)
+    random_generator = Random(seed)
+    for y in range(lines):
+        hole = random_generator.randrange(Tetris.FIELD_SIZE_X)
+        for x in range(Tetris.FIELD_SIZE_X):
+            if x != hole:
+                tetris.main_field.add_block(Position(x, y), Block.GARBAGE())
+    tetris.make_mino()
+    return tetris
+
+def _set_mino(tetris: Tetris, mino: Mino, direction: Direction, position: Position) -> None:
+    """make mino current mino of tetris at the position without any check"""
+    mino.set_direction(direction)
+    tetris.current_mino.mino = mino
+    tetris.current_mino.position = position
+    tetris.current_mino_shape = mino.get_shape()
+    tetris.current_mino_size = mino.get_size()
+
+def _find_kick(tetris: Tetris, mino: Mino) -> tuple[Direction, Position]:
+    """a state of mino where rotate_right succeeds only with a kick"""
+    for direction in DIRECTIONS:
+        for y in range(Tetris.FIELD_SIZE_Y):
+            for x in range(-2, Tetris.FIELD_SIZE_X):
+                mino.set_direction(direction)
+                if not tetris.can_put(mino, direction, x, y):
+                    continue
+                rotated = MINO_SHAPES[mino.KIND][mino.get_right_direction().value]
+                if tetris.main_field.can_place(rotated.masks, x, y):
+                    continue
+                _set_mino(tetris, mino, direction, Position(x, y))
+                if tetris.rotate_right():
+                    return direction, Position(x, y)
+    raise RuntimeError('no state needs a kick')
+
+def micro_benchmarks() -> list[Benchmark]:
+    benchmarks: list[Benchmark] = []
+    tetris = _garbage_tetris()
+    field = tetris.main_field
+    # open space over the garbage, where every move succeeds
+    t_mino = TMino()
+    spawn = Tetris.INITIAL_POSITION.to_position(t_mino.get_size())
+    _set_mino(tetris, t_mino, DIRECTIONS[0], spawn)
+    surrounding_grid = field.plot_grid(Position(3, 6), Size(3, 3))
+    benchmarks.append(Benchmark('Grid.plot_grid', lambda: field.plot_grid(Position(3, 6), Size(3, 3))))
+    benchmarks.append(Benchmark(
+        'Tetris._can_move', lambda: tetris._can_move(surrounding_grid, t_mino, PlotGridPosition(0, 0))
+    ))
+    def move_left_right() -> None:
+        tetris.move_left()
+        tetris.move_right()
+    benchmarks.append(Benchmark('Tetris.move_left/move_right', move_left_right, 2))
+    def move_down() -> None:
+        tetris.move_down()
+        tetris.current_mino.position = spawn
+    benchmarks.append(Benchmark('Tetris.move_down', move_down))
+    def rotate_without_kick() -> None:
+        tetris.rotate_right()
+        tetris.rotate_right()
+        tetris.rotate_right()
+        tetris.rotate_right()
+    benchmarks.append(Benchmark('Tetris.rotate_right', rotate_without_kick, 4))
+    kick_tetris = _garbage_tetris(1, 12)
+    i_mino = IMino()
+    kick_direction, kick_position = _find_kick(kick_tetris, i_mino)
+    def rotate_with_kick() -> None:
+        _set_mino(kick_tetris, i_mino, kick_direction, kick_position)
+        kick_tetris.rotate_right()
+    benchmarks.append(Benchmark('Tetris.rotate_right with kick', rotate_with_kick))
+    def get_ghost_block() -> None:
+        tetris.ghost_source = None
+        tetris.get_ghost_block()
+    benchmarks.append(Benchmark('Tetris.get_ghost_block', get_ghost_block))
+    benchmarks.append(Benchmark('Tetris.get_ghost_block cached', tetris.get_ghost_block))
+    # locking changes the game, so it is restored from a snapshot before every lock
+    lock_tetris = _garbage_tetris(2)
+    lock_snapshot = lock_tetris.snapshot()
+    ghost = lock_tetris.get_ghost_block()
+    benchmarks.append(Benchmark('Tetris.restore', lambda: lock_tetris.restore(lock_snapshot)))
+    def hard_drop() -> None:
+        lock_tetris.restore(lock_snapshot)
+        lock_tetris.hard_drop()
+    benchmarks.append(Benchmark('Tetris.hard_drop', hard_drop, baseline='Tetris.restore'))
+    def place_mino() -> None:
+        lock_tetris.restore(lock_snapshot)
+        lock_tetris.current_mino.position = ghost
+        lock_tetris.place_mino()
+    benchmarks.append(Benchmark('Tetris.place_mino', place_mino, baseline='Tetris.restore'))
+    clear_tetris, clear_snapshot, clear_mino, clear_position = _line_clear_state()
+    def place_without_clear() -> None:
+        clear_tetris.restore(clear_snapshot)
+        clear_tetris.main_field.place(
+            clear_tetris.current_mino_shape.grid, clear_tetris.current_mino_shape.masks,
+            clear_position.x, clear_position.y
+        )
+    def clear_line() -> None:
+        place_without_clear()
+        clear_tetris._clear_line(False, False)
+    benchmarks.append(Benchmark('restore and Field.place', place_without_clear))
+    benchmarks.append(Benchmark('Tetris._clear_line', clear_line, baseline='restore and Field.place'))
+    def clear_no_line() -> None:
+        tetris.main_field.dirty_rows = 0b1111
+        tetris._clear_line(False, False)
+    benchmarks.append(Benchmark('Tetris._clear_line without line', clear_no_line))
+    # T mino rotated into the garbage, where the corners are looked at
+    spin_tetris = _garbage_tetris()
+    spin_tetris.last_action = LastTetrisAction(True, SuperRotationStep(0))
+    spin_position = Position(3, 6)
+    benchmarks.append(Benchmark('Tetris._find_spin', lambda: spin_tetris._find_spin(t_mino, spin_position)))
+    spin_tetris.all_spin = True
+    i_mino_spin = IMino()
+    benchmarks.append(Benchmark(
+        'Tetris._find_spin all-spin', lambda: spin_tetris._find_spin(i_mino_spin, spin_position)
+    ))
+    garbage_holes = (3, 3, 7, 0)
+    def add_garbage() -> None:
+        lock_tetris.restore(lock_snapshot)
+        lock_tetris.add_garbage(garbage_holes)
+    benchmarks.append(Benchmark('Tetris.add_garbage 4 lines', add_garbage, baseline='Tetris.restore'))
+    random_generator = Random(0)
+    generator = SevenBagGenerator()
+    benchmarks.append(Benchmark('SevenBagGenerator.next_bag', lambda: generator.next_bag(random_generator)))
+    benchmarks.append(Benchmark('Tetris.make_mino', lock_tetris.make_mino))
+    benchmarks.append(Benchmark('Tetris.peek_next', tetris.peek_next))
+    benchmarks.append(Benchmark('Tetris.snapshot', tetris.snapshot))
+    state = lock_tetris.to_bytes()
+    benchmarks.append(Benchmark('Tetris.to_bytes', lock_tetris.to_bytes))
+    benchmarks.append(Benchmark('TetrisSnapshot.from_bytes', lambda: TetrisSnapshot.from_bytes(state)))
+    placement_tetris = _garbage_tetris(3, 4)
+    benchmarks.append(Benchmark('Tetris.get_placements', placement_tetris.get_placements))
+    # from the right wall to the left wall over the garbage
+    right_wall = Position(Tetris.FIELD_SIZE_X - t_mino.get_size().x, spawn.y)
+    def move_to_wall() -> None:
+        tetris.current_mino.position = right_wall
+        while tetris.move_left():
+            pass
+    benchmarks.append(Benchmark('Tetris.move_left to the wall', move_to_wall))
+    def shift_to_wall() -> None:
+        tetris.current_mino.position = right_wall
+        tetris.shift(-1)
+    benchmarks.append(Benchmark('Tetris.shift to the wall', shift_to_wall))
+    idle_scheduler = TickScheduler(_garbage_tetris(5), Handling(gravity=0))
+    benchmarks.append(Benchmark('TickScheduler.tick idle', idle_scheduler.tick))
+    shift_tetris = _garbage_tetris(5)
+    shift_scheduler = TickScheduler(shift_tetris, Handling(das=0, arr=0, gravity=0))
+    shift_scheduler.key_down(Key.LEFT)
+    shift_scheduler.tick()
+    shift_position = Position(Tetris.FIELD_SIZE_X - shift_tetris.current_mino_size.x, spawn.y)
+    def tick_shift() -> None:
+        shift_tetris.current_mino.position = shift_position
+        shift_scheduler.tick()
+    benchmarks.append(Benchmark('TickScheduler.tick ARR 0', tick_shift))
+    return benchmarks
+
+def _line_clear_state() -> tuple[Tetris, TetrisSnapshot, Mino, Position]:
+    """game whose current I mino clears a line where it lands"""
+    tetris = Tetris(4)
+    for x in range(Tetris.FIELD_SIZE_X - 1):
+        tetris.main_field.add_block(Position(x, 0), Block.GARBAGE())
+    i_mino = IMino()
+    # vertical I mino at the last column, its blocks are in column 2 of its grid
+    _set_mino(tetris, i_mino, DIRECTIONS[1], Position(Tetris.FIELD_SIZE_X - 3, 0))
+    return tetris, tetris.snapshot(), i_mino, tetris.current_mino.position
+
+def play_scripted(seed: int, pieces: int) -> int:
+    """play pieces minos with moves and rotations drawn from seed, starting a new game on top out
+
+    Returns:
+        int: number of inputs
+    """
+    script = Random(seed)
+    tetris = Tetris(seed)
+    tetris.make_mino()
+    inputs = 0
+    for piece in range(pieces):
+        if tetris.is_topped_out():
+            tetris = Tetris(script.randrange(1 << 30))
+            tetris.make_mino()
+        for rotation in range(script.randrange(4)):
+            tetris.rotate_right()
+        shift = script.randrange(-5, 5)
+        for move in range(abs(shift)):
+            if shift < 0:
+                tetris.move_left()
+            else:
+                tetris.move_right()
+        tetris.get_ghost_block()
+        tetris.hard_drop()
+        inputs += 4 + abs(shift)
+    return inputs
+
+MACRO_SEEDS: tuple[int, ...] = (0, 1, 2, 3, 4)
+MACRO_PIECES: int = 2000
+
+def macro_benchmarks() -> list[Benchmark]:
+    """a call is one piece, so that the time per call gives pieces per second"""
+    def play() -> None:
+        for seed in MACRO_SEEDS:
+            play_scripted(seed, MACRO_PIECES)
+    return [Benchmark('scripted games per piece', play, len(MACRO_SEEDS) * MACRO_PIECES, macro=True)]
+
+def run_benchmarks(benchmarks: list[Benchmark], repeat: int = 5) -> dict[str, float]:
+    """best seconds per call of every benchmark"""
+    results: dict[str, float] = {}
+    for benchmark in benchmarks:
+        timer = timeit.Timer(benchmark.run)
+        if benchmark.macro:
+            number = 1
+        else:
+            number, _ = timer.autorange()
+        seconds = min(timer.repeat(repeat, number)) / number / benchmark.calls
+        if not benchmark.baseline is None:
+            seconds = max(seconds - results[benchmark.baseline], 0.0)
+        results[benchmark.name] = seconds
+    return results
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """names of the benchmarks slower than baseline by more than threshold, 0.1 for 10%"""
+    return [
+        name for name, seconds in results.items()
+        if name in baseline and baseline[name] > 0 and seconds > baseline[name] * (1 + threshold)
+    ]
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:9.3f} ms'
+    return f'{seconds * 1e6:9.3f} us'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=None, help='JSON file to save the results in')
+    parser.add_argument('--compare', default=None, help='JSON file of earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown counted as regression')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name has this')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-macro', action='store_true', help='only run micro benchmarks')
+    arguments = parser.parse_args()
+    benchmarks = micro_benchmarks()
+    if not arguments.no_macro:
+        benchmarks += macro_benchmarks()
+    selected = [benchmark for benchmark in benchmarks if arguments.filter in benchmark.name]
+    # baselines are run even when filtered out, their time is taken off other benchmarks
+    needed = {benchmark.baseline for benchmark in selected if not benchmark.baseline is None}
+    names = {benchmark.name for benchmark in selected} | needed
+    selected = [benchmark for benchmark in benchmarks if benchmark.name in names]
+    results = run_benchmarks(selected, arguments.repeat)
+    baseline: dict[str, float] = {}
+    if not arguments.compare is None:
+        with open(arguments.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+    regressions = compare(results, baseline, arguments.threshold)
+    for name, seconds in results.items():
+        line = f'{name:40} {_format_time(seconds)}'
+        if name in baseline and baseline[name] > 0:
+            line += f' {seconds / baseline[name]:6.2f}x'
+            if name in regressions:
+                line += ' REGRESSION'
+        print(line)
+    if 'scripted games per piece' in results:
+        print(f'pieces per second: {1 / results["scripted games per piece"]:.0f}')
+    if not arguments.output is None:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'python': sys.version,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results
+            }, output_file, indent=2)
+    if len(regressions) > 0:
+        sys.exit(1)
@@ -0,0 +1,103 @@
+"""cells of the screen of a game, shared by the frontends
+
+a frame is a bytearray with one cell code per cell, row by row from the top left:
+the hold mino on the left, the visible rows of the field between walls and the
+next minos on the right; frontends compare frames to find what to draw again
+"""
+from typing import ClassVar
+from main import Tetris, Block, MINO_SHAPES, RowMasks
+
+class Cell:
+    """code of a cell of a frame, block types of Block are used as they are"""
+    EMPTY: ClassVar[int] = Block.EMPTY_NUMBER
+    WALL: ClassVar[int] = Block.WALL_NUMBER
+    GHOST: ClassVar[int] = 10
+    BLANK: ClassVar[int] = 11
+    UNKNOWN: ClassVar[int] = 255
+    """code of a cell which is not drawn yet, to draw every cell of the next frame"""
+
+class Board:
+    """makes the frames of games, the field part is only made again when the field changed"""
+    VISIBLE_ROWS: ClassVar[int] = Tetris.FIELD_SIZE_Y + 1
+    HOLD_X: ClassVar[int] = 0
+    FIELD_X: ClassVar[int] = 6
+    NEXT_X: ClassVar[int] = FIELD_X + Tetris.FIELD_SIZE_X + 2
+    WIDTH: ClassVar[int] = NEXT_X + 4
+    HEIGHT: ClassVar[int] = VISIBLE_ROWS + 1
+    def __init__(self) -> None:
+        self.field_layer = Board._make_background()
+        self.field_version = -1
+    @staticmethod
+    def _make_background() -> bytearray:
+        """blank cells with the walls and the floor of the field"""
+        width = Board.WIDTH
+        background = bytearray([Cell.BLANK]) * (width * Board.HEIGHT)
+        for row in range(Board.HEIGHT):
+            background[row * width + Board.FIELD_X - 1] = Cell.WALL
+            background[row * width + Board.FIELD_X + Tetris.FIELD_SIZE_X] = Cell.WALL
+        floor = Board.VISIBLE_ROWS * width
+        for x in range(Board.FIELD_X - 1, Board.FIELD_X + Tetris.FIELD_SIZE_X + 1):
+            background[floor + x] = Cell.WALL
+        return background
+    @staticmethod
+    def cell_index(position_x: int, position_y: int) -> int:
+        """index in a frame of the block at (position_x, position_y) of the field"""
+        return (Board.VISIBLE_ROWS - 1 - position_y) * Board.WIDTH + Board.FIELD_X + position_x
+    def _update_field_layer(self, tetris: Tetris) -> None:
+        """copy the visible blocks of the field into field_layer, only when the field changed"""
+        field = tetris.main_field
+        if field.version == self.field_version:
+            return
+        self.field_version = field.version
+        layer = self.field_layer
+        grid = field.grid
+        for y in range(Board.VISIBLE_ROWS):
+            start = Board.cell_index(0, y)
+            layer[start:start + Tetris.FIELD_SIZE_X] = grid[y]
+    @staticmethod
+    def put_shape(frame: bytearray, masks: RowMasks, position_x: int, position_y: int, cell: int) -> None:
+        """put the blocks of a shape at a position of the field, outside of the visible rows is cut off"""
+        for line_y, mask in masks.lines:
+            y = position_y + line_y
+            if not 0 <= y < Board.VISIBLE_ROWS:
+                continue
+            start = Board.cell_index(position_x, y)
+            x = 0
+            while mask:
+                if mask & 1 and 0 <= position_x + x < Tetris.FIELD_SIZE_X:
+                    frame[start + x] = cell
+                mask >>= 1
+                x += 1
+    @staticmethod
+    def put_preview(frame: bytearray, kind: int, row: int, column: int) -> None:
+        """put a mino of the kind in its first direction in a panel, its top line at row"""
+        masks = MINO_SHAPES[kind][0].masks
+        for line_y, mask in masks.lines:
+            start = (row + masks.top - line_y) * Board.WIDTH + column
+            mask >>= masks.left
+            x = 0
+            while mask:
+                if mask & 1:
+                    frame[start + x] = kind
+                mask >>= 1
+                x += 1
+    def make_base(self, tetris: Tetris) -> bytearray:
+        """cell codes of the screen without current mino and its ghost"""
+        self._update_field_layer(tetris)
+        frame = bytearray(self.field_layer)
+        if tetris.hold_mino.KIND != 0:
+            Board.put_preview(frame, tetris.hold_mino.KIND, 1, Board.HOLD_X)
+        for i, kind in enumerate(tetris.peek_next(Tetris.NEXT_NUMBER)):
+            Board.put_preview(frame, kind, 1 + i * 3, Board.NEXT_X)
+        return frame
+    def make_frame(self, tetris: Tetris) -> bytearray:
+        """cell codes of the whole screen of the game"""
+        frame = self.make_base(tetris)
+        mino = tetris.current_mino.mino
+        if mino.KIND != 0:
+            position = tetris.current_mino.position
+            ghost = tetris.get_ghost_block()
+            masks = tetris.current_mino_shape.masks
+            Board.put_shape(frame, masks, ghost.x, ghost.y, Cell.GHOST)
+            Board.put_shape(frame, masks, position.x, position.y, mino.KIND)
+        return frame
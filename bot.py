@@ -0,0 +1,303 @@
+"""beam search bot which chooses where to lock the current mino
+
+the bot looks at current mino, hold and the next minos, keeps the beam_width best
+games after every mino and scores them with a pluggable heuristic of the field;
+expansion of the beam is spread over a process pool
+
+Example:
+    with Bot(time_budget=0.1) as bot:
+        while not tetris.is_topped_out():
+            bot.play(tetris)
+"""
+import os
+import time
+from typing import Callable
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, Future, wait
+from main import Tetris, Field, ClearResult, Placement, TetrisSnapshot, KickTable
+from randomizer import Generator
+
+Heuristic = Callable[[Field], float]
+"""score of a field after a mino is locked, higher is better"""
+Reward = Callable[[ClearResult], float]
+"""score of the lines cleared by locking a mino, higher is better"""
+
+def aggregate_height(field: Field) -> float:
+    return sum(field.heights)
+
+def holes(field: Field) -> float:
+    """empty cells under the surface, every block is under the surface of its column"""
+    return sum(field.heights) - field.block_count
+
+def bumpiness(field: Field) -> float:
+    heights = field.heights
+    return sum(abs(heights[x] - heights[x + 1]) for x in range(len(heights) - 1))
+
+def max_height(field: Field) -> float:
+    return max(field.heights)
+
+@dataclass(frozen=True, slots=True)
+class WeightedHeuristic:
+    """weighted sum of the features above, every weight should be zero or less"""
+    height: float = -0.51
+    hole: float = -3.6
+    bumpiness: float = -0.18
+    max_height: float = -0.2
+    def __call__(self, field: Field) -> float:
+        heights = field.heights
+        total_height = sum(heights)
+        return (
+            self.height * total_height
+            + self.hole * (total_height - field.block_count)
+            + self.bumpiness * bumpiness(field)
+            + self.max_height * max(heights)
+        )
+
+@dataclass(frozen=True, slots=True)
+class WeightedReward:
+    """reward for each kind of clear, a single line is usually worth less than its blocks"""
+    line: tuple[float, ...] = (0.0, -1.0, -0.5, 0.5, 4.0)
+    t_spin: float = 3.0
+    t_spin_mini: float = 0.5
+    perfect_clear: float = 20.0
+    def __call__(self, result: ClearResult) -> float:
+        reward = self.line[result.clear_line]
+        if result.t_spin:
+            reward += self.t_spin * result.clear_line
+        if result.t_spin_mini:
+            reward += self.t_spin_mini
+        if result.perfect_clear:
+            reward += self.perfect_clear
+        return reward
+
+DEFAULT_HEURISTIC: Heuristic = WeightedHeuristic()
+DEFAULT_REWARD: Reward = WeightedReward()
+
+@dataclass(frozen=True, slots=True)
+class SearchResult:
+    """placement chosen by Bot.think
+
+    score is the best score in the deepest layer the search finished,
+    depth is the number of minos of that layer
+    """
+    placement: Placement
+    score: float
+    depth: int
+    nodes: int
+
+_Node = tuple[float, float, int, TetrisSnapshot]
+"""(score, sum of rewards, index of the first placement, game after locking)"""
+
+_Rules = tuple[KickTable, type[Generator], tuple[int, ...], bool]
+"""(kick table, generator type, generator parameters, all_spin) of a game"""
+
+_scratch_games: dict[_Rules, Tetris] = {}
+
+def _get_rules(tetris: Tetris) -> _Rules:
+    generator = tetris.randomizer.generator
+    return (tetris.kick_table, type(generator), generator.get_parameters(), tetris.all_spin)
+
+def _get_scratch_tetris(rules: _Rules) -> Tetris:
+    """game of this process with the rules of the game searched, restored to every node to expand"""
+    scratch = _scratch_games.get(rules)
+    if scratch is None:
+        kick_table, generator_type, generator_parameters, all_spin = rules
+        scratch = Tetris(0, kick_table, generator_type(*generator_parameters), all_spin)
+        _scratch_games[rules] = scratch
+    return scratch
+
+def _expand(
+        nodes: list[_Node],
+        heuristic: Heuristic,
+        reward: Reward,
+        use_hold: bool,
+        beam_width: int,
+        rules: _Rules,
+        deadline: float | None
+    ) -> list[_Node] | None:
+    """lock the current mino of every node at every place, the beam_width best of each node
+
+    only the best children of each node are returned, which is all the next layer
+    can keep from it, so that little is sent back from worker processes
+
+    Returns:
+        list[_Node] | None: None when time.monotonic() passed deadline before every node is expanded
+    """
+    tetris = _get_scratch_tetris(rules)
+    children: list[_Node] = []
+    for _, node_reward, first, snapshot in nodes:
+        if (not deadline is None) and time.monotonic() >= deadline:
+            return None
+        tetris.restore(snapshot)
+        node_children: list[_Node] = []
+        for placement in tetris.get_placements(use_hold):
+            tetris.restore(snapshot)
+            child_reward = node_reward + reward(tetris.apply_placement(placement))
+            if tetris.is_topped_out():
+                continue
+            node_children.append((
+                child_reward + heuristic(tetris.main_field), child_reward, first, tetris.snapshot()
+            ))
+        node_children.sort(key=lambda child: child[0], reverse=True)
+        children += node_children[:beam_width]
+    return children
+
+def _select(children: list[_Node], beam_width: int) -> list[_Node]:
+    """the beam_width best children, one for each different game
+
+    ties are broken by the first placement, so the result does not depend on
+    the order workers finish in
+    """
+    children.sort(key=lambda child: (-child[0], child[2]))
+    beam: list[_Node] = []
+    seen: set[tuple[int, int, int]] = set()
+    for child in children:
+        snapshot = child[3]
+        key = (snapshot.field.zobrist_hash, snapshot.mino_kind, snapshot.hold_kind)
+        if key in seen:
+            continue
+        seen.add(key)
+        beam.append(child)
+        if len(beam) >= beam_width:
+            break
+    return beam
+
+class Bot:
+    """beam search over current mino, hold and the next minos
+
+    Args:
+        heuristic (Heuristic): score of the field at the end of the search
+        reward (Reward): score of every clear on the way, added to heuristic
+        beam_width (int): number of games kept after each mino
+        depth (int): number of minos to look at, current mino included
+        use_hold (bool): whether the bot may hold
+        processes (int | None): worker processes expanding the beam, the number of CPUs when None;
+            with 1 the beam is expanded in this process and no pool is made
+        time_budget (float | None): seconds to think about one mino, the deepest layer
+            finished in time is used; the first layer is always finished
+        deterministic (bool): ignore time_budget and always search to depth,
+            so the same game always gets the same placements
+
+    the kick table, generator and all_spin of the searched games are those of the game given to think
+
+    Note:
+        depth is at most Tetris.NEXT_NUMBER by default, so that a hold of the next mino
+        does not let the bot see further than the next minos shown to a player
+    """
+    def __init__(
+            self,
+            heuristic: Heuristic = DEFAULT_HEURISTIC,
+            reward: Reward = DEFAULT_REWARD,
+            beam_width: int = 16,
+            depth: int = Tetris.NEXT_NUMBER,
+            use_hold: bool = True,
+            processes: int | None = None,
+            time_budget: float | None = None,
+            deterministic: bool = False
+        ) -> None:
+        self.heuristic = heuristic
+        self.reward = reward
+        self.beam_width = beam_width
+        self.depth = depth
+        self.use_hold = use_hold
+        self.processes: int = processes if not processes is None else (os.cpu_count() or 1)
+        self.time_budget = time_budget
+        self.deterministic = deterministic
+        self.executor: ProcessPoolExecutor | None = None
+    def __enter__(self) -> 'Bot':
+        return self
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+    def close(self) -> None:
+        """stop the worker processes"""
+        if not self.executor is None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+    def think(self, tetris: Tetris) -> SearchResult | None:
+        """choose a placement of the current mino of tetris, which is not changed
+
+        Returns:
+            SearchResult | None: the chosen placement, None when the mino can not be locked anywhere
+        """
+        deadline = None
+        if (not self.time_budget is None) and (not self.deterministic):
+            deadline = time.monotonic() + self.time_budget
+        root = tetris.snapshot()
+        placements = tetris.get_placements(self.use_hold)
+        if len(placements) <= 0:
+            return None
+        children: list[_Node] = []
+        rules = _get_rules(tetris)
+        scratch = _get_scratch_tetris(rules)
+        for i, placement in enumerate(placements):
+            scratch.restore(root)
+            child_reward = self.reward(scratch.apply_placement(placement))
+            if scratch.is_topped_out():
+                continue
+            children.append((
+                child_reward + self.heuristic(scratch.main_field), child_reward, i, scratch.snapshot()
+            ))
+        nodes = len(placements)
+        if len(children) <= 0:
+            return SearchResult(placements[0], float('-inf'), 1, nodes)
+        beam = _select(children, self.beam_width)
+        best = SearchResult(placements[beam[0][2]], beam[0][0], 1, nodes)
+        for depth in range(2, self.depth + 1):
+            if (not deadline is None) and time.monotonic() >= deadline:
+                break
+            next_children = self._expand_beam(beam, rules, deadline)
+            if next_children is None or len(next_children) <= 0:
+                break
+            nodes += len(next_children)
+            beam = _select(next_children, self.beam_width)
+            best = SearchResult(placements[beam[0][2]], beam[0][0], depth, nodes)
+        return best
+    def play(self, tetris: Tetris) -> ClearResult:
+        """lock the current mino where think chooses, hard drop it when there is no choice"""
+        result = self.think(tetris)
+        if result is None:
+            return tetris.hard_drop()
+        return tetris.apply_placement(result.placement)
+    def _expand_beam(self, beam: list[_Node], rules: _Rules, deadline: float | None) -> list[_Node] | None:
+        """children of every node in beam, None when the deadline comes first"""
+        if self.processes <= 1 or len(beam) <= 1:
+            return _expand(
+                beam, self.heuristic, self.reward, self.use_hold, self.beam_width, rules, deadline
+            )
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        chunk_number = min(self.processes, len(beam))
+        futures: list[Future[list[_Node] | None]] = [
+            self.executor.submit(
+                _expand, beam[i::chunk_number],
+                self.heuristic, self.reward, self.use_hold, self.beam_width, rules, deadline
+            )
+            for i in range(chunk_number)
+        ]
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        _, not_done = wait(futures, timeout=timeout)
+        if len(not_done) > 0:
+            # workers which already started see the deadline themselves and stop soon
+            for future in not_done:
+                future.cancel()
+            return None
+        children: list[_Node] = []
+        for future in futures:
+            chunk_children = future.result()
+            if chunk_children is None:
+                return None
+            children += chunk_children
+        return children
+
+_policy_bot: Bot | None = None
+
+def policy(tetris: Tetris) -> ClearResult:
+    """simulation policy playing with a single process deterministic bot
+
+    Example:
+        python simulation.py bot:policy --seeds 0 100
+    """
+    global _policy_bot
+    if _policy_bot is None:
+        _policy_bot = Bot(beam_width=8, depth=3, processes=1, deterministic=True)
+    return _policy_bot.play(tetris)
@@ -0,0 +1,236 @@
+"""Pyxel frontend of the game
+
+the game is updated at a fixed 60 updates per second by pyxel.run, each update is
+a tick of a TickScheduler fed with the key presses and releases; every block,
+mino and ghost in every direction is drawn once into image bank 0 when the frontend
+starts, and a frame only draws again the cells whose code changed and the ghost and
+current mino, as pyxel keeps the screen between frames
+
+Example:
+    python frontend.py
+"""
+import time
+import pyxel
+from typing import ClassVar
+from main import Tetris, MINO_SHAPES, DIRECTIONS
+from board import Board, Cell
+from scheduler import TickScheduler, Handling, Key
+
+CELL_SIZE: int = 8
+"""width and height of a cell in pixels"""
+FPS: int = 60
+
+KEY_BINDINGS: tuple[tuple[int, int], ...] = (
+    (pyxel.KEY_LEFT, Key.LEFT),
+    (pyxel.KEY_RIGHT, Key.RIGHT),
+    (pyxel.KEY_DOWN, Key.SOFT_DROP),
+    (pyxel.KEY_SPACE, Key.HARD_DROP),
+    (pyxel.KEY_X, Key.ROTATE_RIGHT),
+    (pyxel.KEY_UP, Key.ROTATE_RIGHT),
+    (pyxel.KEY_Z, Key.ROTATE_LEFT),
+    (pyxel.KEY_C, Key.HOLD),
+)
+"""(pyxel key, scheduler key) pairs, a scheduler key can have more than one pyxel key"""
+RESTART_KEY: int = pyxel.KEY_R
+
+CELL_COLORS: tuple[int, ...] = (
+    pyxel.COLOR_BLACK,      # empty
+    pyxel.COLOR_CYAN,       # I
+    pyxel.COLOR_YELLOW,     # O
+    pyxel.COLOR_GREEN,      # S
+    pyxel.COLOR_RED,        # Z
+    pyxel.COLOR_DARK_BLUE,  # J
+    pyxel.COLOR_ORANGE,     # L
+    pyxel.COLOR_PURPLE,     # T
+    pyxel.COLOR_GRAY,       # garbage
+    pyxel.COLOR_NAVY,       # wall
+    pyxel.COLOR_GRAY,       # ghost
+    pyxel.COLOR_BLACK,      # blank
+)
+TRANSPARENT: int = pyxel.COLOR_PINK
+"""colour of the parts of mino sprites which are not drawn, not used by any cell"""
+
+SPRITE_SIZE: int = 4 * CELL_SIZE
+_TILE_V: int = 0
+_SPRITE_V: int = CELL_SIZE
+_GHOST_U: int = 4 * SPRITE_SIZE
+
+def _tile_u(cell: int) -> int:
+    return cell * CELL_SIZE
+
+def _sprite_uv(kind: int, direction: int, ghost: bool) -> tuple[int, int]:
+    """top left of the sprite of a mino in image bank 0"""
+    return (_GHOST_U if ghost else 0) + direction * SPRITE_SIZE, _SPRITE_V + (kind - 1) * SPRITE_SIZE
+
+def _draw_tile(image: pyxel.Image, u: int, v: int, cell: int) -> None:
+    color = CELL_COLORS[cell]
+    if cell == Cell.EMPTY:
+        image.rect(u, v, CELL_SIZE, CELL_SIZE, pyxel.COLOR_BLACK)
+        image.pset(u + CELL_SIZE // 2, v + CELL_SIZE // 2, pyxel.COLOR_NAVY)
+    elif cell == Cell.BLANK:
+        image.rect(u, v, CELL_SIZE, CELL_SIZE, pyxel.COLOR_BLACK)
+    elif cell == Cell.GHOST:
+        image.rect(u, v, CELL_SIZE, CELL_SIZE, TRANSPARENT)
+        image.rectb(u, v, CELL_SIZE, CELL_SIZE, color)
+    else:
+        image.rect(u, v, CELL_SIZE, CELL_SIZE, color)
+        image.rectb(u, v, CELL_SIZE, CELL_SIZE, pyxel.COLOR_BLACK)
+        image.pset(u + 1, v + 1, pyxel.COLOR_WHITE)
+
+def rasterize_sprites(image: pyxel.Image) -> None:
+    """draw the tile of every cell code and the sprite of every mino and ghost in every direction
+
+    tiles are in the top row, sprites of a kind are in one row under them,
+    the minos on the left and the ghosts on the right
+    """
+    for cell in range(len(CELL_COLORS)):
+        _draw_tile(image, _tile_u(cell), _TILE_V, cell)
+    for kind in range(1, len(MINO_SHAPES)):
+        for direction in DIRECTIONS:
+            shape = MINO_SHAPES[kind][direction.value]
+            for ghost in (False, True):
+                u, v = _sprite_uv(kind, direction.value, ghost)
+                image.rect(u, v, SPRITE_SIZE, SPRITE_SIZE, TRANSPARENT)
+                for line_y, mask in shape.masks.lines:
+                    y = v + (shape.size.y - 1 - line_y) * CELL_SIZE
+                    for x in range(shape.size.x):
+                        if mask & (1 << x):
+                            _draw_tile(image, u + x * CELL_SIZE, y, Cell.GHOST if ghost else kind)
+                            if ghost:
+                                image.rectb(u + x * CELL_SIZE, y, CELL_SIZE, CELL_SIZE, CELL_COLORS[kind])
+
+class Frontend:
+    """plays a game with the keyboard, key presses and releases go to a TickScheduler every update"""
+    OVERLAY_INTERVAL: ClassVar[int] = 15
+    """updates between redraws of the frame time overlay"""
+    SCREEN_WIDTH: ClassVar[int] = Board.WIDTH * CELL_SIZE
+    SCREEN_HEIGHT: ClassVar[int] = (Board.HEIGHT + 1) * CELL_SIZE
+    def __init__(self, seed: int | None = None, handling: Handling = Handling()) -> None:
+        self.seed = seed
+        self.handling = handling
+        self.board = Board()
+        self.tetris, self.scheduler = self._new_game()
+        self.drawn = bytearray([Cell.UNKNOWN]) * (Board.WIDTH * Board.HEIGHT)
+        self.sprite_cells: list[int] = []
+        self.sprite_state: tuple[int, int, int, int, int] | None = None
+        self.update_seconds = 0.0
+        self.draw_seconds = 0.0
+        self.frame_seconds = 1 / FPS
+        self.last_draw = time.perf_counter()
+        self.frames = 0
+        self.held_keys = 0
+        """bit of each scheduler key with a pyxel key held down in the last update"""
+        rasterize_sprites(pyxel.images[0])
+    def _new_game(self) -> tuple[Tetris, TickScheduler]:
+        tetris = Tetris(self.seed)
+        tetris.make_mino()
+        return tetris, TickScheduler(tetris, self.handling)
+    def invalidate(self) -> None:
+        """forget the drawn screen, so that the next frame is drawn in full"""
+        self.drawn = bytearray([Cell.UNKNOWN]) * len(self.drawn)
+        self.sprite_state = None
+    def update(self) -> None:
+        start = time.perf_counter()
+        if pyxel.btnp(RESTART_KEY) or self.scheduler.topped_out:
+            self.tetris, self.scheduler = self._new_game()
+        scheduler = self.scheduler
+        # a scheduler key is down while any of its pyxel keys is, so that releasing
+        # one of two held keys of the same action does not release the action
+        held_keys = 0
+        for pyxel_key, key in KEY_BINDINGS:
+            if pyxel.btn(pyxel_key):
+                held_keys |= 1 << key
+        changed = held_keys ^ self.held_keys
+        self.held_keys = held_keys
+        for key in range(Key.NUMBER):
+            if changed & (1 << key):
+                if held_keys & (1 << key):
+                    scheduler.key_down(key)
+                else:
+                    scheduler.key_up(key)
+        scheduler.tick()
+        self._smooth('update_seconds', time.perf_counter() - start)
+    def _smooth(self, name: str, seconds: float) -> None:
+        setattr(self, name, getattr(self, name) * 0.9 + seconds * 0.1)
+    def draw(self) -> None:
+        start = time.perf_counter()
+        self._smooth('frame_seconds', start - self.last_draw)
+        self.last_draw = start
+        full_redraw = self.drawn[0] == Cell.UNKNOWN
+        if full_redraw:
+            pyxel.cls(pyxel.COLOR_BLACK)
+        base = self.board.make_base(self.tetris)
+        dirty = self._dirty_cells(base)
+        for index in dirty:
+            row, x = divmod(index, Board.WIDTH)
+            pyxel.blt(x * CELL_SIZE, row * CELL_SIZE, 0, _tile_u(base[index]), _TILE_V, CELL_SIZE, CELL_SIZE)
+        self.drawn = base
+        sprite_state = self._sprite_state()
+        if len(dirty) > 0 or sprite_state != self.sprite_state:
+            self._draw_sprites(sprite_state)
+        if full_redraw:
+            pyxel.text(Board.HOLD_X * CELL_SIZE, 1, 'HOLD', pyxel.COLOR_WHITE)
+            pyxel.text(Board.NEXT_X * CELL_SIZE, 1, 'NEXT', pyxel.COLOR_WHITE)
+        self._smooth('draw_seconds', time.perf_counter() - start)
+        if full_redraw or self.frames % Frontend.OVERLAY_INTERVAL == 0:
+            self._draw_overlay()
+        self.frames += 1
+    def _dirty_cells(self, base: bytearray) -> list[int]:
+        """cells whose code changed and cells the sprites were drawn over"""
+        drawn = self.drawn
+        width = Board.WIDTH
+        dirty: set[int] = set()
+        for row in range(Board.HEIGHT):
+            start = row * width
+            if base[start:start + width] == drawn[start:start + width]:
+                continue
+            for index in range(start, start + width):
+                if base[index] != drawn[index]:
+                    dirty.add(index)
+        if self._sprite_state() != self.sprite_state or len(dirty) > 0:
+            dirty.update(self.sprite_cells)
+        return sorted(dirty)
+    def _sprite_state(self) -> tuple[int, int, int, int, int]:
+        """(kind, direction, x, y, ghost y) of current mino"""
+        tetris = self.tetris
+        mino = tetris.current_mino.mino
+        position = tetris.current_mino.position
+        return (mino.KIND, mino.get_direction().value, position.x, position.y, tetris.get_ghost_block().y)
+    def _draw_sprites(self, sprite_state: tuple[int, int, int, int, int]) -> None:
+        """draw the ghost and current mino over the field, cut at the top of the visible rows"""
+        kind, direction, position_x, position_y, ghost_y = sprite_state
+        self.sprite_state = sprite_state
+        self.sprite_cells = []
+        if kind == 0:
+            return
+        shape = MINO_SHAPES[kind][direction]
+        pyxel.clip(Board.FIELD_X * CELL_SIZE, 0, 10 * CELL_SIZE, Board.VISIBLE_ROWS * CELL_SIZE)
+        for y, ghost in ((ghost_y, True), (position_y, False)):
+            u, v = _sprite_uv(kind, direction, ghost)
+            pyxel.blt(
+                (Board.FIELD_X + position_x) * CELL_SIZE,
+                (Board.VISIBLE_ROWS - y - shape.size.y) * CELL_SIZE,
+                0, u, v, shape.size.x * CELL_SIZE, shape.size.y * CELL_SIZE, TRANSPARENT
+            )
+            frame = bytearray(len(self.drawn))
+            Board.put_shape(frame, shape.masks, position_x, y, 1)
+            self.sprite_cells += [index for index, cell in enumerate(frame) if cell]
+        pyxel.clip()
+    def _draw_overlay(self) -> None:
+        """frames per second and the milliseconds spent in update and draw under the board"""
+        y = Board.HEIGHT * CELL_SIZE
+        pyxel.rect(0, y, Frontend.SCREEN_WIDTH, CELL_SIZE, pyxel.COLOR_BLACK)
+        fps = 1 / self.frame_seconds if self.frame_seconds > 0 else 0.0
+        pyxel.text(
+            1, y + 1,
+            f'FPS {fps:4.1f} UPD {self.update_seconds * 1e3:4.2f}MS DRW {self.draw_seconds * 1e3:4.2f}MS',
+            pyxel.COLOR_WHITE
+        )
+
+def main() -> None:
+    pyxel.init(Frontend.SCREEN_WIDTH, Frontend.SCREEN_HEIGHT, title='Tetris', fps=FPS)
+    frontend = Frontend()
+    pyxel.run(frontend.update, frontend.draw)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""load generator for server.py
+
+opens connections, joins games spread over them and plays every game with random
+moves and a hard drop at a fixed number of pieces a second, measuring the time from
+sending inputs to their acknowledgement after a warm up in which the games join; a
+game which is over joins again, so the number of games stays the same
+
+Example:
+    python loadgen.py --port 7400 --games 5000 --connections 50 --duration 30
+"""
+import gc
+import time
+import heapq
+import asyncio
+import argparse
+from random import Random
+from replay import ReplayInput
+from server import GC_THRESHOLDS
+
+class LoadGame:
+    """a game played by the load generator"""
+    def __init__(self, game_id: int, room_id: int) -> None:
+        self.game_id = game_id
+        self.room_id = room_id
+        self.sequence = 0
+        self.sent_at = 0.0
+        self.waiting_ack = False
+        self.over = False
+
+class LoadConnection(asyncio.Protocol):
+    """a connection playing many games, the acknowledgement latencies go to the generator"""
+    def __init__(self, generator: 'LoadGenerator') -> None:
+        self.generator = generator
+        self.transport: asyncio.Transport | None = None
+        self.buffer = b''
+        self.games: dict[int, LoadGame] = {}
+        self.rooms: dict[int, list[LoadGame]] = {}
+        self.closed = asyncio.get_running_loop().create_future()
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+    def connection_lost(self, exception: Exception | None) -> None:
+        self.transport = None
+        if not self.closed.done():
+            self.closed.set_result(None)
+    def send(self, data: bytes) -> None:
+        if not self.transport is None:
+            self.transport.write(data)
+    def join(self, number: int) -> None:
+        self.send(f'J {self.generator.room_size}\n'.encode() * number)
+    def data_received(self, data: bytes) -> None:
+        now = time.perf_counter()
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+        generator = self.generator
+        for line in lines:
+            words = line.split()
+            if len(words) <= 0:
+                continue
+            command = words[0]
+            if command == b'A':
+                game = self.games.get(int(words[1]))
+                if not game is None and game.waiting_ack and int(words[2]) == game.sequence:
+                    if game.sent_at >= generator.measure_from:
+                        generator.latencies.append(now - game.sent_at)
+                    game.waiting_ack = False
+            elif command == b'U':
+                generator.updates += 1
+            elif command == b'W':
+                game = LoadGame(int(words[1]), int(words[2]))
+                self.games[game.game_id] = game
+                self.rooms.setdefault(game.room_id, []).append(game)
+            elif command == b'S':
+                for game in self.rooms.get(int(words[1]), []):
+                    generator.schedule(self, game, now)
+            elif command == b'O':
+                room_games = self.rooms.pop(int(words[1]), [])
+                for game in room_games:
+                    game.over = True
+                    del self.games[game.game_id]
+                generator.rooms_over += 1
+                if generator.running:
+                    self.join(len(room_games))
+            elif command == b'E':
+                generator.errors += 1
+
+class LoadGenerator:
+    """games of all connections, played from one heap of the times their next inputs are due
+
+    Args:
+        games (int): number of games played at once
+        connections (int): number of connections the games are spread over
+        room_size (int): players of a room
+        pieces_per_second (float): hard drops of every game a second
+        seed (int | None): seed of the inputs
+    """
+    def __init__(self, games: int, connections: int, room_size: int, pieces_per_second: float, seed: int | None = None) -> None:
+        self.games = games
+        self.connection_count = connections
+        self.room_size = room_size
+        self.interval = 1 / pieces_per_second
+        self.random_generator = Random(seed)
+        self.connections: list[LoadConnection] = []
+        self.due: list[tuple[float, int, LoadConnection, LoadGame]] = []
+        self.order = 0
+        self.running = True
+        self.measure_from = float('inf')
+        self.latencies: list[float] = []
+        self.messages = 0
+        self.updates = 0
+        self.rooms_over = 0
+        self.errors = 0
+    def schedule(self, connection: LoadConnection, game: LoadGame, now: float) -> None:
+        """play game after a random part of the interval, so that games do not play together"""
+        self.order += 1
+        heapq.heappush(self.due, (now + self.random_generator.random() * self.interval, self.order, connection, game))
+    def make_inputs(self) -> bytes:
+        """random rotations and moves, then a hard drop"""
+        random_generator = self.random_generator
+        rotation = str(ReplayInput.ROTATE_RIGHT) * random_generator.randrange(4)
+        move = str(random_generator.choice((ReplayInput.MOVE_LEFT, ReplayInput.MOVE_RIGHT))) * random_generator.randrange(6)
+        return (rotation + move + str(ReplayInput.HARD_DROP)).encode()
+    async def play(self) -> None:
+        """send the inputs which are due, a game waiting for an acknowledgement skips its turn"""
+        due = self.due
+        while self.running:
+            now = time.perf_counter()
+            while len(due) > 0 and due[0][0] <= now:
+                due_time, order, connection, game = heapq.heappop(due)
+                if game.over:
+                    continue
+                if not game.waiting_ack:
+                    game.sequence += 1
+                    game.sent_at = time.perf_counter()
+                    game.waiting_ack = True
+                    connection.send(b'I %d %d %s\n' % (game.game_id, game.sequence, self.make_inputs()))
+                    self.messages += 1
+                self.order += 1
+                heapq.heappush(due, (due_time + self.interval, self.order, connection, game))
+            await asyncio.sleep(0.001 if len(due) <= 0 else min(max(due[0][0] - time.perf_counter(), 0), 0.01))
+    async def run(self, host: str, port: int, unix: str | None, duration: float, warmup: float = 2.0) -> None:
+        """play for warmup and then duration seconds, the acknowledgements of the warm up are not measured"""
+        gc.set_threshold(*GC_THRESHOLDS)
+        loop = asyncio.get_running_loop()
+        for index in range(self.connection_count):
+            if unix is None:
+                transport, connection = await loop.create_connection(lambda: LoadConnection(self), host, port)
+            else:
+                transport, connection = await loop.create_unix_connection(lambda: LoadConnection(self), unix)
+            self.connections.append(connection)
+        for index, connection in enumerate(self.connections):
+            connection.join(self.games // self.connection_count + (index < self.games % self.connection_count))
+        player = asyncio.create_task(self.play())
+        await asyncio.sleep(warmup)
+        self.messages = 0
+        start = self.measure_from = time.perf_counter()
+        await asyncio.sleep(duration)
+        self.running = False
+        await player
+        elapsed = time.perf_counter() - start
+        for connection in self.connections:
+            if not connection.transport is None:
+                connection.transport.close()
+        await asyncio.gather(*(connection.closed for connection in self.connections))
+        self.report(elapsed)
+    def report(self, elapsed: float) -> None:
+        latencies = sorted(self.latencies)
+        def percentile(fraction: float) -> float:
+            if len(latencies) <= 0:
+                return 0.0
+            return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1e3
+        print(
+            f'{self.games} games on {self.connection_count} connections, {elapsed:.1f} s\n'
+            f'{self.messages} messages ({self.messages / elapsed:.0f}/s), {len(latencies)} acks, '
+            f'{self.updates} room updates, {self.rooms_over} rooms over, {self.errors} errors\n'
+            f'ack latency ms: p50 {percentile(0.5):.2f} p99 {percentile(0.99):.2f} max {percentile(1.0):.2f}'
+        )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7400)
+    parser.add_argument('--unix', default=None, help='path of a Unix socket to connect to instead of TCP')
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--room-size', type=int, default=2)
+    parser.add_argument('--pps', type=float, default=1.0, help='pieces a second of every game')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to measure')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds to play before measuring')
+    parser.add_argument('--seed', type=int, default=None)
+    arguments = parser.parse_args()
+    generator = LoadGenerator(arguments.games, arguments.connections, arguments.room_size, arguments.pps, arguments.seed)
+    asyncio.run(generator.run(arguments.host, arguments.port, arguments.unix, arguments.duration, arguments.warmup))
@@ -1,22 +1,57 @@
+import time
+import struct
 from abc import abstractmethod, ABCMeta
-from typing import Self, ClassVar
+from typing import ClassVar, Callable, Any, Sequence
 from dataclasses import dataclass, field
-from random import sample, Random
-from copy import deepcopy
+from random import Random
+from randomizer import Generator, SevenBagGenerator, Randomizer, CountingRandom
 
-@dataclass(frozen=True, eq=True)
+@dataclass(frozen=True, eq=True, slots=True)
 class Block:
+    """a block type, grids keep only the numbers and one Block of each type is shared
+
+    Block.of, EMPTY and WALL return the instances of BLOCKS, nothing is made after import
+    """
     _block_type: int
     EMPTY_NUMBER: ClassVar[int] = 0
+    GARBAGE_NUMBER: ClassVar[int] = 8
     WALL_NUMBER: ClassVar[int] = 9
     @classmethod
-    def EMPTY(cls) -> Self:
-        return cls(Block.EMPTY_NUMBER)
+    def of(cls, block_type: int) -> 'Block':
+        return BLOCKS[block_type]
+    @classmethod
+    def EMPTY(cls) -> 'Block':
+        return BLOCKS[Block.EMPTY_NUMBER]
     @classmethod
-    def WALL(cls) -> Self:
-        return cls(Block.WALL_NUMBER)
+    def GARBAGE(cls) -> 'Block':
+        return BLOCKS[Block.GARBAGE_NUMBER]
+    @classmethod
+    def WALL(cls) -> 'Block':
+        return BLOCKS[Block.WALL_NUMBER]
     def is_empty(self) -> bool:
-        return self._block_type is Block.EMPTY_NUMBER
+        return self._block_type == Block.EMPTY_NUMBER
+
+BLOCKS: tuple[Block, ...] = tuple(Block(block_type) for block_type in range(Block.WALL_NUMBER + 1))
+"""the Block of every block type, indexed by block type"""
+
+_LOW_NIBBLE = bytes(i & 15 for i in range(256))
+_HIGH_NIBBLE = bytes(i >> 4 for i in range(256))
+_TO_HIGH_NIBBLE = bytes((i << 4) & 255 for i in range(256))
+
+def pack_nibbles(values: bytes) -> bytes:
+    """two values under 16 in a byte, the first one in the low 4 bits"""
+    if len(values) % 2 != 0:
+        values = values + b'\x00'
+    low = int.from_bytes(values[0::2], 'little')
+    high = int.from_bytes(values[1::2].translate(_TO_HIGH_NIBBLE), 'little')
+    return (low | high).to_bytes(len(values) // 2, 'little')
+
+def unpack_nibbles(packed: bytes) -> bytes:
+    """the inverse of pack_nibbles, with a 0 at the end for an odd number of values"""
+    values = bytearray(len(packed) * 2)
+    values[0::2] = packed.translate(_LOW_NIBBLE)
+    values[1::2] = packed.translate(_HIGH_NIBBLE)
+    return bytes(values)
 
 @dataclass(frozen=True, slots=True)
 class Size:
@@ -60,11 +95,6 @@ class PlotGridPosition:
     x: int
     y: int
 
-@dataclass(frozen=True, slots=True)
-class RelativePosition:
-    x: int
-    y: int
-
 class InvalidDirectionException(Exception):
     pass
 
@@ -94,31 +124,26 @@ class Direction:
     def D(cls) -> 'Direction':
         return cls(Direction._NUMBER_D)
     def rotate_left(self) -> 'Direction':
-        if self == Direction.A():
-            return Direction.D()
-        if self == Direction.B():
-            return Direction.A()
-        if self == Direction.C():
-            return Direction.B()
-        if self == Direction.D():
-            return Direction.C()
-        raise InvalidDirectionException()
+        if not Direction._NUMBER_A <= self.value <= Direction._NUMBER_D:
+            raise InvalidDirectionException()
+        return DIRECTIONS[(self.value - 1) % 4]
     def rotate_right(self) -> 'Direction':
-        if self == Direction.A():
-            return Direction.B()
-        if self == Direction.B():
-            return Direction.C()
-        if self == Direction.C():
-            return Direction.D()
-        if self == Direction.D():
-            return Direction.A()
-        raise InvalidDirectionException()
+        if not Direction._NUMBER_A <= self.value <= Direction._NUMBER_D:
+            raise InvalidDirectionException()
+        return DIRECTIONS[(self.value + 1) % 4]
+
+DIRECTIONS: tuple[Direction, ...] = (Direction.A(), Direction.B(), Direction.C(), Direction.D())
+"""every direction, indexed by Direction.value"""
 
 @dataclass(frozen=True, slots=True, eq=True)
 class SuperRotationStep:
     step: int
 
 class Grid:
+    """blocks of a rectangle, one bytearray of block types per row
+
+    grid[y][x] is the block type at (x, y), get_block gives it as a shared Block
+    """
     @classmethod
     def from_string_list(cls, new_list: list[list[str]], block_type: Block) -> 'Grid':
         new_grid: Grid = cls(Size(len(new_list[0]), len(new_list)))
@@ -130,11 +155,13 @@ class Grid:
     def __init__(self, size: Size) -> None:
         self.size_x: int = size.x
         self.size_y: int = size.y
-        self.grid: list[list[Block]] = [[ Block.EMPTY() for i in range(size.x)] for j in range(size.y)]
+        self.grid: list[bytearray] = [bytearray([Block.EMPTY_NUMBER]) * size.x for j in range(size.y)]
     def is_empty(self, position: Position) -> bool:
-        return self.grid[position.y][position.x].is_empty()
+        return self.grid[position.y][position.x] == Block.EMPTY_NUMBER
+    def get_block(self, position: Position) -> Block:
+        return BLOCKS[self.grid[position.y][position.x]]
     def add_block(self, position: Position, block: Block) -> None:
-        self.grid[position.y][position.x] = block
+        self.grid[position.y][position.x] = block._block_type
     def _is_outside(self, position_x: int, position_y: int) -> bool:
         if (position_x < 0) or (position_y < 0):
             return True
@@ -142,13 +169,18 @@ class Grid:
             return True
         return False
     def plot_grid(self, position: Position, size: Size) -> 'Grid':
+        """copy of the blocks of a rectangle, outside of the grid is wall"""
         new_grid = Grid(size)
+        start = max(position.x, 0)
+        end = min(position.x + size.x, self.size_x)
         for y in range(size.y):
-            for x in range(size.x):
-                if self._is_outside(position.x+x, position.y+y):
-                    new_grid.add_block(Position(x, y), Block.WALL())
-                if not self._is_outside(position.x+x, position.y+y):
-                    new_grid.add_block(Position(x, y), self.grid[position.y + y][position.x + x])
+            new_line = new_grid.grid[y]
+            if self._is_outside(start, position.y + y) or start >= end:
+                new_line[:] = bytes([Block.WALL_NUMBER]) * size.x
+                continue
+            new_line[:start - position.x] = bytes([Block.WALL_NUMBER]) * (start - position.x)
+            new_line[start - position.x:end - position.x] = self.grid[position.y + y][start:end]
+            new_line[end - position.x:] = bytes([Block.WALL_NUMBER]) * (position.x + size.x - end)
         return new_grid
     def get_size(self) -> Size:
         if len(self.grid) <= 0:
@@ -159,39 +191,608 @@ class Grid:
         # for line_number, column in enumerate(reversed(self.grid)):
         for line_number, column in enumerate(self.grid):
             return_string += f'  {str(line_number).zfill(3)}[ '
-            for block in column:
-                if block.is_empty():
+            for block_type in column:
+                if block_type == Block.EMPTY_NUMBER:
                     return_string += ' , '
-                if not block.is_empty():
-                    return_string += str(block._block_type) + ', '
+                if not block_type == Block.EMPTY_NUMBER:
+                    return_string += str(block_type) + ', '
             return_string += ']\n'
         return_string += ']\n'
         return return_string
 
+@dataclass(frozen=True, slots=True)
+class RowMasks:
+    """occupied blocks of a shape as one bitmask per row
+
+    bit x of rows[y] is set when the block at (x, y) of the shape is not empty,
+    lines are the (y, mask) pairs of the rows which are not empty
+
+    bottoms and tops are the (x, y) of the lowest and the highest block of each column
+
+    left, right, bottom and top are the bounds of the occupied blocks,
+    they are only meaningful when lines is not empty
+    """
+    rows: tuple[int, ...]
+    lines: tuple[tuple[int, int], ...]
+    bottoms: tuple[tuple[int, int], ...]
+    tops: tuple[tuple[int, int], ...]
+    left: int
+    right: int
+    bottom: int
+    top: int
+    @classmethod
+    def from_grid(cls, grid: Grid) -> 'RowMasks':
+        rows: list[int] = []
+        xs: list[int] = []
+        ys: list[int] = []
+        for y, column in enumerate(grid.grid):
+            mask = 0
+            for x, block_type in enumerate(column):
+                if block_type != Block.EMPTY_NUMBER:
+                    mask |= 1 << x
+                    xs.append(x)
+                    ys.append(y)
+            rows.append(mask)
+        lines = tuple((y, mask) for y, mask in enumerate(rows) if mask != 0)
+        if len(lines) <= 0:
+            return cls(tuple(rows), lines, (), (), 0, 0, 0, 0)
+        columns = sorted(set(xs))
+        bottoms = tuple((x, min(y for i, y in enumerate(ys) if xs[i] == x)) for x in columns)
+        tops = tuple((x, max(y for i, y in enumerate(ys) if xs[i] == x)) for x in columns)
+        return cls(tuple(rows), lines, bottoms, tops, min(xs), max(xs), min(ys), max(ys))
+
+ZOBRIST_SEED: int = 0x7E7815
+"""seed of the Zobrist keys, which are the same in every process"""
+_MASK_64: int = (1 << 64) - 1
+
+def mix64(value: int) -> int:
+    """the splitmix64 finalizer, a well spread 64-bit int made from an int under 2 ** 64"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK_64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK_64
+    return value ^ (value >> 31)
+
+@dataclass(frozen=True, slots=True)
+class ZobristKeys:
+    """random 64-bit keys of the blocks of a field, the Zobrist hash of a field is the xor
+    of the keys of its blocks
+
+    the keys of the blocks of a row are xored beforehand for every mask of its low and
+    high half, so the key of a row is two lookups and the key of an empty row is 0
+
+    Example:
+        key = keys.low[y][row & keys.low_mask] ^ keys.high[y][row >> keys.low_bits]
+    """
+    low: tuple[tuple[int, ...], ...]
+    high: tuple[tuple[int, ...], ...]
+    low_bits: int
+    low_mask: int
+    @classmethod
+    def of(cls, size: Size) -> 'ZobristKeys':
+        """the keys of fields of a size, made once"""
+        keys = _ZOBRIST_KEYS.get(size)
+        if keys is None:
+            keys = _ZOBRIST_KEYS[size] = cls.make(size)
+        return keys
+    @classmethod
+    def make(cls, size: Size) -> 'ZobristKeys':
+        random_generator = Random(ZOBRIST_SEED)
+        low_bits = (size.x + 1) // 2
+        low: list[tuple[int, ...]] = []
+        high: list[tuple[int, ...]] = []
+        for y in range(size.y):
+            block_keys = [random_generator.getrandbits(64) for x in range(size.x)]
+            for tables, first_x, bits in ((low, 0, low_bits), (high, low_bits, size.x - low_bits)):
+                table = [0] * (1 << bits)
+                for mask in range(1, 1 << bits):
+                    lowest = mask & -mask
+                    table[mask] = table[mask ^ lowest] ^ block_keys[first_x + lowest.bit_length() - 1]
+                tables.append(tuple(table))
+        return cls(tuple(low), tuple(high), low_bits, (1 << low_bits) - 1)
+    def row_key(self, y: int, row: int) -> int:
+        """xor of the keys of the blocks of row mask at y"""
+        return self.low[y][row & self.low_mask] ^ self.high[y][row >> self.low_bits]
+    def hash_rows(self, rows: Sequence[int]) -> int:
+        """Zobrist hash of a field with row masks rows"""
+        low = self.low
+        high = self.high
+        low_bits = self.low_bits
+        low_mask = self.low_mask
+        field_hash = 0
+        for y, row in enumerate(rows):
+            if row:
+                field_hash ^= low[y][row & low_mask] ^ high[y][row >> low_bits]
+        return field_hash
+
+_ZOBRIST_KEYS: dict[Size, ZobristKeys] = {}
+
+@dataclass(frozen=True, slots=True)
+class FieldSnapshot:
+    """immutable copy of everything Field keeps, made by Field.snapshot"""
+    rows: tuple[int, ...]
+    blocks: tuple[bytes, ...]
+    heights: tuple[int, ...]
+    block_count: int
+    dirty_rows: int
+    zobrist_hash: int
+    @classmethod
+    def from_block_types(cls, block_types: bytes, size: Size) -> 'FieldSnapshot':
+        """snapshot of a field with no filled line from the block type of every block
+
+        Args:
+            block_types (bytes): Block._block_type of (x, y) at index y * size.x + x
+            size (Size): size of the field
+        """
+        blocks = tuple(bytes(block_types[y * size.x:(y + 1) * size.x]) for y in range(size.y))
+        rows = tuple(
+            sum(1 << x for x in range(size.x) if block_types[y * size.x + x] != Block.EMPTY_NUMBER)
+            for y in range(size.y)
+        )
+        heights = tuple(
+            max((y + 1 for y in range(size.y) if rows[y] & (1 << x)), default=0)
+            for x in range(size.x)
+        )
+        block_count = sum(row.bit_count() for row in rows)
+        return cls(rows, blocks, heights, block_count, 0, ZobristKeys.of(size).hash_rows(rows))
+    @classmethod
+    def from_rows(cls, rows: tuple[int, ...], blocks: tuple[bytes, ...]) -> 'FieldSnapshot':
+        """snapshot of the row masks and the block types of every row, which have to agree
+
+        heights come from a sweep down the rows which stops when every column is found,
+        without a look at each block, and the filled lines are dirty so that the next
+        clear_lines deletes them
+        """
+        size_x = len(blocks[0])
+        full_row = (1 << size_x) - 1
+        heights = [0] * size_x
+        seen = 0
+        y = len(rows)
+        while y > 0 and seen != full_row:
+            y -= 1
+            new_columns = rows[y] & ~seen
+            while new_columns:
+                column = new_columns & -new_columns
+                heights[column.bit_length() - 1] = y + 1
+                new_columns ^= column
+            seen |= rows[y]
+        dirty_rows = 0
+        if full_row in rows:
+            dirty_rows = sum(1 << y for y, row in enumerate(rows) if row == full_row)
+        zobrist_hash = ZobristKeys.of(Size(size_x, len(rows))).hash_rows(rows)
+        return cls(rows, blocks, tuple(heights), sum(map(int.bit_count, rows)), dirty_rows, zobrist_hash)
+    def to_block_types(self) -> bytes:
+        """block type of every block, the inverse of from_block_types"""
+        return b''.join(self.blocks)
+
+class Field(Grid):
+    """grid of the main field which also keeps one bitmask per row
+
+    bit x of rows[y] is set when the block at (x, y) is not empty, so that
+    collision, locking and line clear are a few integer operations per row
+
+    heights[x] is the height of the surface of column x, that is the y of
+    its highest block plus one, and version is counted up on every change
+
+    block_count is the number of blocks on the field and bit y of dirty_rows is set
+    for the rows changed since the last clear_lines, which are the only rows it checks
+
+    zobrist_hash is the Zobrist hash of the blocks, xored with the keys of the rows
+    which change, so that the same blocks give the same 64-bit int in every process
+
+    Note:
+        blocks must be changed through add_block, place, clear_lines or insert_garbage,
+        writing to grid directly makes rows and heights out of date
+    """
+    def __init__(self, size: Size) -> None:
+        super().__init__(size)
+        self.rows: list[int] = [0 for i in range(size.y)]
+        self.full_row: int = (1 << size.x) - 1
+        self.heights: list[int] = [0 for i in range(size.x)]
+        self.version: int = 0
+        self.block_count: int = 0
+        self.dirty_rows: int = 0
+        self.empty_line: bytes = bytes([Block.EMPTY_NUMBER]) * size.x
+        self.zobrist_keys: ZobristKeys = ZobristKeys.of(size)
+        self.zobrist_hash: int = 0
+        self.last_snapshot: FieldSnapshot | None = None
+        self.last_snapshot_version: int = -1
+    def add_block(self, position: Position, block: Block) -> None:
+        super().add_block(position, block)
+        bit = 1 << position.x
+        was_empty = not self.rows[position.y] & bit
+        if was_empty != block.is_empty():
+            self.zobrist_hash ^= self.zobrist_keys.row_key(position.y, bit)
+        if block.is_empty():
+            self.rows[position.y] &= ~bit
+            if not was_empty:
+                self.block_count -= 1
+            if self.heights[position.x] == position.y + 1:
+                self._lower_height(position.x)
+        else:
+            self.rows[position.y] |= bit
+            if was_empty:
+                self.block_count += 1
+            self.heights[position.x] = max(self.heights[position.x], position.y + 1)
+        self.dirty_rows |= 1 << position.y
+        self.version += 1
+    def _lower_height(self, position_x: int) -> None:
+        """move heights[position_x] down to the highest block at or under it"""
+        bit = 1 << position_x
+        height = self.heights[position_x]
+        while height > 0 and not self.rows[height - 1] & bit:
+            height -= 1
+        self.heights[position_x] = height
+    def can_place(self, masks: RowMasks, position_x: int, position_y: int) -> bool:
+        """whether a shape can be put at the position without overlapping blocks or walls
+
+        outside of the field is treated as wall by the bounds of masks,
+        so nothing is allocated for the check
+
+        Args:
+            masks (RowMasks): the shape to put
+            position_x (int): x coordinate of the bottom left of the shape
+            position_y (int): y coordinate of the bottom left of the shape
+
+        Returns:
+            bool: whether the shape can be put
+        """
+        lines = masks.lines
+        if not lines:
+            return True
+        if (position_x < -masks.left) or (position_x >= self.size_x - masks.right):
+            return False
+        if (position_y < -masks.bottom) or (position_y >= self.size_y - masks.top):
+            return False
+        field_rows = self.rows
+        if position_x >= 0:
+            for y, mask in lines:
+                if field_rows[position_y + y] & (mask << position_x):
+                    return False
+            return True
+        for y, mask in lines:
+            if field_rows[position_y + y] & (mask >> -position_x):
+                return False
+        return True
+    def box_mask(self, position_x: int, position_y: int, size: Size) -> int:
+        """blocks of a rectangle as one int, outside of the field is wall
+
+        bit y * size.x + x is set when the block at (x, y) of the rectangle, counted from
+        its bottom left, is not empty, so that a set of blocks is tested with one mask
+
+        Args:
+            position_x (int): x coordinate of the bottom left of the rectangle
+            position_y (int): y coordinate of the bottom left of the rectangle
+            size (Size): size of the rectangle
+        """
+        line_mask = (1 << size.x) - 1
+        if position_x >= 0:
+            wall = line_mask & ~(self.full_row >> position_x)
+        else:
+            wall = line_mask & ~(self.full_row << -position_x)
+        rows = self.rows
+        box = 0
+        for y in range(position_y + size.y - 1, position_y - 1, -1):
+            if y < 0 or y >= self.size_y:
+                line = line_mask
+            elif position_x >= 0:
+                line = (rows[y] >> position_x) & line_mask | wall
+            else:
+                line = (rows[y] << -position_x) & line_mask | wall
+            box = (box << size.x) | line
+        return box
+    def place(self, shape: Grid, masks: RowMasks, position_x: int, position_y: int) -> None:
+        """put the blocks of a shape on the field
+
+        Args:
+            shape (Grid): the blocks to put
+            masks (RowMasks): row masks of shape
+            position_x (int): x coordinate of the bottom left of the shape
+            position_y (int): y coordinate of the bottom left of the shape
+        """
+        for y, mask in masks.lines:
+            shape_line = shape.grid[y]
+            current_line = self.grid[position_y + y]
+            for x in range(masks.left, masks.right + 1):
+                if mask & (1 << x):
+                    current_line[position_x + x] = shape_line[x]
+            if position_x >= 0:
+                mask = mask << position_x
+            else:
+                mask = mask >> -position_x
+            added = mask & ~self.rows[position_y + y]
+            self.block_count += added.bit_count()
+            self.zobrist_hash ^= self.zobrist_keys.row_key(position_y + y, added)
+            self.rows[position_y + y] |= mask
+            self.dirty_rows |= 1 << (position_y + y)
+        heights = self.heights
+        for x, y in masks.tops:
+            if heights[position_x + x] <= position_y + y:
+                heights[position_x + x] = position_y + y + 1
+        self.version += 1
+    def drop_distance(self, masks: RowMasks, position_x: int, position_y: int) -> int:
+        """how many times a shape can move down from the position
+
+        when the shape is above the surface of every column it covers the distance
+        comes from its bottom profile against heights, otherwise it is searched row by row
+
+        Args:
+            masks (RowMasks): the shape to drop
+            position_x (int): x coordinate of the bottom left of the shape
+            position_y (int): y coordinate of the bottom left of the shape
+
+        Returns:
+            int: the number of rows the shape falls, 0 for an empty shape
+        """
+        if not masks.lines:
+            return 0
+        heights = self.heights
+        distance = position_y + masks.bottom
+        for x, y in masks.bottoms:
+            column_distance = position_y + y - heights[position_x + x]
+            if column_distance < 0:
+                return self._search_drop_distance(masks, position_x, position_y)
+            if column_distance < distance:
+                distance = column_distance
+        return distance
+    def _search_drop_distance(self, masks: RowMasks, position_x: int, position_y: int) -> int:
+        distance = 0
+        while self.can_place(masks, position_x, position_y - distance - 1):
+            distance += 1
+        return distance
+    def shift_distance(self, masks: RowMasks, position_x: int, position_y: int, direction: int) -> int:
+        """how many times a shape can move sideways from the position, in one sweep over its rows
+
+        only the first block of each run of blocks in a row can hit something first,
+        so the distance is the free cells in front of those blocks
+
+        Args:
+            masks (RowMasks): the shape to move, which can be put at the position
+            position_x (int): x coordinate of the bottom left of the shape
+            position_y (int): y coordinate of the bottom left of the shape
+            direction (int): -1 to move left, 1 to move right
+
+        Returns:
+            int: the number of columns the shape moves, 0 for an empty shape
+        """
+        if not masks.lines:
+            return 0
+        rows = self.rows
+        wall = 1 << self.size_x
+        distance = self.size_x
+        for y, mask in masks.lines:
+            row = rows[position_y + y]
+            if direction < 0:
+                fronts = mask & ~(mask << 1)
+            else:
+                fronts = mask & ~(mask >> 1)
+            while fronts:
+                front = fronts & -fronts
+                fronts ^= front
+                column = position_x + front.bit_length() - 1
+                if direction < 0:
+                    column_distance = column - (row & ((1 << column) - 1)).bit_length()
+                else:
+                    above = (row | wall) >> (column + 1)
+                    column_distance = (above & -above).bit_length() - 1
+                if column_distance < distance:
+                    distance = column_distance
+        return distance
+    def is_above_surface(self, masks: RowMasks, position_x: int, position_y: int) -> bool:
+        """whether every block of a shape at the position is above the surface of its column"""
+        heights = self.heights
+        for x, y in masks.bottoms:
+            if position_y + y < heights[position_x + x]:
+                return False
+        return True
+    def clear_lines(self) -> int:
+        """delete every filled line and put empty lines on the top
+
+        only the rows in dirty_rows are checked, the lines above are moved down in place
+        and the deleted lines are emptied and reused as the new top lines
+
+        Returns:
+            int: the number of deleted lines
+        """
+        rows = self.rows
+        full_row = self.full_row
+        filled_lines: list[int] = []
+        dirty_rows = self.dirty_rows
+        while dirty_rows:
+            lowest_bit = dirty_rows & -dirty_rows
+            y = lowest_bit.bit_length() - 1
+            if rows[y] == full_row:
+                filled_lines.append(y)
+            dirty_rows ^= lowest_bit
+        self.dirty_rows = 0
+        delete_line = len(filled_lines)
+        if delete_line <= 0:
+            return 0
+        grid = self.grid
+        top = max(self.heights)
+        deleted_lines = [grid[y] for y in filled_lines]
+        keys = self.zobrist_keys
+        zobrist_hash = self.zobrist_hash
+        write_y = filled_lines[0]
+        filled_index = 0
+        for read_y in range(filled_lines[0], top):
+            row = rows[read_y]
+            zobrist_hash ^= keys.row_key(read_y, row)
+            if filled_index < delete_line and read_y == filled_lines[filled_index]:
+                filled_index += 1
+                continue
+            zobrist_hash ^= keys.row_key(write_y, row)
+            rows[write_y] = row
+            grid[write_y] = grid[read_y]
+            write_y += 1
+        self.zobrist_hash = zobrist_hash
+        for current_line in deleted_lines:
+            current_line[:] = self.empty_line
+            rows[write_y] = 0
+            grid[write_y] = current_line
+            write_y += 1
+        for x in range(self.size_x):
+            self.heights[x] -= delete_line
+            self._lower_height(x)
+        self.block_count -= delete_line * self.size_x
+        self.version += 1
+        return delete_line
+    def insert_garbage(self, holes: Sequence[int], block: Block = Block.GARBAGE()) -> int:
+        """push lines of blocks with one empty block each in from the bottom
+
+        the lines are pushed in the order of holes, so the last one is the lowest; every line
+        moves up in one shift of the line lists and the top lines, pushed out of the field,
+        are reused as the new lines, as clear_lines does the other way
+
+        Args:
+            holes (Sequence[int]): x of the empty block of each line
+            block (Block): the blocks of the lines
+
+        Returns:
+            int: the number of blocks pushed out of the top of the field
+
+        Raises:
+            ValueError: when a hole is outside of the field or there are more lines than the field
+        """
+        number = len(holes)
+        if number <= 0:
+            return 0
+        size_x = self.size_x
+        size_y = self.size_y
+        if number > size_y:
+            raise ValueError(f'{number} lines do not fit in a field of {size_y}')
+        if min(holes) < 0 or max(holes) >= size_x:
+            raise ValueError(f'a hole of {list(holes)} is outside of a field of {size_x}')
+        grid = self.grid
+        rows = self.rows
+        heights = self.heights
+        top = max(heights)
+        keys = self.zobrist_keys
+        zobrist_hash = self.zobrist_hash
+        for y in range(top):
+            zobrist_hash ^= keys.row_key(y, rows[y])
+        lost_blocks = 0
+        if top + number > size_y:
+            lost_blocks = sum(row.bit_count() for row in rows[size_y - number:])
+        new_lines = grid[size_y - number:]
+        del grid[size_y - number:]
+        del rows[size_y - number:]
+        full_line = bytes([block._block_type]) * size_x
+        new_rows = [self.full_row ^ (1 << hole) for hole in reversed(holes)]
+        for line, hole in zip(new_lines, reversed(holes)):
+            line[:] = full_line
+            line[hole] = Block.EMPTY_NUMBER
+        grid[0:0] = new_lines
+        rows[0:0] = new_rows
+        for y in range(min(top + number, size_y)):
+            zobrist_hash ^= keys.row_key(y, rows[y])
+        self.zobrist_hash = zobrist_hash
+        # every column but the hole of the top new line reaches at least the new lines
+        top_hole = holes[0]
+        was_empty = heights[top_hole] <= 0
+        self.heights = heights = [height + number if height > 0 else number for height in heights]
+        if was_empty:
+            self._lower_height(top_hole)
+        if top + number > size_y:
+            for x in range(size_x):
+                if heights[x] > size_y:
+                    heights[x] = size_y
+                    self._lower_height(x)
+        self.block_count += number * (size_x - 1) - lost_blocks
+        self.dirty_rows = (self.dirty_rows << number) & ((1 << size_y) - 1)
+        self.version += 1
+        return lost_blocks
+    def is_clear(self) -> bool:
+        return self.block_count <= 0
+    def snapshot(self) -> FieldSnapshot:
+        """copy of the field, the same object is returned while the field does not change"""
+        if (self.last_snapshot is not None) and (self.last_snapshot_version == self.version):
+            return self.last_snapshot
+        self.last_snapshot = FieldSnapshot(
+            tuple(self.rows),
+            tuple(bytes(line) for line in self.grid),
+            tuple(self.heights),
+            self.block_count,
+            self.dirty_rows,
+            self.zobrist_hash
+        )
+        self.last_snapshot_version = self.version
+        return self.last_snapshot
+    def restore(self, snapshot: FieldSnapshot) -> None:
+        """go back to a snapshot, lines above both surfaces are empty and are kept as they are"""
+        top = max(max(self.heights), max(snapshot.heights))
+        grid = self.grid
+        blocks = snapshot.blocks
+        for y in range(top):
+            grid[y][:] = blocks[y]
+        self.rows = list(snapshot.rows)
+        self.heights = list(snapshot.heights)
+        self.block_count = snapshot.block_count
+        self.dirty_rows = snapshot.dirty_rows
+        self.zobrist_hash = snapshot.zobrist_hash
+        self.version += 1
+        self.last_snapshot = snapshot
+        self.last_snapshot_version = self.version
+
+@dataclass(frozen=True, slots=True)
+class MinoShape:
+    """one direction of a mino, built once when the mino table is made
+
+    cells are the (x, y) offsets of the blocks of grid from its bottom left
+    """
+    grid: Grid
+    size: Size
+    cells: tuple[tuple[int, int], ...]
+    masks: RowMasks
+    @classmethod
+    def from_grid(cls, grid: Grid) -> 'MinoShape':
+        cells: list[tuple[int, int]] = []
+        for y, column in enumerate(grid.grid):
+            for x, block_type in enumerate(column):
+                if block_type != Block.EMPTY_NUMBER:
+                    cells.append((x, y))
+        return cls(grid, grid.get_size(), tuple(cells), RowMasks.from_grid(grid))
+    @classmethod
+    def make_directions(cls, shape: Grid, rotate_right: Callable[[Grid], Grid]) -> tuple['MinoShape', ...]:
+        """shapes of every direction, indexed by Direction.value
+
+        Args:
+            shape (Grid): the shape in Direction.A()
+            rotate_right (Callable[[Grid], Grid]): makes the shape rotated right
+
+        Returns:
+            tuple[MinoShape, ...]: shapes from Direction.A() to Direction.D()
+        """
+        shapes: list[MinoShape] = []
+        for direction in DIRECTIONS:
+            shapes.append(cls.from_grid(shape))
+            shape = rotate_right(shape)
+        return tuple(shapes)
+
 class Mino(metaclass=ABCMeta):
-    @abstractmethod
+    """a mino is its kind and its direction, its shapes come from MINO_SHAPES
+
+    KIND is the block type number of the mino, which is also the index of MINO_SHAPES
+    """
+    KIND: ClassVar[int]
+    def __init__(self, direction: Direction = DIRECTIONS[0]) -> None:
+        self.current_direction: Direction = direction
     def rotate_right(self) -> None:
-        raise NotImplementedError()
-    @abstractmethod
+        self.current_direction = self.get_right_direction()
     def rotate_left(self) -> None:
-        raise NotImplementedError()
-    @abstractmethod
+        self.current_direction = self.get_left_direction()
+    def get_right_direction(self) -> Direction:
+        return self.current_direction.rotate_right()
+    def get_left_direction(self) -> Direction:
+        return self.current_direction.rotate_left()
+    def set_direction(self, direction: Direction) -> None:
+        self.current_direction = direction
+    def get_shape(self) -> MinoShape:
+        return MINO_SHAPES[self.KIND][self.current_direction.value]
     def get_grid(self) -> Grid:
-        raise NotImplementedError()
-    @abstractmethod
+        return self.get_shape().grid
     def get_size(self) -> Size:
-        raise NotImplementedError()
-    @abstractmethod
+        return self.get_shape().size
     def get_direction(self) -> Direction:
-        raise NotImplementedError()
-    @abstractmethod
-    def super_rotate(self,
-                     current_direction: Direction,
-                     previous_direction: Direction,
-                     current_step: SuperRotationStep,
-                     current_relative_position: RelativePosition
-                    ) -> RelativePosition:
-        raise NotImplementedError()
+        return self.current_direction
     @abstractmethod
     def get_default_mino(self) -> 'Mino':
         raise NotImplementedError()
@@ -200,443 +801,130 @@ class Mino3x3:
     def rotate_right(self, current_shape: Grid, block_type: Block) -> Grid:
         new_shape = Grid(Size(3, 3))
         new_shape.add_block(Position(1, 1), block_type)
-        current_grid: list[list[Block]] = current_shape.grid
+        current_grid: list[bytearray] = current_shape.grid
         for i in range(3):
-            if not current_grid[0][i].is_empty():
+            if current_grid[0][i] != Block.EMPTY_NUMBER:
                 new_shape.add_block(Position(0, 2-i), block_type)
-        if not current_grid[1][0].is_empty():
+        if current_grid[1][0] != Block.EMPTY_NUMBER:
             new_shape.add_block(Position(1, 2), block_type)
-        if not current_grid[1][2].is_empty():
+        if current_grid[1][2] != Block.EMPTY_NUMBER:
             new_shape.add_block(Position(1, 0), block_type)
         for i in range(3):
-            if not current_grid[2][i].is_empty():
+            if current_grid[2][i] != Block.EMPTY_NUMBER:
                 new_shape.add_block(Position(2, 2-i), block_type)
         return new_shape
     def rotate_left(self, current_shape: Grid, block_type: Block) -> Grid:
         new_shape = Grid(Size(3, 3))
         new_shape.add_block(Position(1, 1), block_type)
-        current_grid: list[list[Block]] = current_shape.grid
+        current_grid: list[bytearray] = current_shape.grid
         for i in range(3):
-            if not current_grid[0][i].is_empty():
+            if current_grid[0][i] != Block.EMPTY_NUMBER:
                 new_shape.add_block(Position(2, i), block_type)
-        if not current_grid[1][0].is_empty():
+        if current_grid[1][0] != Block.EMPTY_NUMBER:
             new_shape.add_block(Position(1, 0), block_type)
-        if not current_grid[1][2].is_empty():
+        if current_grid[1][2] != Block.EMPTY_NUMBER:
             new_shape.add_block(Position(1, 2), block_type)
         for i in range(3):
-            if not current_grid[2][i].is_empty():
+            if current_grid[2][i] != Block.EMPTY_NUMBER:
                 new_shape.add_block(Position(0, i), block_type)
         return new_shape
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        current_x = current_relative_position.x
-        current_y = current_relative_position.y
-        is_right_rotation = ((current_direction.value - 1) % 4) == previous_direction.value
-        if current_step == SuperRotationStep(0):
-            if current_direction == Direction.B():
-                return RelativePosition(current_x-1, current_y+0)
-            if current_direction == Direction.D():
-                return RelativePosition(current_x+1, current_y+0)
-            # rotate right
-            if is_right_rotation:
-                return RelativePosition(current_x-1, current_y+0)
-            # rotate left
-            if not is_right_rotation:
-                return RelativePosition(current_x+1, current_y+0)
-        if current_step == SuperRotationStep(1):
-            if (current_direction == Direction.B()) or (current_direction == Direction.D()):
-                return RelativePosition(current_x+0, current_y-1)
-            if (current_direction == Direction.A()) or (current_direction == Direction.C()):
-                return RelativePosition(current_x+0, current_y+1)
-        if current_step == SuperRotationStep(2):
-            if (current_direction == Direction.B()) or (current_direction == Direction.D()):
-                return RelativePosition(0, 2)
-            if (current_direction == Direction.A()) or (current_direction == Direction.C()):
-                return RelativePosition(0, -2)
-        if current_step == SuperRotationStep(3):
-            if current_direction == Direction.B():
-                return RelativePosition(current_x-1, current_y+0)
-            if current_direction == Direction.D():
-                return RelativePosition(current_x+1, current_y+0)
-            # rotate right
-            if is_right_rotation:
-                return RelativePosition(current_x-1, current_y+0)
-            # rotate left
-            if not is_right_rotation:
-                return RelativePosition(current_x+1, current_y+0)
-        return RelativePosition(0, 0)
 
 class IMino(Mino):
-    BLOCK_TYPE: Block = Block(1)
+    BLOCK_TYPE: Block = Block.of(1)
     SHAPE = Grid.from_string_list(list(reversed([
         ['', '', '', ''],
         ['o', 'o', 'o', 'o'],
         ['', '', '', ''],
         ['', '', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = IMino.SHAPE
-        self.current_direction: Direction = Direction.A()
-    def rotate_left(self) -> None:
-        new_shape = Grid(Size(4, 4))
-        for i in range(4):
-            for j in range(4):
-                if not self.current_shape.grid[j][i].is_empty():
-                    new_shape.add_block(Position(3-j, i), IMino.BLOCK_TYPE)
-        self.current_shape = new_shape
-        self.current_direction = self.current_direction.rotate_left()
-    def rotate_right(self) -> None:
+    KIND = BLOCK_TYPE._block_type
+    @staticmethod
+    def rotate_shape_right(current_shape: Grid) -> Grid:
         new_shape = Grid(Size(4, 4))
         for i in range(4):
             for j in range(4):
-                if not self.current_shape.grid[j][i].is_empty():
+                if current_shape.grid[j][i] != Block.EMPTY_NUMBER:
                     new_shape.add_block(Position(j, 3-i), IMino.BLOCK_TYPE)
-        self.current_shape = new_shape
-        self.current_direction = self.current_direction.rotate_right()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        current_x = current_relative_position.x
-        current_y = current_relative_position.y
-        is_right_rotation = ((current_direction.value - 1) % 4) == previous_direction.value
-        if current_step == SuperRotationStep(0):
-            if previous_direction == Direction.A():
-                if current_direction == Direction.B():
-                    return RelativePosition(current_x-2, current_y+0)
-                if current_direction == Direction.D():
-                    return RelativePosition(current_x-1, current_y+0)
-            if previous_direction == Direction.C():
-                if current_direction == Direction.B():
-                    return RelativePosition(current_x+1, current_y+0)
-                if current_direction == Direction.D():
-                    return RelativePosition(current_x+2, current_y+0)
-            if is_right_rotation:
-                return RelativePosition(current_x-1, current_y+0)
-            if not is_right_rotation:
-                return RelativePosition(current_x+1, current_y+0)
-        if current_step == SuperRotationStep(1):
-            if previous_direction == Direction.A():
-                return RelativePosition(current_x+3, current_y)
-            if previous_direction == Direction.C():
-                return RelativePosition(current_x-3, current_y)
-            if current_direction == Direction.A():
-                if is_right_rotation:
-                    return RelativePosition(1, current_y)
-                if not is_right_rotation:
-                    return RelativePosition(-1, current_y)
-            if current_direction == Direction.C():
-                if is_right_rotation:
-                    return RelativePosition(2, current_y)
-                if not is_right_rotation:
-                    return RelativePosition(-2, current_y)
-        if current_step == SuperRotationStep(2):
-            if current_direction == Direction.B():
-                if is_right_rotation:
-                    return RelativePosition(-2, 1)
-                if not is_right_rotation:
-                    return RelativePosition(1, 2)
-            if current_direction == Direction.D():
-                if is_right_rotation:
-                    return RelativePosition(2, -1)
-                if not is_right_rotation:
-                    return RelativePosition(-1, -2)
-            if current_direction == Direction.A():
-                if is_right_rotation:
-                    return RelativePosition(1, 2)
-                if not is_right_rotation:
-                    return RelativePosition(2, -1)
-            if current_direction == Direction.C():
-                if is_right_rotation:
-                    return RelativePosition(-1, -2)
-                if not is_right_rotation:
-                    return RelativePosition(-2, 1)
-        if current_step == SuperRotationStep(3):
-            if current_direction == Direction.B():
-                if is_right_rotation:
-                    return RelativePosition(1, -2)
-                if not is_right_rotation:
-                    return RelativePosition(-2, -1)
-            if current_direction == Direction.D():
-                if is_right_rotation:
-                    return RelativePosition(-1, 2)
-                if not is_right_rotation:
-                    return RelativePosition(2, 1)
-            if current_direction == Direction.A():
-                if is_right_rotation:
-                    return RelativePosition(-2, -1)
-                if not is_right_rotation:
-                    return RelativePosition(-1, 2)
-            if current_direction == Direction.C():
-                if is_right_rotation:
-                    return RelativePosition(2, 1)
-                if not is_right_rotation:
-                    return RelativePosition(1, -2)
-        return RelativePosition(0, 0)
+        return new_shape
     def get_default_mino(self) -> 'IMino':
         return IMino()
 
 class OMino(Mino):
-    BLOCK_TYPE: Block = Block(2)
+    BLOCK_TYPE: Block = Block.of(2)
     SHAPE = Grid.from_string_list(list(reversed([
         ['o', 'o'],
         ['o', 'o']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = OMino.SHAPE
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        return
-    def rotate_left(self) -> None:
-        return
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
+    KIND = BLOCK_TYPE._block_type
+    def get_right_direction(self) -> Direction:
+        return self.current_direction
+    def get_left_direction(self) -> Direction:
         return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return RelativePosition(0, 0)
     def get_default_mino(self) -> 'OMino':
         return OMino()
 
 class SMino(Mino):
-    BLOCK_TYPE: Block = Block(3)
+    BLOCK_TYPE: Block = Block.of(3)
     SHAPE = Grid.from_string_list(list(reversed([
         ['', 'o', 'o'],
         ['o', 'x', ''],
         ['', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = SMino.SHAPE
-        self.mino3x3: Mino3x3 = Mino3x3()
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        self.current_shape = self.mino3x3.rotate_right(self.current_shape, SMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_right()
-    def rotate_left(self) -> None:
-        self.current_shape = self.mino3x3.rotate_left(self.current_shape, SMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_left()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return self.mino3x3.super_rotate(
-                current_direction,
-                previous_direction,
-                current_step,
-                current_relative_position
-            )
+    KIND = BLOCK_TYPE._block_type
     def get_default_mino(self) -> 'SMino':
         return SMino()
 
 class ZMino(Mino):
-    BLOCK_TYPE = Block(4)
+    BLOCK_TYPE = Block.of(4)
     SHAPE = Grid.from_string_list(list(reversed([
         ['o', 'o', ''],
         ['', 'x', 'o'],
         ['', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = ZMino.SHAPE
-        self.mino3x3: Mino3x3 = Mino3x3()
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        self.current_shape = self.mino3x3.rotate_right(self.current_shape, ZMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_right()
-    def rotate_left(self) -> None:
-        self.current_shape = self.mino3x3.rotate_left(self.current_shape, ZMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_left()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return self.mino3x3.super_rotate(
-                current_direction,
-                previous_direction,
-                current_step,
-                current_relative_position
-            )
+    KIND = BLOCK_TYPE._block_type
     def get_default_mino(self) -> 'ZMino':
         return ZMino()
 
 class JMino(Mino):
-    BLOCK_TYPE: Block = Block(5)
+    BLOCK_TYPE: Block = Block.of(5)
     SHAPE = Grid.from_string_list(list(reversed([
         ['o', '', ''],
         ['o', 'x', 'o'],
         ['', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = JMino.SHAPE
-        self.mino3x3: Mino3x3 = Mino3x3()
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        self.current_shape = self.mino3x3.rotate_right(self.current_shape, JMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_right()
-    def rotate_left(self) -> None:
-        self.current_shape = self.mino3x3.rotate_left(self.current_shape, JMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_left()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return self.mino3x3.super_rotate(
-                current_direction,
-                previous_direction,
-                current_step,
-                current_relative_position
-            )
+    KIND = BLOCK_TYPE._block_type
     def get_default_mino(self) -> 'JMino':
         return JMino()
 
 class LMino(Mino):
-    BLOCK_TYPE: Block = Block(6)
+    BLOCK_TYPE: Block = Block.of(6)
     SHAPE = Grid.from_string_list(list(reversed([
         ['', '', 'o'],
         ['o', 'x', 'o'],
         ['', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = LMino.SHAPE
-        self.mino3x3: Mino3x3 = Mino3x3()
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        self.current_shape = self.mino3x3.rotate_right(self.current_shape, LMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_right()
-    def rotate_left(self) -> None:
-        self.current_shape = self.mino3x3.rotate_left(self.current_shape, LMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_left()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return self.mino3x3.super_rotate(
-                current_direction,
-                previous_direction,
-                current_step,
-                current_relative_position
-            )
+    KIND = BLOCK_TYPE._block_type
     def get_default_mino(self) -> 'LMino':
         return LMino()
 
 class TMino(Mino):
-    BLOCK_TYPE: Block = Block(7)
+    BLOCK_TYPE: Block = Block.of(7)
     SHAPE = Grid.from_string_list(list(reversed([
         ['', 'o', ''],
         ['o', 'x', 'o'],
         ['', '', '']
     ])), BLOCK_TYPE)
-    def __init__(self) -> None:
-        self.current_shape: Grid = TMino.SHAPE
-        self.mino3x3: Mino3x3 = Mino3x3()
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        self.current_shape = self.mino3x3.rotate_right(self.current_shape, TMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_right()
-    def rotate_left(self) -> None:
-        self.current_shape = self.mino3x3.rotate_left(self.current_shape, TMino.BLOCK_TYPE)
-        self.current_direction = self.current_direction.rotate_left()
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
-        return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return self.mino3x3.super_rotate(
-                current_direction,
-                previous_direction,
-                current_step,
-                current_relative_position
-            )
+    KIND = BLOCK_TYPE._block_type
     def get_default_mino(self) -> 'TMino':
         return TMino()
 
 class EmptyMino(Mino):
-    def __init__(self) -> None:
-        self.current_shape: Grid = Grid(Size(0, 0))
-        self.current_direction: Direction = Direction.A()
-    def rotate_right(self) -> None:
-        pass
-    def rotate_left(self) -> None:
-        pass
-    def get_grid(self) -> Grid:
-        return self.current_shape
-    def get_size(self) -> Size:
-        return self.current_shape.get_size()
-    def get_direction(self) -> Direction:
+    SHAPE = Grid(Size(0, 0))
+    KIND = Block.EMPTY_NUMBER
+    def get_right_direction(self) -> Direction:
+        return self.current_direction
+    def get_left_direction(self) -> Direction:
         return self.current_direction
-    def super_rotate(
-            self,
-            current_direction: Direction,
-            previous_direction: Direction,
-            current_step: SuperRotationStep,
-            current_relative_position: RelativePosition
-        ) -> RelativePosition:
-        return RelativePosition(0, 0)
     def __eq__(self, __value: object) -> bool:
         if __value is None or not isinstance(__value, EmptyMino):
             return False
@@ -644,6 +932,128 @@ class EmptyMino(Mino):
     def get_default_mino(self) -> 'EmptyMino':
         return EmptyMino()
 
+MINO_SHAPES: tuple[tuple[MinoShape, ...], ...] = (
+    MinoShape.make_directions(EmptyMino.SHAPE, lambda shape: shape),
+    MinoShape.make_directions(IMino.SHAPE, IMino.rotate_shape_right),
+    MinoShape.make_directions(OMino.SHAPE, lambda shape: shape),
+    MinoShape.make_directions(SMino.SHAPE, lambda shape: Mino3x3().rotate_right(shape, SMino.BLOCK_TYPE)),
+    MinoShape.make_directions(ZMino.SHAPE, lambda shape: Mino3x3().rotate_right(shape, ZMino.BLOCK_TYPE)),
+    MinoShape.make_directions(JMino.SHAPE, lambda shape: Mino3x3().rotate_right(shape, JMino.BLOCK_TYPE)),
+    MinoShape.make_directions(LMino.SHAPE, lambda shape: Mino3x3().rotate_right(shape, LMino.BLOCK_TYPE)),
+    MinoShape.make_directions(TMino.SHAPE, lambda shape: Mino3x3().rotate_right(shape, TMino.BLOCK_TYPE)),
+)
+"""shapes of every mino and direction, indexed by Mino.KIND and Direction.value"""
+
+MINO_TYPES: tuple[type[Mino], ...] = (EmptyMino, IMino, OMino, SMino, ZMino, JMino, LMino, TMino)
+"""every kind of mino, indexed by Mino.KIND"""
+
+SPIN_BOX_SIZE: Size = Size(3, 3)
+"""box of a mino whose corners tell a spin, from the bottom left of the mino"""
+
+@dataclass(frozen=True, slots=True)
+class SpinCorners:
+    """corners of the box of a mino in a direction which tell a spin and a mini
+
+    masks are in the layout of Field.box_mask over SPIN_BOX_SIZE, so a lock is a spin when
+    at least 3 corners are not empty and a mini when a front corner, one on the side the
+    mino points to, is empty and the last rotation was not kick step 3
+    """
+    corners: int
+    fronts: int
+    @classmethod
+    def make(cls, fronts: tuple[tuple[int, int], ...]) -> 'SpinCorners':
+        """corners of the box with fronts given as (x, y)"""
+        def box_mask(cells: tuple[tuple[int, int], ...]) -> int:
+            return sum(1 << (y * SPIN_BOX_SIZE.x + x) for x, y in cells)
+        right = SPIN_BOX_SIZE.x - 1
+        top = SPIN_BOX_SIZE.y - 1
+        return cls(box_mask(((0, 0), (right, 0), (0, top), (right, top))), box_mask(fronts))
+
+SPIN_CORNERS: tuple[tuple[SpinCorners, ...], ...] = tuple(
+    (
+        SpinCorners.make(((0, 2), (2, 2))),
+        SpinCorners.make(((2, 0), (2, 2))),
+        SpinCorners.make(((0, 0), (2, 0))),
+        SpinCorners.make(((0, 0), (0, 2))),
+    ) if kind == TMino.KIND else ()
+    for kind in range(len(MINO_SHAPES))
+)
+"""corners of every mino and direction, indexed by Mino.KIND and Direction.value,
+only T mino has corners and the other minos spin by all-spin"""
+
+@dataclass(frozen=True, slots=True)
+class KickTable:
+    """wall kicks of a rotation system
+
+    kicks[kind][previous direction][current direction] are the offsets tried in order
+    when a mino can not rotate in place, as (x, y) with y counted from the bottom like Position
+
+    the index of the offset which succeeded is recorded as SuperRotationStep
+    """
+    kicks: tuple[tuple[tuple[tuple[tuple[int, int], ...], ...], ...], ...]
+    @classmethod
+    def make(cls, kicks_of_kind: dict[int, dict[tuple[Direction, Direction], tuple[tuple[int, int], ...]]]) -> 'KickTable':
+        """build a kick table, rotations which are not given have no kick
+
+        Args:
+            kicks_of_kind (dict): kicks of each (previous direction, current direction) by Mino.KIND
+        """
+        kicks = tuple(
+            tuple(
+                tuple(
+                    kicks_of_kind.get(kind, {}).get((previous_direction, current_direction), ())
+                    for current_direction in DIRECTIONS
+                )
+                for previous_direction in DIRECTIONS
+            )
+            for kind in range(len(MINO_SHAPES))
+        )
+        return cls(kicks)
+
+SRS_KICKS_3X3: dict[tuple[Direction, Direction], tuple[tuple[int, int], ...]] = {
+    (Direction.A(), Direction.B()): ((-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    (Direction.B(), Direction.A()): ((1, 0), (1, -1), (0, 2), (1, 2)),
+    (Direction.B(), Direction.C()): ((-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    (Direction.C(), Direction.B()): ((-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    (Direction.C(), Direction.D()): ((1, 0), (1, 1), (0, -2), (1, -2)),
+    (Direction.D(), Direction.C()): ((1, 0), (1, -1), (0, 2), (1, 2)),
+    (Direction.D(), Direction.A()): ((-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    (Direction.A(), Direction.D()): ((1, 0), (1, 1), (0, -2), (1, -2)),
+}
+SRS_KICKS_I: dict[tuple[Direction, Direction], tuple[tuple[int, int], ...]] = {
+    (Direction.A(), Direction.B()): ((-2, 0), (1, 0), (-2, -1), (1, 2)),
+    (Direction.B(), Direction.A()): ((1, 0), (-1, 0), (2, 1), (-1, -2)),
+    (Direction.B(), Direction.C()): ((-1, 0), (2, 0), (-1, 2), (2, -1)),
+    (Direction.C(), Direction.B()): ((1, 0), (-2, 0), (1, -2), (-2, 1)),
+    (Direction.C(), Direction.D()): ((2, 0), (-1, 0), (2, 1), (-1, -2)),
+    (Direction.D(), Direction.C()): ((1, 0), (-2, 0), (-2, -1), (1, 2)),
+    (Direction.D(), Direction.A()): ((-1, 0), (1, 0), (1, -2), (-2, 1)),
+    (Direction.A(), Direction.D()): ((-1, 0), (2, 0), (-1, 2), (2, -1)),
+}
+SRS_KICK_TABLE: KickTable = KickTable.make({
+    IMino.KIND: SRS_KICKS_I,
+    SMino.KIND: SRS_KICKS_3X3,
+    ZMino.KIND: SRS_KICKS_3X3,
+    JMino.KIND: SRS_KICKS_3X3,
+    LMino.KIND: SRS_KICKS_3X3,
+    TMino.KIND: SRS_KICKS_3X3,
+})
+"""super rotation system, the default of Tetris"""
+
+ARS_KICKS_3X3: dict[tuple[Direction, Direction], tuple[tuple[int, int], ...]] = {
+    (previous_direction, current_direction): ((1, 0), (-1, 0))
+    for previous_direction in DIRECTIONS
+    for current_direction in (previous_direction.rotate_right(), previous_direction.rotate_left())
+}
+ARS_KICK_TABLE: KickTable = KickTable.make({
+    SMino.KIND: ARS_KICKS_3X3,
+    ZMino.KIND: ARS_KICKS_3X3,
+    JMino.KIND: ARS_KICKS_3X3,
+    LMino.KIND: ARS_KICKS_3X3,
+    TMino.KIND: ARS_KICKS_3X3,
+})
+"""ARS style kicks, 3x3 minos try one block right then one block left and I mino does not kick"""
+
 @dataclass(slots=True)
 class CurrentMino:
     mino: Mino
@@ -652,23 +1062,6 @@ class CurrentMino:
     def __post_init__(self) -> None:
         self.position: Position = Tetris.INITIAL_POSITION.to_position(self.mino.get_size())
 
-class EmptyMinoPileException(Exception):
-    pass
-
-class MinoPile:
-    def __init__(self, random_generator: Random) -> None:
-        self.random_generator = random_generator
-        mino_pile: list[Mino] = [IMino(), OMino(), SMino(), ZMino(), JMino(), LMino(), TMino()]
-        self.pile: list[Mino] = self.random_generator.sample(mino_pile, len(mino_pile))
-    def pop_mino(self) -> Mino:
-        if self.is_empty():
-            raise EmptyMinoPileException()
-        return self.pile.pop(0)
-    def is_empty(self) -> bool:
-        if len(self.pile) <= 0:
-            return True
-        return False
-
 class NotBottomException(Exception):
     pass
 
@@ -688,23 +1081,134 @@ class LastTetrisAction:
     def super_rotation_step(self) -> SuperRotationStep:
         return self._super_rotation_step
 
+@dataclass(frozen=True, slots=True)
+class Placement:
+    """a place where a mino can be locked, found by Tetris.get_placements
+
+    inputs are the names of the Tetris methods to call in order to lock the mino there,
+    the last one is hard_drop or place_mino and leaves last_action as given
+    """
+    mino_kind: int
+    direction: Direction
+    position: Position
+    last_action: LastTetrisAction
+    hold: bool
+    inputs: tuple[str, ...]
+
+@dataclass(frozen=True, slots=True)
+class TetrisSnapshot:
+    """immutable state of a game made by Tetris.snapshot
+
+    minos are stored by Mino.KIND and Direction.value, and parts which did not change
+    since the previous snapshot are shared with it; random_state is the state of a
+    CountingRandom, which ends with its seed and the words it drew
+    """
+    field: FieldSnapshot
+    mino_kind: int
+    mino_direction: int
+    position: Position
+    hold_kind: int
+    last_action: LastTetrisAction
+    queue: bytes
+    bags: int
+    generator_state: tuple[int, ...]
+    random_state: tuple[Any, ...]
+    def to_bytes(self, colors: bool = True) -> bytes:
+        """the snapshot in the fixed layout of STATE_FORMAT, followed by the colors of the blocks
+
+        the random generator is stored as its seed and the number of words it drew
+
+        Args:
+            colors (bool): also store the block type of every block, without them
+                every block comes back as garbage, which makes no difference to the game
+
+        Raises:
+            ValueError: when the queue, the generator state or the seed is larger than the layout holds
+        """
+        random_state, seed, words = self.random_state
+        if len(self.queue) > STATE_QUEUE_SIZE or len(self.generator_state) > STATE_GENERATOR_SIZE:
+            raise ValueError(f'a queue of {len(self.queue)} or a generator state of {len(self.generator_state)} does not fit')
+        if seed >= 1 << 64:
+            raise ValueError(f'seed {seed} does not fit in 64 bits')
+        last_action = self.last_action
+        field = self.field
+        state = STATE_FORMAT.pack(
+            _STATE_VERSION, _STATE_COLORS if colors else 0,
+            self.mino_kind, self.mino_direction, self.position.x, self.position.y, self.hold_kind,
+            last_action.is_rotate() << 7 | last_action.super_rotation_step().step,
+            len(self.queue), pack_nibbles(self.queue),
+            self.bags, len(self.generator_state), bytes(self.generator_state),
+            seed, words, *field.rows
+        )
+        if not colors:
+            return state
+        return state + pack_nibbles(field.to_block_types())
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TetrisSnapshot':
+        """read a snapshot written by to_bytes, the random state is found again from the seed
+
+        Raises:
+            ValueError: when data is not in the layout of this version
+        """
+        colors_size = len(data) - STATE_FORMAT.size
+        if colors_size != 0 and colors_size != STATE_COLORS_SIZE:
+            raise ValueError(f'{len(data)} bytes are not a state')
+        (
+            version, flags, mino_kind, mino_direction, position_x, position_y, hold_kind, last_action,
+            queue_length, queue, bags, generator_state_length, generator_state, seed, words, *rows
+        ) = STATE_FORMAT.unpack_from(data)
+        if version != _STATE_VERSION or bool(flags & _STATE_COLORS) != (colors_size > 0):
+            raise ValueError(f'state of version {version} with flags {flags} is not readable')
+        if colors_size > 0:
+            block_types = unpack_nibbles(data[STATE_FORMAT.size:])
+            size_x = Tetris.FIELD_SIZE_X
+            blocks = tuple(block_types[y * size_x:(y + 1) * size_x] for y in range(len(rows)))
+        else:
+            blocks = tuple(map(_GARBAGE_LINES.__getitem__, rows))
+        random_generator = CountingRandom(seed)
+        random_generator.skip(words)
+        return cls(
+            FieldSnapshot.from_rows(tuple(rows), blocks),
+            mino_kind, mino_direction, Position(position_x, position_y), hold_kind,
+            LastTetrisAction(bool(last_action >> 7), SuperRotationStep(last_action & 127)),
+            unpack_nibbles(queue)[:queue_length], bags, tuple(generator_state[:generator_state_length]),
+            random_generator.getstate()
+        )
+
 class Tetris:
+    """a game of one player
+
+    Args:
+        random_seed (int | None): seed of the minos, None for a seed drawn from the system
+        kick_table (KickTable): wall kicks of rotations
+        generator (Generator | None): makes the kinds of minos, 7-bag when None
+        all_spin (bool): minos other than T mino which lock after a rotation where they
+            cannot move left, right or up are spins too, counted as t_spin_mini
+    """
     INITIAL_POSITION: CenterPosition = CenterPosition(5, 21)
     FIELD_SIZE_X: int = 10
     FIELD_SIZE_Y: int = 20
     NEXT_NUMBER: int = 5
-    def __init__(self, random_seed: int | None = None) -> None:
-        if not random_seed is None:
-            self.random_generator = Random(random_seed)
-        else:
-            self.random_generator = Random()
-        self.main_field: Grid = Grid(Size(Tetris.FIELD_SIZE_X, Tetris.FIELD_SIZE_Y*2))
-        self.current_mino_pile: MinoPile = MinoPile(self.random_generator)
-        self.next_mino_pile: MinoPile = MinoPile(self.random_generator)
+    def __init__(
+        self, random_seed: int | None = None, kick_table: KickTable = SRS_KICK_TABLE,
+        generator: Generator | None = None, all_spin: bool = False
+    ) -> None:
+        self.random_generator: CountingRandom = CountingRandom(random_seed)
+        self.main_field: Field = Field(Size(Tetris.FIELD_SIZE_X, Tetris.FIELD_SIZE_Y*2))
+        if generator is None:
+            generator = SevenBagGenerator()
+        self.randomizer: Randomizer = Randomizer(generator, self.random_generator)
         self.current_mino: CurrentMino = CurrentMino(EmptyMino())
         self.current_mino_size: Size = self.current_mino.mino.get_size()
+        self.current_mino_shape: MinoShape = self.current_mino.mino.get_shape()
         self.hold_mino: Mino = EmptyMino()
         self.last_action = LastTetrisAction(False, SuperRotationStep(0))
+        self.kick_table: KickTable = kick_table
+        self.all_spin: bool = all_spin
+        self.ghost_position: Position = self.current_mino.position
+        self.ghost_source: tuple[Position, MinoShape, int] | None = None
+        self.random_state_source: tuple[int, tuple[Any, ...]] | None = None
+        self.counters: TetrisCounters | None = None
     def _can_move(self, surrounding_grid: Grid, mino: Mino, position: PlotGridPosition) -> bool:
         """whether mino can move in surrounding grid
 
@@ -722,138 +1226,150 @@ class Tetris:
         mino_grid_size_y = mino.get_grid().get_size().y
         surrounding_grid_size_y = surrounding_grid.get_size().y
         for y, column in enumerate(mino_grid):
-            for x, block in enumerate(column):
-                if not block.is_empty():
+            for x, block_type in enumerate(column):
+                if block_type != Block.EMPTY_NUMBER:
                     surrounding_grid_x = position_x + x
                     surrounding_grid_y = surrounding_grid_size_y - (mino_grid_size_y + position_y) + y
                     if not surrounding_grid.is_empty(Position(surrounding_grid_x, surrounding_grid_y)):
                         return False
         return True
+    def can_put(self, mino: Mino, direction: Direction, position_x: int, position_y: int) -> bool:
+        """whether the mino in the direction can be at the position of the main field
+
+        Args:
+            mino (Mino): the kind of mino, its own direction is ignored
+            direction (Direction): direction of mino
+            position_x (int): x coordinate of the bottom left of mino
+            position_y (int): y coordinate of the bottom left of mino
+
+        Returns:
+            bool: whether the mino does not overlap blocks, walls or the floor
+        """
+        return self.main_field.can_place(MINO_SHAPES[mino.KIND][direction.value].masks, position_x, position_y)
+    def is_topped_out(self) -> bool:
+        """whether current mino overlaps blocks, which means a new mino had no room to appear"""
+        position = self.current_mino.position
+        return not self.main_field.can_place(self.current_mino_shape.masks, position.x, position.y)
     def move_right(self) -> bool:
         position = self.current_mino.position
-        new_position = Position(position.x, position.y)
-        size = self.current_mino_size
-        new_size = Size(size.x + 1, size.y)
-        surrounding_grid = self.main_field.plot_grid(new_position, new_size)
-        if not self._can_move(surrounding_grid, self.current_mino.mino, PlotGridPosition(1, 0)):
+        if not self.main_field.can_place(self.current_mino_shape.masks, position.x + 1, position.y):
             return False
         self.current_mino.position = Position(position.x + 1, position.y)
         self.last_action = LastTetrisAction(False, SuperRotationStep(0))
         return True
     def move_left(self) -> bool:
         position = self.current_mino.position
-        new_position = Position(position.x - 1, position.y)
-        size = self.current_mino_size
-        new_size = Size(size.x + 1, size.y)
-        surrounding_grid = self.main_field.plot_grid(new_position, new_size)
-        if not self._can_move(surrounding_grid, self.current_mino.mino, PlotGridPosition(0, 0)):
+        if not self.main_field.can_place(self.current_mino_shape.masks, position.x - 1, position.y):
             return False
         self.current_mino.position = Position(position.x - 1, position.y)
         self.last_action = LastTetrisAction(False, SuperRotationStep(0))
         return True
     def move_down(self) -> bool:
-        position_x = self.current_mino.position.x
-        position_y = self.current_mino.position.y
-        position = Position(position_x, position_y-1)
-        size = self.current_mino_size
-        new_size = Size(size.x, size.y + 1)
-        surrounding_grid = self.main_field.plot_grid(position, new_size)
-        if not self._can_move(surrounding_grid, self.current_mino.mino, PlotGridPosition(0, 1)):
+        position = self.current_mino.position
+        if not self.main_field.can_place(self.current_mino_shape.masks, position.x, position.y - 1):
             return False
-        self.current_mino.position = Position(position.x, position.y)
+        self.current_mino.position = Position(position.x, position.y - 1)
         self.last_action = LastTetrisAction(False, SuperRotationStep(0))
         return True
+    def shift(self, direction: int, max_distance: int = FIELD_SIZE_X) -> int:
+        """move current mino sideways as far as it can, up to max_distance, in one step
+
+        the game ends as after the same number of move_left or move_right
+
+        Args:
+            direction (int): -1 to move left, 1 to move right
+            max_distance (int): the most columns to move
+
+        Returns:
+            int: the number of columns moved
+        """
+        position = self.current_mino.position
+        distance = min(
+            self.main_field.shift_distance(self.current_mino_shape.masks, position.x, position.y, direction),
+            max_distance
+        )
+        if distance <= 0:
+            return 0
+        self.current_mino.position = Position(position.x + direction * distance, position.y)
+        self.last_action = LastTetrisAction(False, SuperRotationStep(0))
+        return distance
+    def fall(self, max_distance: int) -> int:
+        """move current mino down as far as it can, up to max_distance, in one step
+
+        the game ends as after the same number of move_down
+
+        Returns:
+            int: the number of rows moved
+        """
+        position = self.current_mino.position
+        distance = min(
+            self.main_field.drop_distance(self.current_mino_shape.masks, position.x, position.y),
+            max_distance
+        )
+        if distance <= 0:
+            return 0
+        self.current_mino.position = Position(position.x, position.y - distance)
+        self.last_action = LastTetrisAction(False, SuperRotationStep(0))
+        return distance
     def make_mino(self) -> None:
-        self.current_mino = CurrentMino(self.current_mino_pile.pop_mino())
+        self.current_mino = CurrentMino(MINO_TYPES[self.randomizer.pop()]())
         self.current_mino_size = self.current_mino.mino.get_size()
-        if self.current_mino_pile.is_empty():
-            self.current_mino_pile = self.next_mino_pile
-            self.next_mino_pile = MinoPile(self.random_generator)
+        self.current_mino_shape = self.current_mino.mino.get_shape()
+    def peek_next(self, number: int = NEXT_NUMBER) -> memoryview:
+        """kinds of the next minos, a read-only view which is only valid until the next mino is made"""
+        return self.randomizer.peek_next(number)
     def is_bottom(self) -> bool:
-        position_x = self.current_mino.position.x
-        position_y = self.current_mino.position.y
-        position = Position(position_x, position_y-1)
-        size = self.current_mino_size
-        new_size = Size(size.x, size.y + 1)
-        surrounding_grid = self.main_field.plot_grid(position, new_size)
-        if not self._can_move(surrounding_grid, self.current_mino.mino, PlotGridPosition(0, 1)):
-            return True
-        return False
+        position = self.current_mino.position
+        return not self.main_field.can_place(self.current_mino_shape.masks, position.x, position.y - 1)
     def place_mino(self) -> ClearResult:
         if not self.is_bottom():
             raise NotBottomException()
-        current_mino_grid = self.current_mino.mino.get_grid().grid
-        current_x = self.current_mino.position.x
-        current_y = self.current_mino.position.y
-        for y, column in enumerate(current_mino_grid):
-            for x, block in enumerate(column):
-                if not block.is_empty():
-                    self.main_field.add_block(Position(current_x + x, current_y + y), block)
-        result = self._clear_line(
-            self.current_mino.mino,
-            self.main_field.plot_grid(self.current_mino.position, self.current_mino_size)
-        )
+        mino = self.current_mino.mino
+        position = self.current_mino.position
+        is_t_spin, is_t_spin_mini = self._find_spin(mino, position)
+        self.main_field.place(self.current_mino_shape.grid, self.current_mino_shape.masks, position.x, position.y)
+        result = self._clear_line(is_t_spin, is_t_spin_mini)
         self.make_mino()
         return result
     def rotate_right(self) -> bool:
-        position_x = self.current_mino.position.x
-        position_y = self.current_mino.position.y
-        size = self.current_mino_size
-        position = Position(position_x - 2, position_y - 2)
-        new_size = Size(size.x + 4, size.y + 4)
-        surrounding_grid = self.main_field.plot_grid(position, new_size)
-        previous_direction = self.current_mino.mino.get_direction()
-        mino = deepcopy(self.current_mino.mino)
-        mino.rotate_right()
-        current_direction = mino.get_direction()
-        if self._can_move(surrounding_grid, mino, PlotGridPosition(2, 2)):
-            self.current_mino.mino = mino
-            self.last_action = LastTetrisAction(True, SuperRotationStep(0))
-            return True
-        steps = [SuperRotationStep(i) for i in range(4)]
-        current_relative_position = RelativePosition(0, 0)
-        for current_step in steps:
-            current_relative_position = mino.super_rotate(current_direction, previous_direction, current_step, current_relative_position)
-            current_position_x = 2+current_relative_position.x
-            current_position_y = 2+current_relative_position.y
-            new_position = PlotGridPosition(current_position_x, current_position_y)
-            if self._can_move(surrounding_grid, mino, new_position):
-                self.current_mino.mino = mino
-                self.current_mino.position = Position(self.current_mino.position.x + current_relative_position.x, self.current_mino.position.y - current_relative_position.y)
-                self.last_action = LastTetrisAction(True, current_step)
-                return True
-        return False
+        return self._rotate(self.current_mino.mino.get_right_direction())
     def rotate_left(self) -> bool:
+        return self._rotate(self.current_mino.mino.get_left_direction())
+    def _rotate(self, current_direction: Direction) -> bool:
+        """try to turn current mino to the direction, using super rotation if needed
+
+        Args:
+            current_direction (Direction): the direction after rotation
+
+        Returns:
+            bool: whether mino is rotated
+        """
+        mino = self.current_mino.mino
         position_x = self.current_mino.position.x
         position_y = self.current_mino.position.y
-        position = Position(position_x - 2, position_y - 2)
-        size = self.current_mino_size
-        new_size = Size(size.x + 4, size.y + 4)
-        surrounding_grid = self.main_field.plot_grid(position, new_size)
-        previous_direction = self.current_mino.mino.get_direction()
-        mino = deepcopy(self.current_mino.mino)
-        mino.rotate_left()
-        current_direction = mino.get_direction()
-        if self._can_move(surrounding_grid, mino, PlotGridPosition(2, 2)):
-            self.current_mino.mino = mino
+        previous_direction = mino.get_direction()
+        shape = MINO_SHAPES[mino.KIND][current_direction.value]
+        if self.main_field.can_place(shape.masks, position_x, position_y):
+            mino.set_direction(current_direction)
+            self.current_mino_shape = shape
             self.last_action = LastTetrisAction(True, SuperRotationStep(0))
             return True
-        steps = [SuperRotationStep(i) for i in range(4)]
-        current_relative_position = RelativePosition(0, 0)
-        for current_step in steps:
-            current_relative_position = mino.super_rotate(current_direction, previous_direction, current_step, current_relative_position)
-            current_position_x = 2+current_relative_position.x
-            current_position_y = 2+current_relative_position.y
-            new_position = PlotGridPosition(current_position_x, current_position_y)
-            if self._can_move(surrounding_grid, mino, new_position):
-                self.current_mino.mino = mino
-                self.current_mino.position = Position(self.current_mino.position.x + current_relative_position.x, self.current_mino.position.y - current_relative_position.y)
-                self.last_action = LastTetrisAction(True, current_step)
+        kicks = self.kick_table.kicks[mino.KIND][previous_direction.value][current_direction.value]
+        for current_step, (kick_x, kick_y) in enumerate(kicks):
+            new_position_x = position_x + kick_x
+            new_position_y = position_y + kick_y
+            if self.main_field.can_place(shape.masks, new_position_x, new_position_y):
+                mino.set_direction(current_direction)
+                self.current_mino_shape = shape
+                self.current_mino.position = Position(new_position_x, new_position_y)
+                self.last_action = LastTetrisAction(True, SuperRotationStep(current_step))
                 return True
         return False
     def hard_drop(self) -> ClearResult:
-        while(not self.is_bottom()):
-            self.move_down()
+        position = self.current_mino.position
+        distance = self.main_field.drop_distance(self.current_mino_shape.masks, position.x, position.y)
+        if distance > 0:
+            self.current_mino.position = Position(position.x, position.y - distance)
         self.last_action = LastTetrisAction(True, SuperRotationStep(0))
         return self.place_mino()
     def hold(self) -> None:
@@ -864,62 +1380,494 @@ class Tetris:
         current_mino = self.current_mino.mino
         self.current_mino = CurrentMino(self.hold_mino)
         self.current_mino_size = self.current_mino.mino.get_size()
+        self.current_mino_shape = self.current_mino.mino.get_shape()
         self.hold_mino = current_mino.get_default_mino()
-    def get_ghost_block(self) -> Position:
-        current_position = self.current_mino.position
-        position = current_position
-        surrounding_grid_size = Size(self.current_mino_size.x, self.current_mino_size.y+1)
-        for i in range(Tetris.FIELD_SIZE_Y*2):
-            position = Position(current_position.x, current_position.y-i)
-            surrounding_grid = self.main_field.plot_grid(position, surrounding_grid_size)
-            if not self._can_move(surrounding_grid, self.current_mino.mino, PlotGridPosition(0, 1)):
-                position = Position(current_position.x, current_position.y-i+1)
+    def add_garbage(self, holes: Sequence[int]) -> int:
+        """push garbage lines in from the bottom of the main field, see Field.insert_garbage
+
+        current mino moves up with the blocks only as far as it has to not to overlap them;
+        when it cannot, it stays where it is and the game is topped out
+
+        Args:
+            holes (Sequence[int]): x of the empty block of each line, the last line is the lowest
+
+        Returns:
+            int: the number of blocks pushed out of the top of the field
+        """
+        lost_blocks = self.main_field.insert_garbage(holes)
+        position = self.current_mino.position
+        masks = self.current_mino_shape.masks
+        for distance in range(len(holes) + 1):
+            if self.main_field.can_place(masks, position.x, position.y + distance):
+                if distance > 0:
+                    self.current_mino.position = Position(position.x, position.y + distance)
                 break
-        return Position(position.x, position.y)
-    def _clear_line(self, current_mino: Mino, surrounding_grid: Grid) -> ClearResult:
-        delete_line = 0
-        i = 0
-        current_grid = self.main_field.grid
-        while i < len(current_grid):
-            current_line = current_grid[i]
-            if all([not block.is_empty() for block in current_line]):
-                del current_grid[i]
-                current_grid.append([Block.EMPTY() for i in range(Tetris.FIELD_SIZE_X)])
-                delete_line += 1
+        return lost_blocks
+    def make_cheese_holes(self, lines: int, messiness: float = 1.0) -> list[int]:
+        """holes of cheese garbage drawn from the random generator of the game
+
+        the hole of each line moves to another column with the chance messiness,
+        so 1 never leaves two holes on top of each other and 0 makes one straight well;
+        the next bags are drawn after these, so the same seed still makes the same game
+
+        Args:
+            lines (int): number of lines
+            messiness (float): chance that the hole moves from one line to the next
+
+        Returns:
+            list[int]: the holes in the order of Field.insert_garbage
+        """
+        if lines <= 0:
+            return []
+        random_generator = self.random_generator
+        size_x = self.main_field.size_x
+        hole = random_generator.randrange(size_x)
+        holes = [hole]
+        for line in range(1, lines):
+            if messiness >= 1 or random_generator.random() < messiness:
+                hole = (hole + 1 + random_generator.randrange(size_x - 1)) % size_x
+            holes.append(hole)
+        # random_generator moved without drawing a bag
+        self.random_state_source = None
+        return holes
+    def add_cheese(self, lines: int, messiness: float = 1.0) -> int:
+        """push cheese garbage made by make_cheese_holes, see add_garbage"""
+        return self.add_garbage(self.make_cheese_holes(lines, messiness))
+    def get_placements(self, use_hold: bool = False) -> list[Placement]:
+        """every distinct place current mino can be locked at
+
+        places are searched through move_left, move_right, move_down and rotations with
+        kicks, so tucks and spins are included; minos taking the same blocks are listed once,
+        except that T mino is listed once for each last action which changes T-spin detection
+
+        Args:
+            use_hold (bool): also list the places of the mino which comes by hold
+
+        Returns:
+            list[Placement]: places in the order they are found, the closest first
+        """
+        mino = self.current_mino.mino
+        position = self.current_mino.position
+        placements = self._search_placements(mino.KIND, mino.get_direction(), position, ())
+        if use_hold:
+            if self.hold_mino == EmptyMino():
+                kind = self.randomizer.peek_next(1)[0]
             else:
-                i += 1
-        is_t_spin = False
-        is_t_spin_mini = False
-        if isinstance(current_mino, TMino):
-            mino_direction = current_mino.get_direction()
-            if self.last_action.is_rotate():
-                # check 4 corners of t-mino
-                surround_block_num = 4
-                top_is_empty = False
-                if surrounding_grid.is_empty(Position(0, 0)):
-                    surround_block_num -= 1
-                    top_is_empty = (mino_direction == Direction.C() or
-                                    mino_direction == Direction.D())
-                if surrounding_grid.is_empty(Position(2, 0)):
-                    surround_block_num -= 1
-                    top_is_empty = (mino_direction == Direction.B() or
-                                    mino_direction == Direction.C())
-                if surrounding_grid.is_empty(Position(0, 2)):
-                    surround_block_num -= 1
-                    top_is_empty = (mino_direction == Direction.A() or
-                                    mino_direction == Direction.D())
-                if surrounding_grid.is_empty(Position(2, 2)):
-                    surround_block_num -= 1
-                    top_is_empty = (mino_direction == Direction.A() or
-                                    mino_direction == Direction.B())
-                if surround_block_num >= 3:
-                    if top_is_empty and self.last_action.super_rotation_step().step != 3:
-                        is_t_spin_mini = True
+                kind = self.hold_mino.KIND
+            spawn_position = Tetris.INITIAL_POSITION.to_position(MINO_SHAPES[kind][0].size)
+            placements += self._search_placements(kind, DIRECTIONS[0], spawn_position, ('hold',))
+        return placements
+    _PLACEMENT_INPUTS: ClassVar[tuple[str, ...]] = (
+        'move_left', 'move_right', 'move_down', 'rotate_right', 'rotate_left'
+    )
+    def _search_placements(
+            self,
+            kind: int,
+            direction: Direction,
+            position: Position,
+            prefix: tuple[str, ...]
+        ) -> list[Placement]:
+        """breadth first search of the states (x, y, direction) of a mino
+
+        a state is an int key, x + 16 in the lowest 6 bits, y + 16 in the next 6 bits
+        and the direction above them, visited maps it to its parent key and input
+
+        every row high enough over the surface that no kick reaches the blocks looks the same,
+        so move_down goes from such a row to the lowest of them at once
+        """
+        if kind == EmptyMino.KIND:
+            return []
+        masks = [shape.masks for shape in MINO_SHAPES[kind]]
+        if not self.main_field.can_place(masks[direction.value], position.x, position.y):
+            return []
+        can_place = self.main_field.can_place
+        kicks = self.kick_table.kicks[kind]
+        right_directions = [MINO_TYPES[kind](current).get_right_direction().value for current in DIRECTIONS]
+        left_directions = [MINO_TYPES[kind](current).get_left_direction().value for current in DIRECTIONS]
+        is_t_mino = kind == TMino.KIND
+        kick_height = max((abs(kick_y) for kick_of_direction in kicks for kick_list in kick_of_direction
+                           for _, kick_y in kick_list), default=0)
+        free_y = [max(self.main_field.heights) + kick_height - shape_masks.bottom for shape_masks in masks]
+        start = (direction.value << 12) | ((position.y + 16) << 6) | (position.x + 16)
+        visited: dict[int, tuple[int, int]] = {start: (-1, -1)}
+        # last input into a state which changes T-spin detection: 0 move, 3 and 4 kick step 3
+        last_inputs: dict[int, dict[int, tuple[int, int]]] = {}
+        landings: list[int] = []
+        queue = [start]
+        for key in queue:
+            x = (key & 63) - 16
+            y = ((key >> 6) & 63) - 16
+            current = key >> 12
+            current_masks = masks[current]
+            if y - 1 > free_y[current]:
+                down_key = key - ((y - free_y[current]) << 6)
+                if down_key not in visited:
+                    visited[down_key] = (key, 2)
+                    queue.append(down_key)
+            elif can_place(current_masks, x, y - 1):
+                if key - 64 not in visited:
+                    visited[key - 64] = (key, 2)
+                    queue.append(key - 64)
+                if is_t_mino:
+                    last_inputs.setdefault(key - 64, {}).setdefault(0, (key, 2))
+            else:
+                landings.append(key)
+            for moved_key, move_x, move_input in ((key - 1, x - 1, 0), (key + 1, x + 1, 1)):
+                if can_place(current_masks, move_x, y):
+                    if moved_key not in visited:
+                        visited[moved_key] = (key, move_input)
+                        queue.append(moved_key)
+                    if is_t_mino:
+                        last_inputs.setdefault(moved_key, {}).setdefault(0, (key, move_input))
+            for rotated, rotate_input in ((right_directions[current], 3), (left_directions[current], 4)):
+                rotated_masks = masks[rotated]
+                rotated_x = x
+                rotated_y = y
+                step = -1
+                if not can_place(rotated_masks, x, y):
+                    for step, (kick_x, kick_y) in enumerate(kicks[current][rotated]):
+                        if can_place(rotated_masks, x + kick_x, y + kick_y):
+                            rotated_x = x + kick_x
+                            rotated_y = y + kick_y
+                            break
                     else:
-                        is_t_spin = True
-        is_perfect_clear = True
-        for column in self.main_field.grid:
-            for block in column:
-                if not block.is_empty():
-                    is_perfect_clear = False
+                        continue
+                rotated_key = (rotated << 12) | ((rotated_y + 16) << 6) | (rotated_x + 16)
+                if rotated_key not in visited:
+                    visited[rotated_key] = (key, rotate_input)
+                    queue.append(rotated_key)
+                if is_t_mino and step == 3:
+                    last_inputs.setdefault(rotated_key, {}).setdefault(3, (key, rotate_input))
+        placements: list[Placement] = []
+        found_blocks: set[tuple[tuple[int, int], ...]] = set()
+        for key in landings:
+            x = (key & 63) - 16
+            y = ((key >> 6) & 63) - 16
+            current = key >> 12
+            if not is_t_mino:
+                blocks = tuple(
+                    (y + line_y, mask << x if x >= 0 else mask >> -x)
+                    for line_y, mask in masks[current].lines
+                )
+                if blocks in found_blocks:
+                    continue
+                found_blocks.add(blocks)
+            inputs = self._placement_inputs(visited, key)
+            while inputs and inputs[-1] == 'move_down':
+                inputs.pop()
+            placements.append(Placement(
+                kind, DIRECTIONS[current], Position(x, y),
+                LastTetrisAction(True, SuperRotationStep(0)), bool(prefix),
+                prefix + tuple(inputs) + ('hard_drop',)
+            ))
+            if not is_t_mino:
+                continue
+            for last_input_class, (parent, last_input) in last_inputs.get(key, {}).items():
+                if last_input_class == 0:
+                    last_action = LastTetrisAction(False, SuperRotationStep(0))
+                else:
+                    last_action = LastTetrisAction(True, SuperRotationStep(3))
+                inputs = self._placement_inputs(visited, parent)
+                inputs.append(Tetris._PLACEMENT_INPUTS[last_input])
+                placements.append(Placement(
+                    kind, DIRECTIONS[current], Position(x, y), last_action, bool(prefix),
+                    prefix + tuple(inputs) + ('place_mino',)
+                ))
+        return placements
+    def _placement_inputs(self, visited: dict[int, tuple[int, int]], key: int) -> list[str]:
+        """inputs from the start of a search to a state, a move_down edge may be many rows"""
+        inputs: list[str] = []
+        parent, last_input = visited[key]
+        while parent >= 0:
+            if last_input == 2:
+                inputs += ['move_down'] * (((parent >> 6) & 63) - ((key >> 6) & 63))
+            else:
+                inputs.append(Tetris._PLACEMENT_INPUTS[last_input])
+            key = parent
+            parent, last_input = visited[parent]
+        inputs.reverse()
+        return inputs
+    def apply_placement(self, placement: Placement) -> ClearResult:
+        """lock current mino as placement.inputs would, without calling every input
+
+        Args:
+            placement (Placement): one of the results of get_placements in this state
+
+        Returns:
+            ClearResult: result of locking the mino
+        """
+        if placement.hold:
+            self.hold()
+        mino = self.current_mino.mino
+        mino.set_direction(placement.direction)
+        self.current_mino_shape = mino.get_shape()
+        self.current_mino.position = placement.position
+        self.last_action = placement.last_action
+        return self.place_mino()
+    def snapshot(self) -> TetrisSnapshot:
+        """compact copy of the game to go back to with restore"""
+        random_state_source = self.random_state_source
+        randomizer = self.randomizer
+        if (random_state_source is None) or (random_state_source[0] != randomizer.bags):
+            # random_generator only moves when bags are drawn, or make_cheese_holes forgets the source
+            random_state_source = (randomizer.bags, self.random_generator.getstate())
+            self.random_state_source = random_state_source
+        mino = self.current_mino.mino
+        return TetrisSnapshot(
+            self.main_field.snapshot(),
+            mino.KIND,
+            mino.get_direction().value,
+            self.current_mino.position,
+            self.hold_mino.KIND,
+            self.last_action,
+            randomizer.get_queue(),
+            randomizer.bags,
+            randomizer.generator.get_state(),
+            random_state_source[1]
+        )
+    def restore(self, snapshot: TetrisSnapshot) -> None:
+        """go back to the state of a snapshot of this game or of another game"""
+        self.main_field.restore(snapshot.field)
+        random_state_source = self.random_state_source
+        if ((random_state_source is None)
+                or (random_state_source[0] != self.randomizer.bags)
+                or (random_state_source[1] is not snapshot.random_state)):
+            self.random_generator.setstate(snapshot.random_state)
+        self.randomizer.restore(snapshot.queue, snapshot.bags, snapshot.generator_state)
+        self.random_state_source = (snapshot.bags, snapshot.random_state)
+        self.current_mino = CurrentMino(MINO_TYPES[snapshot.mino_kind](DIRECTIONS[snapshot.mino_direction]))
+        self.current_mino.position = snapshot.position
+        self.current_mino_shape = self.current_mino.mino.get_shape()
+        self.current_mino_size = self.current_mino_shape.size
+        self.hold_mino = MINO_TYPES[snapshot.hold_kind]()
+        self.last_action = snapshot.last_action
+        self.ghost_source = None
+    def state_hash(self) -> int:
+        """64-bit hash of the blocks of the main field, current mino and its place, hold and the queue
+
+        the Zobrist hash of the field, kept up to date by the field, is xored with a hash of
+        the rest, so that equal games give the same int in every process
+        """
+        mino = self.current_mino.mino
+        position = self.current_mino.position
+        piece = (
+            (mino.KIND << 2 | mino.get_direction().value) << 20
+            | (position.x & 255) << 12 | (position.y & 255) << 4 | self.hold_mino.KIND
+        )
+        rest_hash = mix64(piece)
+        queue = int.from_bytes(self.randomizer.peek_next(len(self.randomizer)), 'little')
+        while queue:
+            rest_hash = mix64(rest_hash ^ (queue & _MASK_64))
+            queue >>= 64
+        return self.main_field.zobrist_hash ^ rest_hash
+    def to_bytes(self, colors: bool = True) -> bytes:
+        """the game in a fixed layout of STATE_FORMAT.size bytes, see TetrisSnapshot.to_bytes
+
+        kick_table and the kind of generator are not stored, they are given to from_bytes
+        """
+        return self.snapshot().to_bytes(colors)
+    @classmethod
+    def from_bytes(
+        cls, data: bytes, kick_table: KickTable = SRS_KICK_TABLE, generator: Generator | None = None,
+        all_spin: bool = False
+    ) -> 'Tetris':
+        """a game from to_bytes, with the kick table, the kind of generator and the spin rule it was played with
+
+        a game which is kept can restore TetrisSnapshot.from_bytes instead, without making a new one
+        """
+        snapshot = TetrisSnapshot.from_bytes(data)
+        tetris = cls(snapshot.random_state[1], kick_table, generator, all_spin)
+        tetris.restore(snapshot)
+        return tetris
+    def enable_counters(self) -> 'TetrisCounters':
+        """start counting the work of this game, see TetrisCounters"""
+        if self.counters is None:
+            self.counters = TetrisCounters(self)
+        return self.counters
+    def disable_counters(self) -> None:
+        if not self.counters is None:
+            self.counters.uninstall()
+            self.counters = None
+    def get_counters(self) -> dict[str, int | float]:
+        """snapshot of the counters, empty when they are not enabled"""
+        if self.counters is None:
+            return {}
+        return self.counters.snapshot()
+    def get_ghost_block(self) -> Position:
+        """position where current mino lands by hard drop
+
+        the result is cached until current mino or the main field changes
+        """
+        current_position = self.current_mino.position
+        ghost_source = self.ghost_source
+        if (ghost_source is not None
+                and ghost_source[0] is current_position
+                and ghost_source[1] is self.current_mino_shape
+                and ghost_source[2] == self.main_field.version):
+            return self.ghost_position
+        masks = self.current_mino_shape.masks
+        position_x = current_position.x
+        position_y = current_position.y
+        if masks.lines and self.main_field.is_above_surface(masks, position_x, position_y):
+            position_y -= self.main_field.drop_distance(masks, position_x, position_y)
+        else:
+            for i in range(Tetris.FIELD_SIZE_Y*2):
+                if not self.main_field.can_place(masks, position_x, current_position.y-i):
+                    position_y = current_position.y-i+1
+                    break
+                position_y = current_position.y-i
+        self.ghost_position = Position(position_x, position_y)
+        self.ghost_source = (current_position, self.current_mino_shape, self.main_field.version)
+        return self.ghost_position
+    def _find_spin(self, current_mino: Mino, position: Position) -> tuple[bool, bool]:
+        """(t_spin, t_spin_mini) of current mino locking at position, before it is put on the field
+
+        the corners of SPIN_CORNERS are tested against one Field.box_mask, and with
+        all_spin a mino without corners spins when it cannot move left, right or up
+        """
+        last_action = self.last_action
+        if not last_action.is_rotate():
+            return False, False
+        direction = current_mino.get_direction().value
+        corners_of_kind = SPIN_CORNERS[current_mino.KIND]
+        if corners_of_kind:
+            corners = corners_of_kind[direction]
+            box = self.main_field.box_mask(position.x, position.y, SPIN_BOX_SIZE)
+            if (box & corners.corners).bit_count() < 3:
+                return False, False
+            if (box & corners.fronts) != corners.fronts and last_action.super_rotation_step().step != 3:
+                return False, True
+            return True, False
+        if not self.all_spin or current_mino.KIND == EmptyMino.KIND:
+            return False, False
+        masks = MINO_SHAPES[current_mino.KIND][direction].masks
+        can_place = self.main_field.can_place
+        if (can_place(masks, position.x - 1, position.y) or can_place(masks, position.x + 1, position.y)
+                or can_place(masks, position.x, position.y + 1)):
+            return False, False
+        return False, True
+    def _clear_line(self, is_t_spin: bool, is_t_spin_mini: bool) -> ClearResult:
+        """clear the filled lines after current mino is put on the field
+
+        the spin is given rather than found here, because _find_spin has to look at
+        the field before the mino is put on it
+
+        Args:
+            is_t_spin (bool): t_spin of the lock, from _find_spin
+            is_t_spin_mini (bool): t_spin_mini of the lock, from _find_spin
+
+        Returns:
+            ClearResult: the spin as given, whether the field is empty and the number of lines cleared
+        """
+        delete_line = self.main_field.clear_lines()
+        is_perfect_clear = self.main_field.is_clear()
         return ClearResult(is_t_spin, is_t_spin_mini, is_perfect_clear, delete_line)
+
+_STATE_VERSION: int = 1
+_STATE_COLORS: int = 1
+"""flag of a state followed by the colors of its blocks"""
+STATE_QUEUE_SIZE: int = 32
+STATE_GENERATOR_SIZE: int = 8
+STATE_FORMAT = struct.Struct(
+    f'<BBBBbbBBB{STATE_QUEUE_SIZE // 2}sIB{STATE_GENERATOR_SIZE}sQQ{Tetris.FIELD_SIZE_Y * 2}H'
+)
+"""version, flags, mino kind, mino direction, x, y, hold kind, last action as rotated << 7 |
+super rotation step, queue length, queue in nibbles, bags, generator state length, generator
+state, random seed, words drawn and the row masks of the field, from the bottom"""
+STATE_COLORS_SIZE: int = Tetris.FIELD_SIZE_X * Tetris.FIELD_SIZE_Y * 2 // 2
+"""block types of the field in nibbles, which follow the state when it keeps colors"""
+_GARBAGE_LINES: tuple[bytes, ...] = tuple(
+    bytes(Block.GARBAGE_NUMBER if row & (1 << x) else Block.EMPTY_NUMBER for x in range(Tetris.FIELD_SIZE_X))
+    for row in range(1 << Tetris.FIELD_SIZE_X)
+)
+"""a line of garbage for every row mask"""
+
+class TetrisCounters:
+    """counts and times of the work done by a game, made by Tetris.enable_counters
+
+    the counted methods are replaced by wrappers on the instances of the game and its field,
+    so a game without counters runs the methods of its class and pays nothing for them
+
+    Note:
+        the time of a method includes the methods it calls, e.g. hard_drop includes place_mino
+    """
+    TIMED_METHODS: ClassVar[tuple[str, ...]] = (
+        'move_left', 'move_right', 'move_down', 'shift', 'fall', 'rotate_right', 'rotate_left', 'hold',
+        'hard_drop', 'place_mino', 'add_garbage', 'get_ghost_block', 'get_placements'
+    )
+    def __init__(self, tetris: Tetris) -> None:
+        self.tetris = tetris
+        self.counts: dict[str, int] = {}
+        self.nanoseconds: dict[str, int] = {}
+        self.install()
+    def install(self) -> None:
+        tetris = self.tetris
+        for name in TetrisCounters.TIMED_METHODS:
+            setattr(tetris, name, self._timed(name, getattr(Tetris, name).__get__(tetris)))
+        setattr(tetris, '_rotate', self._counted_rotate)
+        field = tetris.main_field
+        setattr(field, 'can_place', self._counted_can_place)
+        setattr(field, 'clear_lines', self._counted_clear_lines)
+    def uninstall(self) -> None:
+        for name in TetrisCounters.TIMED_METHODS + ('_rotate',):
+            delattr(self.tetris, name)
+        for name in ('can_place', 'clear_lines'):
+            delattr(self.tetris.main_field, name)
+    def reset(self) -> None:
+        self.counts.clear()
+        self.nanoseconds.clear()
+    def snapshot(self) -> dict[str, int | float]:
+        """every count by its name and the seconds spent in each timed method as name_seconds"""
+        snapshot: dict[str, int | float] = dict(self.counts)
+        for name, nanoseconds in self.nanoseconds.items():
+            snapshot[name + '_seconds'] = nanoseconds / 1e9
+        return snapshot
+    def _count(self, name: str, number: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + number
+    def _timed(self, name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+        """method counting its calls and time, and its failures when it returns False"""
+        counts = self.counts
+        nanoseconds = self.nanoseconds
+        failed_name = name + '_failed'
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter_ns()
+            result = method(*args, **kwargs)
+            nanoseconds[name] = nanoseconds.get(name, 0) + time.perf_counter_ns() - start
+            counts[name] = counts.get(name, 0) + 1
+            if result is False:
+                counts[failed_name] = counts.get(failed_name, 0) + 1
+            # hard_drop and apply_placement lock through place_mino
+            if name == 'place_mino' and isinstance(result, ClearResult):
+                self._count('locks')
+                if result.clear_line > 0:
+                    self._count('line_clears')
+                    self._count('lines_cleared', result.clear_line)
+            return result
+        return timed
+    def _counted_rotate(self, current_direction: Direction) -> bool:
+        """Tetris._rotate counting rotate_unkicked, rotate_kick_1 for the first kick and so on
+
+        SuperRotationStep(0) is set both without a kick and by the first kick,
+        so a kick is told by the mino having moved
+        """
+        position = self.tetris.current_mino.position
+        rotated = Tetris._rotate(self.tetris, current_direction)
+        if not rotated:
+            self._count('rotate_failed')
+        elif self.tetris.current_mino.position == position:
+            self._count('rotate_unkicked')
+        else:
+            self._count(f'rotate_kick_{self.tetris.last_action.super_rotation_step().step + 1}')
+        return rotated
+    def _counted_can_place(self, masks: RowMasks, position_x: int, position_y: int) -> bool:
+        """Field.can_place counting its probes and the mask lines of the shapes it tests"""
+        self._count('can_place')
+        self._count('can_place_lines', len(masks.lines))
+        if Field.can_place(self.tetris.main_field, masks, position_x, position_y):
+            return True
+        self._count('can_place_failed')
+        return False
+    def _counted_clear_lines(self) -> int:
+        """Field.clear_lines counting the rows it checks, which are the dirty rows"""
+        self._count('clear_lines_rows_scanned', self.tetris.main_field.dirty_rows.bit_count())
+        return Field.clear_lines(self.tetris.main_field)
@@ -1,6 +1,9 @@
 import copy
 import ctypes
+import random
+import sys
 from main import *
+from replay import Replay, ReplayRecorder, play_replay
 
 def repr_block(block_type):
     return_string = ''
@@ -38,241 +41,344 @@ def repr_grid(grid: Grid, current_mino: CurrentMino, hold_mino: Mino, ghost_mino
     mino_position_x = mino_position.x
     mino_position_y = mino_position.y
     for y, column in enumerate(mino_grid):
-        for x, block in enumerate(column):
-            if not block.is_empty():
-                new_grid.add_block(Position(mino_position_x+x, mino_position_y+y), block)
-                new_grid.add_block(Position(ghost_mino_position.x+x, ghost_mino_position.y+y), Block(9))
+        for x, block_type in enumerate(column):
+            if block_type != Block.EMPTY_NUMBER:
+                new_grid.add_block(Position(mino_position_x+x, mino_position_y+y), Block.of(block_type))
+                new_grid.add_block(Position(ghost_mino_position.x+x, ghost_mino_position.y+y), Block.WALL())
     return_string = '[\n'
     for line_number, column in enumerate(reversed(new_grid.grid)):
         if line_number-20 < -1:
             continue
         return_string += f'  {str(line_number-20).zfill(3)}[ '
-        for block in column:
-            if block.is_empty():
+        for block_type in column:
+            if block_type == Block.EMPTY_NUMBER:
                 return_string += ' , '
-            if not block.is_empty():
-                return_string += repr_block(block._block_type)
+            if not block_type == Block.EMPTY_NUMBER:
+                return_string += repr_block(block_type)
                 return_string += ', '
         return_string += ']\n'
     return_string += ']\n'
     return_string += '\nHOLD:\n[\n'
     for line_number, column in enumerate(reversed(hold_mino.get_grid().grid)):
         return_string += f'  {str(line_number-hold_mino.get_size().y).zfill(3)}[ '
-        for block in column:
-            if block.is_empty():
+        for block_type in column:
+            if block_type == Block.EMPTY_NUMBER:
                 return_string += ' , '
-            if not block.is_empty():
-                return_string += repr_block(block._block_type)
+            if not block_type == Block.EMPTY_NUMBER:
+                return_string += repr_block(block_type)
                 return_string += ', '
         return_string += ']\n'
     return_string += ']\n'
     return return_string
 
+def choose_placement(tetris: Tetris, input_random: random.Random) -> Placement | None:
+    """a placement keeping the field low and with few holes, ties broken at random"""
+    snapshot = tetris.snapshot()
+    best: Placement | None = None
+    best_score = 0.0
+    for placement in tetris.get_placements(use_hold=True):
+        lines = tetris.apply_placement(placement).clear_line
+        heights = tetris.main_field.heights
+        holes = sum(heights) - tetris.main_field.block_count
+        bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(len(heights) - 1))
+        score = 0.51 * sum(heights) - 0.76 * lines + 0.36 * holes + 0.18 * bumpiness + 0.01 * input_random.random()
+        tetris.restore(snapshot)
+        if best is None or score < best_score:
+            best = placement
+            best_score = score
+    return best
+
+def play_placements(tetris: Tetris, input_random: random.Random, number: int) -> None:
+    """lock number minos where choose_placement chooses, stop when the game is topped out"""
+    for i in range(number):
+        placement = choose_placement(tetris, input_random)
+        if tetris.is_topped_out() or placement is None:
+            return
+        tetris.apply_placement(placement)
+
+def drop_on_grid(grid: list[bytearray], shape: MinoShape, position: Position) -> list[bytearray]:
+    """the grid after hard dropping shape from position and clearing lines, one block at a time"""
+    def fits(position_y: int) -> bool:
+        for x, y in shape.cells:
+            grid_x = position.x + x
+            grid_y = position_y + y
+            if grid_x < 0 or grid_x >= len(grid[0]) or grid_y < 0 or grid_y >= len(grid):
+                return False
+            if grid[grid_y][grid_x] != Block.EMPTY_NUMBER:
+                return False
+        return True
+    position_y = position.y
+    while fits(position_y - 1):
+        position_y -= 1
+    new_grid = [bytearray(line) for line in grid]
+    for x, y in shape.cells:
+        new_grid[position_y + y][position.x + x] = shape.grid.grid[y][x]
+    new_grid = [line for line in new_grid if Block.EMPTY_NUMBER in line]
+    while len(new_grid) < len(grid):
+        new_grid.append(bytearray([Block.EMPTY_NUMBER]) * len(grid[0]))
+    return new_grid
+
+def test_row_masks_place_like_grid() -> None:
+    for seed in range(3):
+        tetris = Tetris(seed)
+        tetris.make_mino()
+        input_random = random.Random(seed)
+        field = tetris.main_field
+        for i in range(60):
+            placement = choose_placement(tetris, input_random)
+            if tetris.is_topped_out() or placement is None:
+                break
+            for name in placement.inputs[:-1]:
+                getattr(tetris, name)()
+            expected = drop_on_grid(field.grid, tetris.current_mino_shape, tetris.current_mino.position)
+            getattr(tetris, placement.inputs[-1])()
+            assert field.grid == expected
+            for y, line in enumerate(field.grid):
+                assert field.rows[y] == sum(1 << x for x, block_type in enumerate(line) if block_type != Block.EMPTY_NUMBER)
+            for x in range(field.size_x):
+                assert field.heights[x] == max(
+                    (y + 1 for y in range(field.size_y) if field.grid[y][x] != Block.EMPTY_NUMBER), default=0
+                )
+            assert field.block_count == sum(row.bit_count() for row in field.rows)
+
+def test_snapshot_bytes_round_trip() -> None:
+    for seed in range(3):
+        tetris = Tetris(seed)
+        tetris.make_mino()
+        play_placements(tetris, random.Random(seed), 20)
+        data = tetris.to_bytes()
+        restored = Tetris.from_bytes(data)
+        assert restored.to_bytes() == data
+        assert TetrisSnapshot.from_bytes(data).to_bytes() == data
+        assert restored.state_hash() == tetris.state_hash()
+        play_placements(tetris, random.Random(seed + 100), 20)
+        play_placements(restored, random.Random(seed + 100), 20)
+        assert restored.to_bytes() == tetris.to_bytes()
+
+def test_replay_playback_ends_in_recorded_game() -> None:
+    for seed in range(3):
+        recorder = ReplayRecorder(seed, keyframe_interval=8)
+        input_random = random.Random(seed)
+        for i in range(40):
+            placement = choose_placement(recorder.tetris, input_random)
+            if recorder.tetris.is_topped_out() or placement is None:
+                break
+            recorder.apply_placement(placement)
+        replay = Replay.from_bytes(recorder.to_replay().to_bytes())
+        tetris = Tetris(seed)
+        tetris.make_mino()
+        result = play_replay(replay, tetris)
+        assert result.pieces == recorder.pieces
+        assert tetris.to_bytes() == recorder.tetris.to_bytes()
+        assert replay.seek(recorder.pieces).to_bytes() == recorder.tetris.to_bytes()
+
 ENABLE_PROCESSED_OUTPUT = 0x0001
 ENABLE_WRAP_AT_EOL_OUTPUT = 0x0002
 ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
 MODE = ENABLE_PROCESSED_OUTPUT + ENABLE_WRAP_AT_EOL_OUTPUT + ENABLE_VIRTUAL_TERMINAL_PROCESSING
 
-kernel32 = ctypes.windll.kernel32
-handle = kernel32.GetStdHandle(-11)
-kernel32.SetConsoleMode(handle, MODE)
+if sys.platform == 'win32':
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.GetStdHandle(-11)
+    kernel32.SetConsoleMode(handle, MODE)
+
+if __name__ == '__main__':
+    tetris = Tetris()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.make_mino()
+
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    # I
+    for i in range(3):
+        tetris.move_right()
+    tetris.rotate_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    # O
+    for i in range(4):
+        tetris.move_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #S
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    print(tetris.hold_mino)
+    tetris.hold()
+    #Z
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-tetris = Tetris()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-tetris.make_mino()
+    #J
+    for i in range(4):
+        tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    #L
+    tetris.hold()
 
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    #S
+    for i in range(4):
+        tetris.move_left()
+    tetris.rotate_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-# I
-for i in range(3):
+    #T
+    tetris.rotate_left()
     tetris.move_right()
-tetris.rotate_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #I
+    tetris.rotate_left()
+    for i in range(4):
+        tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #O
+    for i in range(4):
+        tetris.move_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #S
+    tetris.hold()
+    #L
+    tetris.rotate_right()
+    for i in range(4):
+        tetris.move_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #Z
+    tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #J
+    tetris.rotate_right()
+    for i in range(4):
+        tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #L
+    tetris.rotate_left()
+    for i in range(4):
+        tetris.move_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-# O
-for i in range(4):
+    #T
+    tetris.hold()
+    #S
     tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#S
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-print(tetris.hold_mino)
-tetris.hold()
-#Z
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#J
-for i in range(4):
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #I
+    tetris.hold()
+    #T
+    tetris.move_left()
+    for i in range(15):
+        tetris.move_down()
+    print(tetris.is_bottom())
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
     tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-#L
-tetris.hold()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-#S
-for i in range(4):
+    tetris.rotate_right()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    result = tetris.place_mino()
+    print(result)
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #O
+    for i in range(3):
+        tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    #S
+    tetris.hold()
+    #I
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.rotate_left()
     tetris.move_left()
-tetris.rotate_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#T
-tetris.rotate_left()
-tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#I
-tetris.rotate_left()
-for i in range(4):
+    for i in range(17):
+        tetris.move_down()
+    tetris.rotate_left()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    result = tetris.place_mino()
+    print(result)
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #Z
     tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-#O
-for i in range(4):
+    # J
+    tetris.hold()
+    # S
+    tetris.rotate_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    # L
+    tetris.rotate_left()
     tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#S
-tetris.hold()
-#L
-tetris.rotate_right()
-for i in range(4):
     tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#Z
-tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    result = tetris.hard_drop()
+    print(result)
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-#J
-tetris.rotate_right()
-for i in range(4):
+    #T
+    tetris.hold()
+    #J
+    tetris.rotate_right()
     tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.move_left()
+    result = tetris.hard_drop()
+    print(result)
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-#L
-tetris.rotate_left()
-for i in range(4):
-    tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#T
-tetris.hold()
-#S
-tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#I
-tetris.hold()
-#T
-tetris.move_left()
-for i in range(15):
-    tetris.move_down()
-print(tetris.is_bottom())
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-tetris.move_left()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-tetris.rotate_right()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-result = tetris.place_mino()
-print(result)
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#O
-for i in range(3):
+    #I
+    for i in range(2):
+        tetris.move_right()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #O
+    for i in range(4):
+        tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #S
     tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-#S
-tetris.hold()
-#I
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-tetris.rotate_left()
-tetris.move_left()
-for i in range(17):
-    tetris.move_down()
-tetris.rotate_left()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-result = tetris.place_mino()
-print(result)
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#Z
-tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-# J
-tetris.hold()
-# S
-tetris.rotate_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-# L
-tetris.rotate_left()
-tetris.move_right()
-tetris.move_right()
-result = tetris.hard_drop()
-print(result)
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#T
-tetris.hold()
-#J
-tetris.rotate_right()
-tetris.move_left()
-tetris.move_left()
-result = tetris.hard_drop()
-print(result)
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#I
-for i in range(2):
-    tetris.move_right()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
 
-#O
-for i in range(4):
+    #Z
+    tetris.rotate_left()
     tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#S
-tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#Z
-tetris.rotate_left()
-tetris.move_left()
-tetris.move_left()
-tetris.hard_drop()
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
-
-#J
-tetris.hold()
-#T
-for i in range(3):
-    tetris.move_right()
-for i in range(18):
-    tetris.move_down()
-tetris.rotate_left()
-result = tetris.place_mino()
-print(result)
-print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+    tetris.move_left()
+    tetris.hard_drop()
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
+
+    #J
+    tetris.hold()
+    #T
+    for i in range(3):
+        tetris.move_right()
+    for i in range(18):
+        tetris.move_down()
+    tetris.rotate_left()
+    result = tetris.place_mino()
+    print(result)
+    print(repr_grid(tetris.main_field, tetris.current_mino, tetris.hold_mino, tetris.get_ghost_block()))
@@ -0,0 +1,231 @@
+"""queue of the next minos and the generators which fill it
+
+a Randomizer keeps the kinds of the next minos in a ring buffer which is refilled from
+a Generator a bag at a time; every kind is written twice, at i and i + capacity, so
+that the next minos are always one slice and peek_next is a view, without copying
+
+generators only draw from the Random they are given, so a game stays the same for a seed;
+a CountingRandom also counts what it draws, so that its state is its seed and that count
+
+Example:
+    randomizer = Randomizer(SevenBagGenerator(), Random(seed))
+    kind = randomizer.pop()
+    next_kinds = randomizer.peek_next(5)
+"""
+from abc import abstractmethod, ABCMeta
+from random import Random, SystemRandom
+from typing import ClassVar, Sequence, Any
+from collections import deque
+
+KINDS: tuple[int, ...] = (1, 2, 3, 4, 5, 6, 7)
+"""Mino.KIND of I, O, S, Z, J, L and T, in the order of MINO_TYPES"""
+_Z_KIND: int = 4
+_HISTORY_FIRST_KINDS: tuple[int, ...] = (1, 5, 6, 7)
+"""I, J, L and T, the first mino of HistoryGenerator is never S, Z or O"""
+
+_SKIP_CHUNK: int = 1 << 16
+"""most words drawn at once by CountingRandom.skip"""
+
+class CountingRandom(Random):
+    """Random which counts the 32-bit words it draws from the Mersenne Twister
+
+    every draw of Random comes from getrandbits, one word for each 32 bits, or from
+    random, which takes two words, so a generator made with the same seed and moved on
+    by skip(words) is in the same state; both are kept by getstate and setstate
+
+    Args:
+        seed (int | None): the seed, None for 64 bits drawn from the system
+    """
+    def __init__(self, seed: int | None = None) -> None:
+        self.initial_seed = 0
+        self.words = 0
+        super().__init__(seed)
+    def seed(self, a: object = None, version: int = 2) -> None:
+        if a is None:
+            a = SystemRandom().getrandbits(64)
+        if not isinstance(a, int):
+            raise TypeError(f'seed {a!r} is not an int')
+        super().seed(a)
+        # Random only uses the absolute value of an int
+        self.initial_seed = abs(a)
+        self.words = 0
+    def getrandbits(self, k: int, /) -> int:
+        self.words += (k + 31) >> 5
+        return super().getrandbits(k)
+    def random(self) -> float:
+        self.words += 2
+        return super().random()
+    def skip(self, words: int) -> None:
+        """draw words and throw them away"""
+        self.words += words
+        while words > 0:
+            chunk = min(words, _SKIP_CHUNK)
+            super().getrandbits(32 * chunk)
+            words -= chunk
+    def jump(self, seed: int, words: int) -> None:
+        """go to the state after words were drawn from seed"""
+        self.seed(seed)
+        self.skip(words)
+    def getstate(self) -> tuple[Any, ...]:
+        """state of Random, then the seed and the words drawn"""
+        return (super().getstate(), self.initial_seed, self.words)
+    def setstate(self, state: tuple[Any, ...]) -> None:
+        random_state, self.initial_seed, self.words = state
+        super().setstate(random_state)
+
+class Generator(metaclass=ABCMeta):
+    """makes the kinds of minos a bag at a time
+
+    a generator which remembers what it made keeps it in get_state, to be put in snapshots;
+    type(generator)(*generator.get_parameters()) makes a new generator which works the same
+    """
+    BAG_SIZE: ClassVar[int]
+    @abstractmethod
+    def next_bag(self, random_generator: Random) -> Sequence[int]:
+        raise NotImplementedError()
+    def get_parameters(self) -> tuple[int, ...]:
+        return ()
+    def get_state(self) -> tuple[int, ...]:
+        return ()
+    def set_state(self, state: tuple[int, ...]) -> None:
+        pass
+
+class SevenBagGenerator(Generator):
+    """every kind once in each bag, in a random order"""
+    BAG_SIZE: ClassVar[int] = len(KINDS)
+    def next_bag(self, random_generator: Random) -> Sequence[int]:
+        return random_generator.sample(KINDS, len(KINDS))
+
+class FourteenBagGenerator(Generator):
+    """every kind twice in each bag, in a random order"""
+    BAG_SIZE: ClassVar[int] = 2 * len(KINDS)
+    def next_bag(self, random_generator: Random) -> Sequence[int]:
+        return random_generator.sample(KINDS * 2, 2 * len(KINDS))
+
+class PureRandomGenerator(Generator):
+    """every kind drawn on its own with the same chance"""
+    BAG_SIZE: ClassVar[int] = 1
+    def next_bag(self, random_generator: Random) -> Sequence[int]:
+        return (KINDS[random_generator.randrange(len(KINDS))],)
+
+class HistoryGenerator(Generator):
+    """classic randomizer which draws again a kind found in the history of the last kinds
+
+    the last of rolls draws is kept even when it is in the history; the history starts
+    full of Z and the first kind is never S, Z or O, as in the first arcade games
+
+    Args:
+        history_size (int): number of last kinds kept
+        rolls (int): the most draws for a kind
+    """
+    BAG_SIZE: ClassVar[int] = 1
+    def __init__(self, history_size: int = 4, rolls: int = 4) -> None:
+        self.history_size = history_size
+        self.rolls = rolls
+        self.history: deque[int] = deque([_Z_KIND] * history_size, maxlen=history_size)
+        self.first = True
+    def next_bag(self, random_generator: Random) -> Sequence[int]:
+        if self.first:
+            kind = _HISTORY_FIRST_KINDS[random_generator.randrange(len(_HISTORY_FIRST_KINDS))]
+            self.first = False
+        else:
+            for roll in range(self.rolls):
+                kind = KINDS[random_generator.randrange(len(KINDS))]
+                if not kind in self.history:
+                    break
+        self.history.append(kind)
+        return (kind,)
+    def get_parameters(self) -> tuple[int, ...]:
+        return (self.history_size, self.rolls)
+    def get_state(self) -> tuple[int, ...]:
+        """whether the first kind is still to come, then the history from the oldest"""
+        return (int(self.first), *self.history)
+    def set_state(self, state: tuple[int, ...]) -> None:
+        self.first = bool(state[0])
+        self.history.clear()
+        self.history.extend(state[1:])
+
+GENERATORS: dict[str, type[Generator]] = {
+    '7-bag': SevenBagGenerator,
+    '14-bag': FourteenBagGenerator,
+    'random': PureRandomGenerator,
+    'history': HistoryGenerator,
+}
+"""generators by the names used on command lines"""
+
+class Randomizer:
+    """queue of the kinds of the next minos
+
+    a bag is drawn whenever fewer than minimum kinds are left, so peek_next can always
+    show minimum kinds, and bags counts the bags drawn since the start; with 7-bag and
+    a minimum of 8 the bags are drawn when the two piles of 7 of earlier versions were,
+    which keeps the games of every seed as they were
+
+    Args:
+        generator (Generator): makes the kinds
+        random_generator (Random): the only source of randomness of generator
+        minimum (int): the fewest kinds kept in the queue
+    """
+    def __init__(self, generator: Generator, random_generator: Random, minimum: int = 8) -> None:
+        self.generator = generator
+        self.random_generator = random_generator
+        self.minimum = minimum
+        capacity = 1
+        while capacity < minimum - 1 + generator.BAG_SIZE:
+            capacity <<= 1
+        self.capacity = capacity
+        self.buffer = bytearray(2 * capacity)
+        self.view = memoryview(self.buffer).toreadonly()
+        self.head = 0
+        self.count = 0
+        self.bags = 0
+        self._fill()
+    def _fill(self) -> None:
+        buffer = self.buffer
+        capacity = self.capacity
+        while self.count < self.minimum:
+            for kind in self.generator.next_bag(self.random_generator):
+                index = (self.head + self.count) & (capacity - 1)
+                buffer[index] = kind
+                buffer[index + capacity] = kind
+                self.count += 1
+            self.bags += 1
+    def pop(self) -> int:
+        kind = self.buffer[self.head]
+        self.head = (self.head + 1) & (self.capacity - 1)
+        self.count -= 1
+        if self.count < self.minimum:
+            self._fill()
+        return kind
+    def peek_next(self, number: int) -> memoryview:
+        """kinds of the next number minos, a read-only view which is only valid until the next pop
+
+        Raises:
+            ValueError: when number is more than the kinds in the queue
+        """
+        if number > self.count:
+            raise ValueError(f'only {self.count} next minos are known')
+        return self.view[self.head:self.head + number]
+    def get_queue(self) -> bytes:
+        """every kind in the queue, the next first"""
+        return bytes(self.view[self.head:self.head + self.count])
+    def restore(self, queue: bytes, bags: int, generator_state: tuple[int, ...]) -> None:
+        """go back to a queue made by get_queue, random_generator has to be restored separately"""
+        if len(queue) > self.capacity:
+            raise ValueError(f'a queue of {len(queue)} does not fit in {self.capacity}')
+        self.buffer[:len(queue)] = queue
+        self.buffer[self.capacity:self.capacity + len(queue)] = queue
+        self.head = 0
+        self.count = len(queue)
+        self.bags = bags
+        self.generator.set_state(generator_state)
+    def __len__(self) -> int:
+        return self.count
+    def __getstate__(self) -> dict[str, object]:
+        """state for copy and pickle, without view which cannot be pickled"""
+        state = dict(self.__dict__)
+        del state['view']
+        return state
+    def __setstate__(self, state: dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.view = memoryview(self.buffer).toreadonly()
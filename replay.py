@@ -0,0 +1,442 @@
+"""compact binary replays of games and fast playback of them
+
+a replay keeps the random seed and every input of a game, an input is 4 bits so
+two of them are packed in a byte; locking a mino makes one byte describing its
+ClearResult, and a crc32 of those bytes and of the field is saved every
+CHECKSUM_INTERVAL locks so that playback can tell where a replay stops matching the engine
+
+every KEYFRAME_INTERVAL locks a Keyframe of the game is saved with a fixed size,
+so that seeking to a piece plays at most KEYFRAME_INTERVAL locks
+
+Example:
+    recorder = ReplayRecorder(seed)
+    recorder.move_left()
+    recorder.hard_drop()
+    data = recorder.to_replay().to_bytes()
+    play_replay(Replay.from_bytes(data))
+    with ReplayView.open(path) as view:
+        tetris = view.seek(piece)
+"""
+import zlib
+import mmap
+import struct
+from typing import Callable, ClassVar
+from dataclasses import dataclass
+from main import (
+    Tetris, ClearResult, Placement, KickTable, SRS_KICK_TABLE, ARS_KICK_TABLE,
+    Size, Position, SuperRotationStep, LastTetrisAction, FieldSnapshot, TetrisSnapshot,
+    pack_nibbles, unpack_nibbles
+)
+from randomizer import SevenBagGenerator, CountingRandom
+
+ReadableBuffer = bytes | bytearray | memoryview | mmap.mmap
+
+KICK_TABLES: tuple[KickTable, ...] = (SRS_KICK_TABLE, ARS_KICK_TABLE)
+"""kick tables a replay can refer to, by index"""
+
+class ReplayInput:
+    """code of each input, the names are the Tetris methods"""
+    MOVE_LEFT: ClassVar[int] = 0
+    MOVE_RIGHT: ClassVar[int] = 1
+    MOVE_DOWN: ClassVar[int] = 2
+    ROTATE_RIGHT: ClassVar[int] = 3
+    ROTATE_LEFT: ClassVar[int] = 4
+    HOLD: ClassVar[int] = 5
+    HARD_DROP: ClassVar[int] = 6
+    PLACE_MINO: ClassVar[int] = 7
+    NAMES: ClassVar[tuple[str, ...]] = (
+        'move_left', 'move_right', 'move_down', 'rotate_right', 'rotate_left',
+        'hold', 'hard_drop', 'place_mino'
+    )
+
+CHECKSUM_INTERVAL: int = 1024
+"""number of locks covered by each checksum"""
+
+class InvalidReplayException(Exception):
+    pass
+
+class ReplayMismatchException(Exception):
+    """playback locked minos with other results or on another field than the recorded game"""
+    def __init__(self, checksum_index: int) -> None:
+        super().__init__(
+            f'results or the field after locks {checksum_index * CHECKSUM_INTERVAL} to '
+            f'{(checksum_index + 1) * CHECKSUM_INTERVAL - 1} do not match the replay'
+        )
+        self.checksum_index = checksum_index
+
+def encode_result(result: ClearResult) -> int:
+    """one byte of a ClearResult, the lines in the lowest 3 bits and a flag for each bonus"""
+    return (
+        result.clear_line
+        | (result.t_spin << 3)
+        | (result.t_spin_mini << 4)
+        | (result.perfect_clear << 5)
+    )
+
+def checksum(results: bytes | bytearray, tetris: Tetris) -> int:
+    """crc32 of encoded results followed by the rows of the field of tetris"""
+    rows = tetris.main_field.rows
+    return zlib.crc32(struct.pack(f'<{len(rows)}H', *rows), zlib.crc32(results))
+
+_HEADER = struct.Struct('<4sBBqIIII')
+"""magic, version, kick table index, seed, number of inputs, number of checksums,
+keyframe interval and number of keyframes"""
+_MAGIC = b'TRPL'
+_VERSION = 1
+
+KEYFRAME_INTERVAL: int = 64
+"""number of locks between keyframes of a new recording"""
+
+_FIELD_SIZE = Size(Tetris.FIELD_SIZE_X, Tetris.FIELD_SIZE_Y * 2)
+_PILE_SIZE = SevenBagGenerator.BAG_SIZE
+_KEYFRAME = struct.Struct(f'<IIIQBBbbBBBB7s7s{_FIELD_SIZE.x * _FIELD_SIZE.y // 2}s')
+"""piece, input offset, pile count, words drawn by the random generator, mino kind,
+mino direction, x, y, hold kind, rotated, super rotation step, length of current pile,
+current pile, next pile, blocks
+
+the queue of the next minos, 8 to 14 long with 7-bag, is stored as the two piles of 7
+it was kept in by earlier versions: the last 7 are the next pile"""
+
+@dataclass(frozen=True, slots=True)
+class Keyframe:
+    """state of a game right after a lock, stored in a replay with a fixed size
+
+    input_offset is the number of inputs played until then and pile_count the number
+    of bags drawn; the state of the random generator is found again by skipping the
+    words it drew; replays are of games with the default 7-bag generator
+    """
+    piece: int
+    input_offset: int
+    pile_count: int
+    snapshot: TetrisSnapshot
+    @classmethod
+    def from_tetris(cls, tetris: Tetris, piece: int, input_offset: int) -> 'Keyframe':
+        snapshot = tetris.snapshot()
+        return cls(piece, input_offset, snapshot.bags, snapshot)
+    def to_bytes(self) -> bytes:
+        snapshot = self.snapshot
+        return _KEYFRAME.pack(
+            self.piece, self.input_offset, self.pile_count, snapshot.random_state[2],
+            snapshot.mino_kind, snapshot.mino_direction, snapshot.position.x, snapshot.position.y,
+            snapshot.hold_kind, snapshot.last_action.is_rotate(), snapshot.last_action.super_rotation_step().step,
+            len(snapshot.queue) - _PILE_SIZE, snapshot.queue[:-_PILE_SIZE], snapshot.queue[-_PILE_SIZE:],
+            pack_nibbles(snapshot.field.to_block_types())
+        )
+    @classmethod
+    def from_buffer(cls, buffer: ReadableBuffer, offset: int, seed: int) -> 'Keyframe':
+        """read a keyframe of a game started with seed at offset of buffer"""
+        (
+            piece, input_offset, pile_count, words,
+            mino_kind, mino_direction, position_x, position_y,
+            hold_kind, rotated, step, current_pile_length, current_pile, next_pile, blocks
+        ) = _KEYFRAME.unpack_from(buffer, offset)
+        random_generator = CountingRandom(seed)
+        # 7-bag keeps no state of its own, so the words drawn are the whole state
+        random_generator.skip(words)
+        generator = SevenBagGenerator()
+        snapshot = TetrisSnapshot(
+            FieldSnapshot.from_block_types(unpack_nibbles(blocks), _FIELD_SIZE),
+            mino_kind, mino_direction, Position(position_x, position_y), hold_kind,
+            LastTetrisAction(bool(rotated), SuperRotationStep(step)),
+            current_pile[:current_pile_length] + next_pile, pile_count, generator.get_state(),
+            random_generator.getstate()
+        )
+        return cls(piece, input_offset, pile_count, snapshot)
+
+@dataclass(frozen=True, slots=True)
+class Replay:
+    """a recorded game
+
+    inputs has one ReplayInput code per byte, checksums[i] is the checksum of the encoded
+    results of locks i * CHECKSUM_INTERVAL to (i + 1) * CHECKSUM_INTERVAL - 1 and
+    of the field after them, the last one covers the locks left
+
+    keyframes are packed Keyframes made after every keyframe_interval locks
+    """
+    seed: int
+    kick_table_index: int
+    inputs: bytes
+    checksums: tuple[int, ...]
+    keyframe_interval: int = 0
+    keyframes: bytes = b''
+    def to_bytes(self) -> bytes:
+        return (
+            _HEADER.pack(
+                _MAGIC, _VERSION, self.kick_table_index, self.seed, len(self.inputs), len(self.checksums),
+                self.keyframe_interval, len(self.keyframes) // _KEYFRAME.size
+            )
+            + pack_nibbles(self.inputs)
+            + struct.pack(f'<{len(self.checksums)}I', *self.checksums)
+            + self.keyframes
+        )
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Replay':
+        return ReplayView(data).to_replay()
+    def seek(self, piece: int) -> Tetris:
+        """game right after piece locks, played from the closest keyframe before it"""
+        keyframe_number = len(self.keyframes) // _KEYFRAME.size
+        keyframe_index = _keyframe_index(piece, self.keyframe_interval, keyframe_number)
+        if keyframe_index < 0:
+            return _play_locks(self.seed, self.kick_table_index, None, self.inputs, piece)
+        keyframe = Keyframe.from_buffer(self.keyframes, keyframe_index * _KEYFRAME.size, self.seed)
+        inputs = self.inputs[keyframe.input_offset:]
+        return _play_locks(self.seed, self.kick_table_index, keyframe, inputs, piece - keyframe.piece)
+
+def _keyframe_index(piece: int, keyframe_interval: int, keyframe_number: int) -> int:
+    """index of the last keyframe at or before piece, -1 when there is none"""
+    if keyframe_interval <= 0:
+        return -1
+    return min(piece // keyframe_interval, keyframe_number) - 1
+
+def _play_locks(seed: int, kick_table_index: int, keyframe: Keyframe | None, inputs: bytes, locks: int) -> Tetris:
+    """restore keyframe, or start a game when None, and play inputs until locks minos are locked"""
+    tetris = Tetris(seed, KICK_TABLES[kick_table_index])
+    if keyframe is None:
+        tetris.make_mino()
+    else:
+        tetris.restore(keyframe.snapshot)
+    if locks <= 0:
+        return tetris
+    actions: tuple[Callable[[], object], ...] = (
+        tetris.move_left, tetris.move_right, tetris.move_down,
+        tetris.rotate_right, tetris.rotate_left, tetris.hold,
+        tetris.hard_drop, tetris.place_mino
+    )
+    for code in inputs:
+        actions[code]()
+        if code >= ReplayInput.HARD_DROP:
+            locks -= 1
+            if locks <= 0:
+                return tetris
+    raise IndexError('replay has fewer locks than the piece to seek')
+
+class ReplayView:
+    """a replay read in place from its bytes, only the parts which are used are decoded
+
+    a view made by open maps the file to memory, so a keyframe in the middle of a large
+    replay is read without loading the rest of the file
+
+    Args:
+        buffer (ReadableBuffer): bytes of a replay, made by Replay.to_bytes
+    """
+    def __init__(self, buffer: ReadableBuffer) -> None:
+        self.buffer = memoryview(buffer).cast('B')
+        self.memory_map: mmap.mmap | None = None
+        if len(self.buffer) < _HEADER.size:
+            raise InvalidReplayException('replay is too short')
+        (
+            magic, version, kick_table_index, seed, input_number, checksum_number, keyframe_interval, keyframe_number
+        ) = _HEADER.unpack_from(self.buffer)
+        if magic != _MAGIC or version != _VERSION:
+            raise InvalidReplayException('not a replay of a known version')
+        if not 0 <= kick_table_index < len(KICK_TABLES):
+            raise InvalidReplayException(f'unknown kick table {kick_table_index}')
+        self.seed: int = seed
+        self.kick_table_index: int = kick_table_index
+        self.input_number: int = input_number
+        self.checksum_number: int = checksum_number
+        self.keyframe_interval: int = keyframe_interval
+        self.keyframe_number: int = keyframe_number
+        self.inputs_offset = _HEADER.size
+        self.checksums_offset = self.inputs_offset + (input_number + 1) // 2
+        self.keyframes_offset = self.checksums_offset + checksum_number * 4
+        if len(self.buffer) != self.keyframes_offset + keyframe_number * _KEYFRAME.size:
+            raise InvalidReplayException('size of replay does not match its header')
+    @classmethod
+    def open(cls, path: str) -> 'ReplayView':
+        with open(path, 'rb') as replay_file:
+            memory_map = mmap.mmap(replay_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = cls(memory_map)
+        view.memory_map = memory_map
+        return view
+    def close(self) -> None:
+        self.buffer.release()
+        if not self.memory_map is None:
+            self.memory_map.close()
+            self.memory_map = None
+    def __enter__(self) -> 'ReplayView':
+        return self
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+    def get_inputs(self, start: int, stop: int) -> bytes:
+        """ReplayInput codes of inputs[start:stop]"""
+        stop = min(stop, self.input_number)
+        if start >= stop:
+            return b''
+        packed = bytes(self.buffer[self.inputs_offset + start // 2:self.inputs_offset + (stop + 1) // 2])
+        return unpack_nibbles(packed)[start % 2:start % 2 + stop - start]
+    def get_checksums(self) -> tuple[int, ...]:
+        return struct.unpack_from(f'<{self.checksum_number}I', self.buffer, self.checksums_offset)
+    def get_keyframe(self, index: int) -> Keyframe:
+        if not 0 <= index < self.keyframe_number:
+            raise IndexError(f'keyframe {index} is out of range')
+        return Keyframe.from_buffer(self.buffer, self.keyframes_offset + index * _KEYFRAME.size, self.seed)
+    def to_replay(self) -> Replay:
+        """decode the whole replay"""
+        return Replay(
+            self.seed, self.kick_table_index, self.get_inputs(0, self.input_number), self.get_checksums(),
+            self.keyframe_interval, bytes(self.buffer[self.keyframes_offset:])
+        )
+    def seek(self, piece: int) -> Tetris:
+        """game right after piece locks, only the inputs after the closest keyframe before it are read"""
+        keyframe_index = _keyframe_index(piece, self.keyframe_interval, self.keyframe_number)
+        if keyframe_index < 0:
+            start = 0
+            keyframe = None
+            locks = piece
+        else:
+            keyframe = self.get_keyframe(keyframe_index)
+            start = keyframe.input_offset
+            locks = piece - keyframe.piece
+        stop = self.input_number
+        if keyframe_index + 1 < self.keyframe_number:
+            stop = self.get_keyframe_input_offset(keyframe_index + 1)
+        return _play_locks(self.seed, self.kick_table_index, keyframe, self.get_inputs(start, stop), locks)
+    def get_keyframe_input_offset(self, index: int) -> int:
+        """input_offset of a keyframe without decoding the rest of it"""
+        input_offset: int = struct.unpack_from('<I', self.buffer, self.keyframes_offset + index * _KEYFRAME.size + 4)[0]
+        return input_offset
+
+class ReplayRecorder:
+    """plays a new game through the input methods of Tetris and records them
+
+    inputs which raise an exception do not change the game and are not recorded
+
+    Args:
+        seed (int): random seed of the game, it has to fit in 64 bits
+        kick_table_index (int): index of the kick table in KICK_TABLES
+        keyframe_interval (int): a keyframe is made after every this many locks, none when 0
+    """
+    def __init__(self, seed: int, kick_table_index: int = 0, keyframe_interval: int = KEYFRAME_INTERVAL) -> None:
+        self.seed = seed
+        self.kick_table_index = kick_table_index
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = bytearray()
+        self.pieces = 0
+        self.tetris = Tetris(seed, KICK_TABLES[kick_table_index])
+        self.tetris.make_mino()
+        self.inputs = bytearray()
+        self.checksums: list[int] = []
+        self.results = bytearray()
+    def _lock(self, result: ClearResult) -> ClearResult:
+        self.results.append(encode_result(result))
+        if len(self.results) >= CHECKSUM_INTERVAL:
+            self.checksums.append(checksum(self.results, self.tetris))
+            self.results.clear()
+        self.pieces += 1
+        if self.keyframe_interval > 0 and self.pieces % self.keyframe_interval == 0:
+            self.keyframes += Keyframe.from_tetris(self.tetris, self.pieces, len(self.inputs)).to_bytes()
+        return result
+    def move_left(self) -> bool:
+        moved = self.tetris.move_left()
+        self.inputs.append(ReplayInput.MOVE_LEFT)
+        return moved
+    def move_right(self) -> bool:
+        moved = self.tetris.move_right()
+        self.inputs.append(ReplayInput.MOVE_RIGHT)
+        return moved
+    def move_down(self) -> bool:
+        moved = self.tetris.move_down()
+        self.inputs.append(ReplayInput.MOVE_DOWN)
+        return moved
+    def rotate_right(self) -> bool:
+        rotated = self.tetris.rotate_right()
+        self.inputs.append(ReplayInput.ROTATE_RIGHT)
+        return rotated
+    def rotate_left(self) -> bool:
+        rotated = self.tetris.rotate_left()
+        self.inputs.append(ReplayInput.ROTATE_LEFT)
+        return rotated
+    def hold(self) -> None:
+        self.tetris.hold()
+        self.inputs.append(ReplayInput.HOLD)
+    def hard_drop(self) -> ClearResult:
+        result = self.tetris.hard_drop()
+        self.inputs.append(ReplayInput.HARD_DROP)
+        return self._lock(result)
+    def place_mino(self) -> ClearResult:
+        result = self.tetris.place_mino()
+        self.inputs.append(ReplayInput.PLACE_MINO)
+        return self._lock(result)
+    def apply_placement(self, placement: Placement) -> ClearResult:
+        """lock current mino at a placement, recording placement.inputs"""
+        result = self.tetris.apply_placement(placement)
+        self.inputs += bytes(ReplayInput.NAMES.index(name) for name in placement.inputs)
+        return self._lock(result)
+    def to_replay(self) -> Replay:
+        """replay of the inputs so far, recording can go on after this"""
+        checksums = list(self.checksums)
+        if len(self.results) > 0:
+            checksums.append(checksum(self.results, self.tetris))
+        return Replay(
+            self.seed, self.kick_table_index, bytes(self.inputs), tuple(checksums),
+            self.keyframe_interval, bytes(self.keyframes)
+        )
+
+@dataclass(frozen=True, slots=True)
+class PlaybackResult:
+    pieces: int
+    lines: int
+    t_spins: int
+    t_spin_minis: int
+    perfect_clears: int
+
+def play_replay(replay: Replay, tetris: Tetris | None = None) -> PlaybackResult:
+    """play the inputs of a replay without drawing anything and check every checksum
+
+    Args:
+        replay (Replay): the replay to play
+        tetris (Tetris | None): a new game made with the seed and the kick table of replay,
+            playback goes on in it so that its state can be looked at afterwards;
+            a game is made when None
+
+    Raises:
+        ReplayMismatchException: the results of a group of locks differ from the replay
+
+    Returns:
+        PlaybackResult: totals of the locks of the game
+    """
+    if tetris is None:
+        tetris = Tetris(replay.seed, KICK_TABLES[replay.kick_table_index])
+        tetris.make_mino()
+    actions: tuple[Callable[[], object], ...] = (
+        tetris.move_left, tetris.move_right, tetris.move_down,
+        tetris.rotate_right, tetris.rotate_left, tetris.hold
+    )
+    hard_drop = tetris.hard_drop
+    place_mino = tetris.place_mino
+    results = bytearray()
+    checksum_index = 0
+    pieces = 0
+    lines = 0
+    t_spins = 0
+    t_spin_minis = 0
+    perfect_clears = 0
+    for code in replay.inputs:
+        if code < ReplayInput.HARD_DROP:
+            actions[code]()
+            continue
+        result = hard_drop() if code == ReplayInput.HARD_DROP else place_mino()
+        results.append(encode_result(result))
+        pieces += 1
+        lines += result.clear_line
+        if result.t_spin:
+            t_spins += 1
+        if result.t_spin_mini:
+            t_spin_minis += 1
+        if result.perfect_clear:
+            perfect_clears += 1
+        if len(results) >= CHECKSUM_INTERVAL:
+            if (checksum_index >= len(replay.checksums)
+                    or checksum(results, tetris) != replay.checksums[checksum_index]):
+                raise ReplayMismatchException(checksum_index)
+            checksum_index += 1
+            results.clear()
+    if len(results) > 0:
+        if (checksum_index >= len(replay.checksums)
+                or checksum(results, tetris) != replay.checksums[checksum_index]):
+            raise ReplayMismatchException(checksum_index)
+        checksum_index += 1
+    if checksum_index != len(replay.checksums):
+        raise ReplayMismatchException(checksum_index)
+    return PlaybackResult(pieces, lines, t_spins, t_spin_minis, perfect_clears)
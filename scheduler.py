@@ -0,0 +1,242 @@
+"""tick based key handling of a game
+
+frontends put raw key down and up events into a ring buffer allocated once, at any
+time; every tick takes them out in order and resolves DAS, ARR, soft drop, gravity and
+lock delay; a tick does the same few steps whatever happened before, and sideways
+repeats with ARR 0 and soft drop with factor 0 move in one sweep of the field
+
+Example:
+    scheduler = TickScheduler(tetris, Handling(das=8, arr=0))
+    scheduler.key_down(Key.LEFT)
+    scheduler.tick()
+    scheduler.key_up(Key.LEFT)
+"""
+from array import array
+from typing import Callable, ClassVar
+from dataclasses import dataclass
+from main import Tetris, ClearResult
+
+class Key:
+    """code of each key the scheduler handles"""
+    LEFT: ClassVar[int] = 0
+    RIGHT: ClassVar[int] = 1
+    SOFT_DROP: ClassVar[int] = 2
+    HARD_DROP: ClassVar[int] = 3
+    ROTATE_RIGHT: ClassVar[int] = 4
+    ROTATE_LEFT: ClassVar[int] = 5
+    HOLD: ClassVar[int] = 6
+    NUMBER: ClassVar[int] = 7
+
+GRAVITY_UNIT: int = 1 << 16
+"""gravity of one row every tick, gravity is counted in fractions of a row"""
+
+@dataclass(frozen=True, slots=True)
+class Handling:
+    """timings of a player and of the game, counted in ticks
+
+    Attributes:
+        das (int): ticks a sideways key is held before it starts to repeat
+        arr (int): ticks between repeats, 0 moves to the wall at once
+        soft_drop_factor (int): gravity is multiplied by this while soft drop is held, 0 drops to the floor at once
+        gravity (int): rows fallen every tick, in GRAVITY_UNIT for a row
+        lock_delay (int): ticks current mino can stay on the ground before it locks
+        lock_resets (int): moves and rotations on the ground which start lock delay again, for each mino
+    """
+    das: int = 10
+    arr: int = 2
+    soft_drop_factor: int = 20
+    gravity: int = (GRAVITY_UNIT + 59) // 60
+    """a row a second at 60 ticks a second"""
+    lock_delay: int = 30
+    lock_resets: int = 15
+
+class EventQueueFullException(Exception):
+    pass
+
+class EventQueue:
+    """ring buffer of key events, allocated once
+
+    an event is packed into a byte as key << 1 | down
+
+    Args:
+        capacity (int): the most events waiting for a tick, a power of 2
+    """
+    def __init__(self, capacity: int = 256) -> None:
+        if capacity <= 0 or capacity & (capacity - 1) != 0:
+            raise ValueError(f'capacity {capacity} is not a power of 2')
+        self.events = array('B', bytes(capacity))
+        self.mask = capacity - 1
+        self.head = 0
+        self.count = 0
+    def push(self, key: int, down: bool) -> None:
+        if self.count > self.mask:
+            raise EventQueueFullException()
+        self.events[(self.head + self.count) & self.mask] = key << 1 | down
+        self.count += 1
+    def pop(self) -> int:
+        """the oldest event, the queue must not be empty"""
+        event = self.events[self.head]
+        self.head = (self.head + 1) & self.mask
+        self.count -= 1
+        return event
+    def clear(self) -> None:
+        self.head = 0
+        self.count = 0
+    def __len__(self) -> int:
+        return self.count
+
+class TickScheduler:
+    """drives a game from key events, one tick at a time
+
+    a sideways key moves once when it is pressed and repeats after DAS while it is held,
+    the key pressed last wins; hold works once for each mino; a move or rotation on the
+    ground starts lock delay again up to lock_resets times, which are given back when
+    current mino falls lower than it has been
+
+    Args:
+        tetris (Tetris): the game, its current mino has to be made
+        handling (Handling): timings
+        capacity (int): capacity of the event queue, a power of 2
+        on_lock (Callable[[ClearResult], None] | None): called with the result of every lock
+    """
+    def __init__(
+        self, tetris: Tetris, handling: Handling = Handling(), capacity: int = 256,
+        on_lock: Callable[[ClearResult], None] | None = None
+    ) -> None:
+        self.tetris = tetris
+        self.handling = handling
+        self.events = EventQueue(capacity)
+        self.on_lock = on_lock
+        self.held = 0
+        self.shift_direction = 0
+        self.das_ticks = 0
+        self.arr_ticks = 0
+        self.gravity_progress = 0
+        self.lock_ticks = 0
+        self.lock_resets = 0
+        self.lowest_y = tetris.current_mino.position.y
+        self.hold_used = False
+        self.topped_out = False
+        self.ticks = 0
+        self.locks = 0
+    def key_down(self, key: int) -> None:
+        self.events.push(key, True)
+    def key_up(self, key: int) -> None:
+        self.events.push(key, False)
+    def is_held(self, key: int) -> bool:
+        return self.held & (1 << key) != 0
+    def tick(self) -> int:
+        """take out waiting events and advance the game by a tick
+
+        Returns:
+            int: the number of minos locked in the tick
+        """
+        self.ticks += 1
+        if self.topped_out:
+            self.events.clear()
+            return 0
+        locks = self.locks
+        moved = False
+        pressed_shift = False
+        events = self.events
+        while len(events) > 0 and not self.topped_out:
+            event = events.pop()
+            key = event >> 1
+            if event & 1:
+                if self.held & (1 << key):
+                    continue
+                self.held |= 1 << key
+                pressed_shift |= key == Key.LEFT or key == Key.RIGHT
+                moved |= self._press(key)
+            else:
+                self.held &= ~(1 << key)
+                self._release(key)
+        if not self.topped_out:
+            moved |= self._auto_shift(pressed_shift)
+            self._fall(moved)
+        return self.locks - locks
+    def _press(self, key: int) -> bool:
+        """whether current mino moved"""
+        tetris = self.tetris
+        if key == Key.LEFT or key == Key.RIGHT:
+            self.shift_direction = -1 if key == Key.LEFT else 1
+            self.das_ticks = 0
+            self.arr_ticks = 0
+            return tetris.shift(self.shift_direction, 1) > 0
+        if key == Key.ROTATE_RIGHT:
+            return tetris.rotate_right()
+        if key == Key.ROTATE_LEFT:
+            return tetris.rotate_left()
+        if key == Key.HARD_DROP:
+            self._lock(tetris.hard_drop())
+        elif key == Key.HOLD and not self.hold_used:
+            tetris.hold()
+            self._new_mino()
+            self.hold_used = True
+        return False
+    def _release(self, key: int) -> None:
+        """a released sideways key gives way to the other one if it is still held, which starts DAS again"""
+        if (key == Key.LEFT and self.shift_direction < 0) or (key == Key.RIGHT and self.shift_direction > 0):
+            other = Key.RIGHT if key == Key.LEFT else Key.LEFT
+            if self.is_held(other):
+                self.shift_direction = -1 if other == Key.LEFT else 1
+            else:
+                self.shift_direction = 0
+            self.das_ticks = 0
+            self.arr_ticks = 0
+    def _auto_shift(self, pressed: bool) -> bool:
+        """repeat of the held sideways key, whether current mino moved"""
+        if self.shift_direction == 0:
+            return False
+        handling = self.handling
+        if not pressed and self.das_ticks < handling.das:
+            self.das_ticks += 1
+        if self.das_ticks < handling.das:
+            return False
+        if handling.arr <= 0:
+            return self.tetris.shift(self.shift_direction) > 0
+        repeat = self.arr_ticks == 0
+        self.arr_ticks = (self.arr_ticks + 1) % handling.arr
+        if not repeat:
+            return False
+        return self.tetris.shift(self.shift_direction, 1) > 0
+    def _fall(self, moved: bool) -> None:
+        """gravity, soft drop and lock delay"""
+        tetris = self.tetris
+        handling = self.handling
+        soft_drop = self.is_held(Key.SOFT_DROP)
+        if soft_drop and handling.soft_drop_factor <= 0:
+            tetris.fall(tetris.main_field.size_y)
+        else:
+            gravity = handling.gravity * handling.soft_drop_factor if soft_drop else handling.gravity
+            self.gravity_progress += gravity
+            rows = self.gravity_progress // GRAVITY_UNIT
+            self.gravity_progress %= GRAVITY_UNIT
+            if rows > 0:
+                tetris.fall(rows)
+        position_y = tetris.current_mino.position.y
+        if position_y < self.lowest_y:
+            self.lowest_y = position_y
+            self.lock_ticks = 0
+            self.lock_resets = 0
+        if not tetris.is_bottom():
+            return
+        self.gravity_progress = 0
+        if moved and self.lock_resets < handling.lock_resets:
+            self.lock_ticks = 0
+            self.lock_resets += 1
+        self.lock_ticks += 1
+        if self.lock_ticks >= handling.lock_delay:
+            self._lock(tetris.place_mino())
+    def _lock(self, result: ClearResult) -> None:
+        self.locks += 1
+        self.hold_used = False
+        self._new_mino()
+        if not self.on_lock is None:
+            self.on_lock(result)
+    def _new_mino(self) -> None:
+        self.gravity_progress = 0
+        self.lock_ticks = 0
+        self.lock_resets = 0
+        self.lowest_y = self.tetris.current_mino.position.y
+        self.topped_out = self.tetris.is_topped_out()
@@ -0,0 +1,242 @@
+"""headless simulation of many games over a range of seeds
+
+games are run in a process pool and results are streamed back as each game finishes
+
+Example:
+    python simulation.py my_bot:policy --seeds 0 10000 --output results
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import importlib
+from typing import Callable, Iterator
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from main import Tetris, ClearResult
+
+Policy = Callable[[Tetris], ClearResult]
+"""plays current mino of the game until it is placed and returns the result of placing it"""
+
+@dataclass(frozen=True, slots=True)
+class GameResult:
+    seed: int
+    pieces: int
+    lines: int
+    t_spins: int
+    t_spin_minis: int
+    perfect_clears: int
+    topped_out: bool
+    timed_out: bool
+    seconds: float
+    error: str | None = None
+    """the exception which stopped the game, None when it ended normally"""
+
+class GameTimeoutException(Exception):
+    pass
+
+def _raise_timeout(signal_number: int, frame: object) -> None:
+    raise GameTimeoutException()
+
+def play_game(policy: Policy, seed: int, max_pieces: int, timeout: float | None = None) -> GameResult:
+    """play one game until it tops out, reaches max_pieces or runs out of time
+
+    an exception of policy ends the game, which is returned with error set and the pieces
+    placed until then
+
+    Note:
+        where signal.setitimer exists and this is the main thread, as in a worker process,
+        a timer interrupts a policy which runs past timeout; otherwise timeout is only
+        checked after every piece, so a policy which never returns is not stopped
+    """
+    start = time.perf_counter()
+    use_timer = (
+        (timeout is not None) and hasattr(signal, 'setitimer')
+        and threading.current_thread() is threading.main_thread()
+    )
+    pieces = 0
+    lines = 0
+    t_spins = 0
+    t_spin_minis = 0
+    perfect_clears = 0
+    topped_out = False
+    timed_out = False
+    error: str | None = None
+    previous_handler = signal.getsignal(signal.SIGALRM) if use_timer else None
+    try:
+        # the timer goes off at most once, so an alarm in the inner finally is caught
+        # below and there is nothing left to disarm
+        try:
+            if use_timer:
+                assert timeout is not None
+                signal.signal(signal.SIGALRM, _raise_timeout)
+                signal.setitimer(signal.ITIMER_REAL, max(timeout, 1e-6))
+            tetris = Tetris(seed)
+            tetris.make_mino()
+            while pieces < max_pieces:
+                if tetris.is_topped_out():
+                    topped_out = True
+                    break
+                result = policy(tetris)
+                pieces += 1
+                lines += result.clear_line
+                if result.t_spin:
+                    t_spins += 1
+                if result.t_spin_mini:
+                    t_spin_minis += 1
+                if result.perfect_clear:
+                    perfect_clears += 1
+                if (timeout is not None) and (time.perf_counter() - start > timeout):
+                    timed_out = True
+                    break
+        finally:
+            if use_timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except GameTimeoutException:
+        timed_out = True
+    except Exception as exception:
+        error = f'{type(exception).__name__}: {exception}'
+    finally:
+        if use_timer:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return GameResult(
+        seed, pieces, lines, t_spins, t_spin_minis, perfect_clears,
+        topped_out, timed_out, time.perf_counter() - start, error
+    )
+
+def _shard_path(output_dir: str, shard: range) -> str:
+    return os.path.join(output_dir, f'shard_{shard.start}_{shard.stop}.jsonl')
+
+def _load_shard(path: str) -> list[GameResult]:
+    with open(path, encoding='utf-8') as shard_file:
+        return [GameResult(**json.loads(line)) for line in shard_file if line.strip()]
+
+def _save_shard(path: str, results: list[GameResult]) -> None:
+    """write a finished shard, the rename makes a shard file either complete or absent"""
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as shard_file:
+        for result in sorted(results, key=lambda result: result.seed):
+            shard_file.write(json.dumps(asdict(result)) + '\n')
+    os.replace(temporary_path, path)
+
+def run_games(
+        policy: Policy,
+        seeds: range,
+        max_pieces: int = 10000,
+        timeout: float | None = None,
+        processes: int | None = None,
+        shard_size: int = 100,
+        output_dir: str | None = None,
+        progress: Callable[[int, int], None] | None = None
+    ) -> Iterator[GameResult]:
+    """play a game for every seed in a process pool and yield the results as they finish
+
+    seeds are split into shards of shard_size games; when output_dir is given every
+    finished shard is saved there, and shards already saved are loaded instead of played,
+    so a stopped run can be resumed by running it again
+
+    a game which fails, in the policy or in its worker, is a result with error set; a shard
+    with a failure of a worker is not saved, so that its games are played again on resume;
+    when the consumer stops early the games which have not started are cancelled
+
+    Args:
+        policy (Policy): must be picklable, e.g. a function defined at the top of a module
+        seeds (range): random seeds of the games
+        max_pieces (int): a game stops after placing this many minos
+        timeout (float | None): a game stops after this many seconds
+        processes (int | None): number of worker processes, the number of CPUs when None
+        shard_size (int): number of games saved together
+        output_dir (str | None): directory to save shards in
+        progress (Callable[[int, int], None] | None): called with (finished games, all games)
+
+    Yields:
+        GameResult: result of each game, in the order they finish
+    """
+    shards = [seeds[i:i+shard_size] for i in range(0, len(seeds), shard_size)]
+    finished = 0
+    pending_shards: list[range] = []
+    for shard in shards:
+        if (output_dir is not None) and os.path.exists(_shard_path(output_dir, shard)):
+            for result in _load_shard(_shard_path(output_dir, shard)):
+                finished += 1
+                yield result
+            if progress is not None:
+                progress(finished, len(seeds))
+            continue
+        pending_shards.append(shard)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    executor = ProcessPoolExecutor(max_workers=processes)
+    completed = False
+    try:
+        futures: dict[Future[GameResult], tuple[range, int]] = {}
+        for shard in pending_shards:
+            for seed in shard:
+                futures[executor.submit(play_game, policy, seed, max_pieces, timeout)] = (shard, seed)
+        shard_results: dict[range, list[GameResult]] = {shard: [] for shard in pending_shards}
+        failed_shards: set[range] = set()
+        for future in as_completed(futures):
+            shard, seed = futures[future]
+            try:
+                result = future.result()
+            except Exception as exception:
+                failed_shards.add(shard)
+                result = GameResult(
+                    seed, 0, 0, 0, 0, 0, False, False, 0.0, f'{type(exception).__name__}: {exception}'
+                )
+            shard_results[shard].append(result)
+            if len(shard_results[shard]) == len(shard):
+                results = shard_results.pop(shard)
+                if (output_dir is not None) and not shard in failed_shards:
+                    _save_shard(_shard_path(output_dir, shard), results)
+            finished += 1
+            if progress is not None:
+                progress(finished, len(seeds))
+            yield result
+        completed = True
+    finally:
+        # an early stop or an exception does not wait for the games still queued
+        executor.shutdown(wait=completed, cancel_futures=True)
+
+def load_policy(name: str) -> Policy:
+    """import a policy from 'module:function'"""
+    module_name, function_name = name.split(':')
+    policy: Policy = getattr(importlib.import_module(module_name), function_name)
+    return policy
+
+def _print_progress(finished: int, total: int) -> None:
+    print(f'\r{finished}/{total}', end='', file=sys.stderr, flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('policy', help='module:function of the policy')
+    parser.add_argument('--seeds', type=int, nargs=2, default=[0, 100], metavar=('START', 'STOP'))
+    parser.add_argument('--max-pieces', type=int, default=10000)
+    parser.add_argument('--timeout', type=float, default=None)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--shard-size', type=int, default=100)
+    parser.add_argument('--output', default=None, help='directory to save shards in')
+    arguments = parser.parse_args()
+    results = list(run_games(
+        load_policy(arguments.policy),
+        range(*arguments.seeds),
+        arguments.max_pieces,
+        arguments.timeout,
+        arguments.processes,
+        arguments.shard_size,
+        arguments.output,
+        _print_progress
+    ))
+    print(file=sys.stderr)
+    games = max(len(results), 1)
+    print(f'games: {len(results)}')
+    print(f'pieces per game: {sum(result.pieces for result in results) / games:.1f}')
+    print(f'lines per game: {sum(result.lines for result in results) / games:.1f}')
+    print(f't-spins: {sum(result.t_spins for result in results)}')
+    print(f'perfect clears: {sum(result.perfect_clears for result in results)}')
+    print(f'topped out: {sum(result.topped_out for result in results)}')
+    print(f'timed out: {sum(result.timed_out for result in results)}')
+    print(f'failed: {sum(not result.error is None for result in results)}')
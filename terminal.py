@@ -0,0 +1,147 @@
+"""incremental ANSI terminal view of a game
+
+the renderer keeps the cells of the last frame it drew and only writes the cells
+which changed, moving the cursor and changing the colour only when it has to,
+so a frame where a mino moves by one is a few dozen bytes
+
+Example:
+    renderer = TerminalRenderer(sys.stdout)
+    while playing:
+        renderer.draw(tetris)
+    renderer.close()
+"""
+import sys
+import time
+from typing import TextIO
+from main import Tetris
+from board import Board, Cell
+
+CELL_STYLES: tuple[tuple[str, str], ...] = (
+    ('0', ' .'),                   # empty
+    ('36', '██'),                  # I
+    ('33', '██'),                  # O
+    ('32', '██'),                  # S
+    ('31', '██'),                  # Z
+    ('34', '██'),                  # J
+    ('38;2;255;48;0', '██'),       # L
+    ('35', '██'),                  # T
+    ('37', '██'),                  # garbage
+    ('90', '▒▒'),                  # wall
+    ('2', '[]'),                   # ghost
+    ('0', '  '),                   # blank
+)
+"""(SGR parameters, two characters) of every cell code"""
+
+class TerminalRenderer:
+    """draws games on a terminal, writing only what changed since the last frame
+
+    every cell of the frames of Board is two characters wide
+
+    Args:
+        stream (TextIO): terminal to write to
+        origin_row (int): row of the top left corner on the terminal, from 1
+        origin_column (int): column of the top left corner on the terminal, from 1,
+            many renderers with other origins can share a terminal
+    """
+    def __init__(self, stream: TextIO = sys.stdout, origin_row: int = 1, origin_column: int = 1) -> None:
+        self.stream = stream
+        self.origin_row = origin_row
+        self.origin_column = origin_column
+        self.board = Board()
+        self.drawn = bytearray([Cell.UNKNOWN]) * (Board.WIDTH * Board.HEIGHT)
+        self.bytes_written = 0
+        self.frames = 0
+    def invalidate(self) -> None:
+        """forget the last frame, so that the next one is drawn in full, e.g. after the terminal is cleared"""
+        self.drawn = bytearray([Cell.UNKNOWN]) * len(self.drawn)
+    def render(self, tetris: Tetris) -> str:
+        """escape sequences which turn the last frame into the frame of the game"""
+        frame = self.board.make_frame(tetris)
+        drawn = self.drawn
+        width = Board.WIDTH
+        output: list[str] = []
+        full_redraw = drawn[0] == Cell.UNKNOWN
+        cursor_row = -1
+        cursor_column = -1
+        style = ''
+        for row in range(Board.HEIGHT):
+            start = row * width
+            if frame[start:start + width] == drawn[start:start + width]:
+                continue
+            for x in range(width):
+                cell = frame[start + x]
+                if cell == drawn[start + x]:
+                    continue
+                if row != cursor_row or x != cursor_column:
+                    output.append(f'\033[{self.origin_row + row};{self.origin_column + x * 2}H')
+                cell_style, text = CELL_STYLES[cell]
+                if cell_style != style:
+                    output.append(f'\033[{cell_style}m')
+                    style = cell_style
+                output.append(text)
+                cursor_row = row
+                cursor_column = x + 1
+        self.drawn = frame
+        if full_redraw:
+            # after the cells, which would write blanks over them
+            output.append(self._labels())
+            style = '0'
+        if len(output) <= 0:
+            return ''
+        if style != '0':
+            output.append('\033[0m')
+        return ''.join(output)
+    def _labels(self) -> str:
+        """text over the panels, drawn with the first frame"""
+        return (
+            f'\033[0m\033[{self.origin_row};{self.origin_column + Board.HOLD_X * 2}HHOLD'
+            f'\033[{self.origin_row};{self.origin_column + Board.NEXT_X * 2}HNEXT'
+        )
+    def draw(self, tetris: Tetris) -> int:
+        """write the changes of a frame to the stream
+
+        Returns:
+            int: number of characters written
+        """
+        output = self.render(tetris)
+        self.frames += 1
+        if len(output) > 0:
+            self.stream.write(output)
+            self.stream.flush()
+            self.bytes_written += len(output.encode())
+        return len(output)
+    def begin(self) -> None:
+        """clear the terminal and hide the cursor"""
+        self.stream.write('\033[2J\033[?25l')
+        self.stream.flush()
+        self.invalidate()
+    def close(self) -> None:
+        """show the cursor again under the screen"""
+        self.stream.write(f'\033[0m\033[{self.origin_row + Board.HEIGHT};1H\033[?25h')
+        self.stream.flush()
+
+if __name__ == '__main__':
+    from bot import Bot
+    tetris = Tetris()
+    tetris.make_mino()
+    renderer = TerminalRenderer()
+    renderer.begin()
+    bot = Bot(beam_width=4, depth=2, processes=1)
+    frame_time = 1 / 60
+    try:
+        while not tetris.is_topped_out():
+            placement = bot.think(tetris)
+            if placement is None:
+                break
+            for name in placement.placement.inputs[:-1]:
+                getattr(tetris, name)()
+                renderer.draw(tetris)
+                time.sleep(frame_time)
+            getattr(tetris, placement.placement.inputs[-1])()
+            renderer.draw(tetris)
+            time.sleep(frame_time)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        renderer.close()
+        print(f'{renderer.frames} frames, {renderer.bytes_written / max(renderer.frames, 1):.1f} bytes per frame')